@@ -1,18 +1,87 @@
-"""Пакет для работы с продвинутыми шаблонами промтов в LangChain."""
-
-from .base import PromptTemplateBase
-from .string import StringPromptTemplate
-from .chat import ChatPromptTemplate, ChatMessage
-from .few_shot import FewShotPromptTemplate
-from .builder import ChatPromptBuilder
-from .converters import convert_template
-
-__all__ = [
-    "PromptTemplateBase",
-    "StringPromptTemplate",
-    "ChatPromptTemplate",
-    "ChatMessage",
-    "FewShotPromptTemplate",
-    "ChatPromptBuilder",
-    "convert_template"
-]
\ No newline at end of file
+"""Пакет для работы с продвинутыми шаблонами промтов в LangChain.
+
+Публичные имена загружаются лениво: модуль, в котором определено имя,
+импортируется при первом обращении к нему, поэтому "import langchain_prompt_templates"
+не загружает части пакета, которые не используются.
+"""
+
+from importlib import import_module
+
+# typing не импортируется, чтобы "import langchain_prompt_templates" оставался дешевым
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List
+
+    from .base import PromptTemplateBase
+    from .compiled import CompiledTemplate, compile_template
+    from .batch import LazyBatch
+    from .string import StringPromptTemplate
+    from .chat import ChatPromptTemplate, ChatMessage, ChatRenderSession, TemplateMessage
+    from .few_shot import FewShotPromptTemplate
+    from .example_selectors import (
+        BaseExampleSelector,
+        LengthBasedExampleSelector,
+        SemanticSimilarityExampleSelector,
+        HashingEmbedder,
+    )
+    from .builder import ChatPromptBuilder
+    from .converters import convert_template
+    from .registry import TemplateRegistry, default_registry
+    from .prefix import PrefixSplit
+    from .output_cache import OutputCache
+    from .lengths import approximate_token_count
+    from .bulk import render_bulk, render_bulk_chunks, read_jsonl
+    from .library import TemplateLibrary, write_library
+    from .template_types import template_from_dict
+    from .instrumentation import MetricsCollector, RenderEvent, add_hook, remove_hook
+
+# Публичное имя -> модуль пакета, в котором оно определено
+_EXPORTS: "Dict[str, str]" = {
+    "PromptTemplateBase": ".base",
+    "CompiledTemplate": ".compiled",
+    "compile_template": ".compiled",
+    "LazyBatch": ".batch",
+    "StringPromptTemplate": ".string",
+    "ChatPromptTemplate": ".chat",
+    "ChatMessage": ".chat",
+    "ChatRenderSession": ".chat",
+    "TemplateMessage": ".chat",
+    "FewShotPromptTemplate": ".few_shot",
+    "BaseExampleSelector": ".example_selectors",
+    "LengthBasedExampleSelector": ".example_selectors",
+    "SemanticSimilarityExampleSelector": ".example_selectors",
+    "HashingEmbedder": ".example_selectors",
+    "ChatPromptBuilder": ".builder",
+    "convert_template": ".converters",
+    "TemplateRegistry": ".registry",
+    "default_registry": ".registry",
+    "PrefixSplit": ".prefix",
+    "OutputCache": ".output_cache",
+    "approximate_token_count": ".lengths",
+    "render_bulk": ".bulk",
+    "render_bulk_chunks": ".bulk",
+    "read_jsonl": ".bulk",
+    "TemplateLibrary": ".library",
+    "template_from_dict": ".template_types",
+    "write_library": ".library",
+    "MetricsCollector": ".instrumentation",
+    "RenderEvent": ".instrumentation",
+    "add_hook": ".instrumentation",
+    "remove_hook": ".instrumentation",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> "Any":
+    try:
+        module_name = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value  # Следующие обращения не проходят через __getattr__
+    return value
+
+
+def __dir__() -> "List[str]":
+    return sorted(set(globals()) | set(__all__))
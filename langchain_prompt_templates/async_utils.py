@@ -0,0 +1,66 @@
+"""Вспомогательные функции для асинхронного форматирования шаблонов.
+
+asyncio и inspect объявлены через LazyModule: корутины выполняются только
+в уже запущенном цикле событий, поэтому к их вызову оба модуля загружены,
+а синхронное использование пакета не платит за их импорт.
+"""
+
+from typing import Any, Dict, Iterable, List, Mapping, TYPE_CHECKING
+
+from .lazy import LazyModule
+
+if TYPE_CHECKING:
+    import asyncio
+    import inspect
+else:
+    asyncio = LazyModule("asyncio")
+    inspect = LazyModule("inspect")
+
+# Через сколько отрендеренных частей (сообщений, примеров, строк пакета) отдавать управление циклу событий
+ASYNC_YIELD_EVERY = 256
+
+# Ограничение на число одновременно разрешаемых асинхронных переменных по умолчанию
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+def _is_async_callable(value: Any) -> bool:
+    return inspect.iscoroutinefunction(value) or (
+        callable(value) and inspect.iscoroutinefunction(getattr(value, "__call__", None))
+    )
+
+
+async def _resolve_value(value: Any, semaphore: 'asyncio.Semaphore') -> Any:
+    async with semaphore:
+        if _is_async_callable(value):
+            value = value()
+        return await value
+
+
+async def resolve_variables(values: Mapping[str, Any], semaphore: 'asyncio.Semaphore') -> Dict[str, Any]:
+    """
+    Разрешает переменные-awaitable и асинхронные вызываемые объекты конкурентно.
+
+    Обычные значения возвращаются как есть; число одновременных ожиданий
+    ограничивается семафором.
+    """
+    pending = [
+        name for name, value in values.items()
+        if inspect.isawaitable(value) or _is_async_callable(value)
+    ]
+    if not pending:
+        return dict(values)
+
+    resolved = dict(values)
+    results = await asyncio.gather(*(_resolve_value(values[name], semaphore) for name in pending))
+    resolved.update(zip(pending, results))
+    return resolved
+
+
+async def join_chunks(chunks: Iterable[str], yield_every: int = ASYNC_YIELD_EVERY) -> str:
+    """Склеивает части результата, периодически отдавая управление циклу событий."""
+    parts: List[str] = []
+    for i, chunk in enumerate(chunks, 1):
+        parts.append(chunk)
+        if i % yield_every == 0:
+            await asyncio.sleep(0)
+    return "".join(parts)
@@ -1,16 +1,53 @@
 """Базовые абстрактные классы для всех типов промт-шаблонов."""
 
+import copy
+import io
+from itertools import count
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Type, Optional, TYPE_CHECKING
+from typing import Dict, List, Any, Type, Optional, Awaitable, Callable, FrozenSet, Hashable, IO, Iterable, Iterator, Mapping, Sequence, Tuple, Union, TYPE_CHECKING
+
+from .async_utils import ASYNC_YIELD_EVERY, DEFAULT_MAX_CONCURRENCY, asyncio, resolve_variables
+from .batch import ColumnRows, LazyBatch, check_rows
+from .instrumentation import instrument_class
+from .lengths import TokenCounter, approximate_token_count
+from .output_cache import OutputCache, canonical_values
+from .prefix import PrefixSplit
+from .registry import default_registry
 
 if TYPE_CHECKING:
     from .string import StringPromptTemplate
     from .chat import ChatPromptTemplate
     from .few_shot import FewShotPromptTemplate
 
+# Идентификаторы шаблонов в ключах кэша результатов: в отличие от id() не переиспользуются
+_cache_tokens = count()
+
 class PromptTemplateBase(ABC):
     """Абстрактный базовый класс для всех типов шаблонов промтов с поддержкой преобразований."""
     
+    # Счетчик версий: увеличивается при каждом изменении содержимого шаблона
+    _version: int = 0
+    
+    # Максимальное число одновременно разрешаемых асинхронных переменных в aformat
+    async_max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    
+    # True для общих экземпляров в реестре шаблонов и кэше преобразований: их нельзя изменять
+    _frozen: bool = False
+    
+    # Имя шаблона в метриках инструментирования (по умолчанию метка строится из содержимого)
+    metrics_name: Optional[str] = None
+    
+    # (версия содержимого, хеш статического префикса, данные префикса для _split_prefix)
+    _prefix_cache = (None, None, None)
+    
+    # Кэш результатов format, подключенный enable_output_cache
+    output_cache: Optional[OutputCache] = None
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Классы, объявленные при уже зарегистрированных хуках, инструментируются сразу
+        instrument_class(cls)
+    
     def __init__(self, input_variables: List[str], **kwargs):
         """
         Инициализация шаблона промта.
@@ -32,6 +69,372 @@ class PromptTemplateBase(ABC):
         """Проверяет, что все необходимые переменные предоставлены для форматирования."""
         pass
     
+    def format_iter(self, **kwargs) -> Iterator[str]:
+        """
+        Форматирует шаблон, выдавая результат строковыми частями.
+        
+        Реализация по умолчанию выдает весь результат format одной частью;
+        подклассы переопределяют метод, чтобы не держать весь промт в памяти.
+        """
+        yield str(self.format(**kwargs))
+    
+    def format_to(self, fp: IO, **kwargs) -> int:
+        """
+        Записывает отформатированный шаблон в файлоподобный объект по частям.
+        
+        Args:
+            fp: Текстовый или бинарный поток (для бинарного используется кодировка UTF-8)
+            **kwargs: Переменные для подстановки
+            
+        Returns:
+            Количество записанных символов (для бинарного потока — байтов)
+        """
+        binary = isinstance(fp, (io.RawIOBase, io.BufferedIOBase)) or "b" in getattr(fp, "mode", "")
+        written = 0
+        for chunk in self.format_iter(**kwargs):
+            if binary:
+                chunk = chunk.encode("utf-8")
+            fp.write(chunk)
+            written += len(chunk)
+        return written
+    
+    def format_batch(self, rows: Iterable[Mapping[str, Any]], *,
+                     lazy: bool = False) -> Union[List[Any], LazyBatch]:
+        """
+        Форматирует шаблон для набора словарей с переменными.
+        
+        Args:
+            rows: Словари с переменными, по одному на каждый результат
+            lazy: Если True, возвращает LazyBatch, рендерящий элементы при обращении
+            
+        Returns:
+            Список результатов (или LazyBatch) в порядке входных строк
+        """
+        if not isinstance(rows, Sequence):
+            rows = list(rows)
+        check_rows(rows, self._required_variable_set())
+        return self._render_rows(rows, lazy)
+    
+    def format_many(self, *, lazy: bool = False, **columns: Sequence[Any]) -> Union[List[Any], LazyBatch]:
+        """
+        Форматирует шаблон для колонок значений одинаковой длины.
+        
+        Пример:
+        template.format_many(concept=["списки", "словари"], domain=["Python", "Python"])
+        """
+        rows = ColumnRows(columns)
+        # Все строки имеют одинаковый набор ключей, поэтому проверка выполняется один раз
+        missing = self._required_variable_set() - columns.keys()
+        if missing:
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        return self._render_rows(rows, lazy)
+    
+    def format_columns(self, **columns: Sequence[Any]) -> List[Any]:
+        """
+        Форматирует шаблон для колонок значений одинаковой длины (списков или массивов NumPy).
+        
+        В отличие от format_many, подклассы раскладывают колонки на уникальные значения
+        и рендерят каждую часть шаблона один раз на уникальную комбинацию используемых
+        ею переменных, поэтому колонки с небольшим числом различных значений
+        обрабатываются без повторного форматирования. Реализация по умолчанию
+        эквивалентна format_many.
+        
+        Пример:
+        template.format_columns(domain=["Python"] * 3, concept=["списки", "словари", "множества"])
+        """
+        return self.format_many(**columns)
+    
+    def estimate_length(self, **kwargs) -> int:
+        """
+        Возвращает длину отформатированного промта в символах.
+        
+        Подклассы вычисляют длину из заранее посчитанных длин статических частей
+        и длин значений переменных, не собирая промт. Реализация по умолчанию
+        форматирует шаблон и измеряет результат.
+        """
+        return sum(map(len, self.format_iter(**kwargs)))
+    
+    def count_tokens(self, *, counter: Optional[TokenCounter] = None, **kwargs) -> int:
+        """
+        Оценивает число токенов отформатированного промта.
+        
+        Подклассы суммируют заранее посчитанные токены статических частей и токены
+        значений переменных, не собирая промт; токены на границах частей могут
+        сливаться, поэтому результат — оценка. Реализация по умолчанию считает
+        токены всего отформатированного текста.
+        
+        Args:
+            counter: Функция подсчета токенов в строке (например, на основе токенизатора
+                модели); по умолчанию approximate_token_count
+            **kwargs: Переменные для подстановки
+        """
+        if counter is None:
+            counter = approximate_token_count
+        return counter("".join(self.format_iter(**kwargs)))
+    
+    def format_split(self, **kwargs) -> PrefixSplit:
+        """
+        Форматирует шаблон, разделяя результат на статический префикс и динамический остаток.
+        
+        Префикс — самая длинная начальная часть результата, не зависящая от переменных;
+        он и его хеш вычисляются один раз на версию шаблона. Запросы с одинаковым
+        prefix_hash имеют одинаковое начало промта, поэтому их можно направлять на одну
+        реплику и переиспользовать KV-кэш.
+        """
+        required = self._required_variable_set()
+        if not kwargs.keys() >= required:
+            missing = required - kwargs.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        prefix_hash, data = self._prefix_plan()
+        return self._split_prefix(prefix_hash, data, kwargs)
+    
+    def static_prefix_hash(self) -> str:
+        """Возвращает хеш статического префикса без форматирования шаблона."""
+        return self._prefix_plan()[0]
+    
+    def enable_output_cache(self, cache: Optional[OutputCache] = None) -> OutputCache:
+        """
+        Подключает к шаблону кэш готовых результатов format.
+        
+        Ключ записи включает версию содержимого шаблона, поэтому после изменения
+        шаблона (update_message, add_example и т.п.) старые результаты не выдаются.
+        Один кэш можно разделять между несколькими шаблонами; статистика
+        доступна через cache.stats().
+        
+        Args:
+            cache: Кэш для подключения; по умолчанию создается новый OutputCache
+            
+        Returns:
+            Подключенный кэш
+        """
+        if cache is None:
+            cache = OutputCache()
+        self.output_cache = cache
+        self._cache_token = next(_cache_tokens)
+        # Атрибут экземпляра перекрывает метод класса, поэтому шаблоны без кэша не платят за проверку
+        self.format = self._cached_format
+        return cache
+    
+    def disable_output_cache(self) -> None:
+        """Отключает кэш результатов format."""
+        self.__dict__.pop("format", None)
+        self.__dict__.pop("output_cache", None)
+    
+    def _cached_format(self, **kwargs) -> Any:
+        """Возвращает результат format из кэша, при промахе форматирует и запоминает его."""
+        render = type(self).format
+        values = canonical_values(kwargs) if self._output_cacheable() else None
+        if values is None:
+            return render(self, **kwargs)
+        
+        cache = self.output_cache
+        key = (self._cache_token, self._conversion_version(), values)
+        result = cache.get(key)
+        if result is None:
+            result = render(self, **kwargs)
+            cache.put(key, self._copy_output(result))
+            return result
+        return self._copy_output(result)
+    
+    def _output_cacheable(self) -> bool:
+        """True, если результат format определяется только содержимым шаблона и переменными."""
+        return True
+    
+    def _copy_output(self, result: Any) -> Any:
+        """Возвращает копию результата format, которую можно изменять, не затрагивая кэш."""
+        return result
+    
+    async def aformat(self, **kwargs) -> Any:
+        """
+        Асинхронно форматирует шаблон.
+        
+        Значениями переменных могут быть awaitable-объекты или асинхронные
+        вызываемые объекты: они разрешаются конкурентно, не более
+        async_max_concurrency одновременно.
+        """
+        values = await resolve_variables(kwargs, asyncio.Semaphore(self.async_max_concurrency))
+        missing = self._required_variable_set() - values.keys()
+        if missing:
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        return await self._async_render_plan()(values)
+    
+    async def aformat_batch(self, rows: Iterable[Mapping[str, Any]], *,
+                            max_concurrency: Optional[int] = None,
+                            yield_every: int = ASYNC_YIELD_EVERY) -> List[Any]:
+        """
+        Асинхронно форматирует шаблон для набора словарей с переменными.
+        
+        Args:
+            rows: Словари с переменными, значения могут быть awaitable
+            max_concurrency: Общий для всего пакета лимит одновременных ожиданий
+                (по умолчанию async_max_concurrency)
+            yield_every: Через сколько строк отдавать управление циклу событий
+        """
+        if not isinstance(rows, Sequence):
+            rows = list(rows)
+        check_rows(rows, self._required_variable_set())
+        semaphore = asyncio.Semaphore(max_concurrency or self.async_max_concurrency)
+        render = self._async_render_plan()
+        
+        results = []
+        for start in range(0, len(rows), yield_every):
+            chunk = rows[start:start + yield_every]
+            resolved = await asyncio.gather(*(resolve_variables(row, semaphore) for row in chunk))
+            for values in resolved:
+                results.append(await render(values))
+            # Отдаем управление, чтобы большой пакет не задерживал другие корутины
+            await asyncio.sleep(0)
+        return results
+    
+    def _render_rows(self, rows: Sequence[Mapping[str, Any]], lazy: bool) -> Union[List[Any], LazyBatch]:
+        """Рендерит проверенные строки пакета подготовленной функцией рендеринга."""
+        render = self._render_plan()
+        if lazy:
+            return LazyBatch(rows, render)
+        return list(map(render, rows))
+    
+    def _check_mutable(self) -> None:
+        """Запрещает изменение общих экземпляров из реестра шаблонов."""
+        if self._frozen:
+            raise TypeError(
+                f"{type(self).__name__} получен из общего реестра и не может изменяться; "
+                "создайте шаблон с shared=False"
+            )
+    
+    def _content_key(self) -> Hashable:
+        """
+        Возвращает хешируемый ключ содержимого шаблона.
+        
+        Подклассы возвращают ключ, по которому шаблоны с одинаковым содержимым совпадают;
+        реализация по умолчанию различает шаблоны по идентичности.
+        """
+        return (type(self), id(self))
+    
+    def _content_keyed(self) -> bool:
+        """
+        Возвращает True, если _content_key различает шаблоны по содержимому.
+        
+        Ключ по идентичности нельзя хранить в реестре: после сборки шаблона его id
+        может получить другой шаблон, который тогда найдет чужую запись.
+        """
+        return type(self)._content_key is not PromptTemplateBase._content_key
+    
+    @classmethod
+    def _from_registry(cls, key: Hashable, factory: Callable[[], 'PromptTemplateBase']) -> 'PromptTemplateBase':
+        """
+        Возвращает изменяемый экземпляр, разделяющий данные с общим экземпляром из реестра.
+        
+        Общий экземпляр создается при промахе и замораживается; вызывающий получает
+        его копию _fork, поэтому изменения одного вызывающего не видны остальным.
+        """
+        try:
+            hash(key)
+        except TypeError:
+            return factory()  # Содержимое нехешируемо, поэтому шаблон не разделяется
+        
+        def create() -> 'PromptTemplateBase':
+            template = factory()
+            template._freeze()
+            return template
+        
+        return default_registry.get_or_create(key, create)._fork()
+    
+    def _freeze(self) -> None:
+        """
+        Делает шаблон неизменяемым общим экземпляром.
+        
+        Подклассы дополнительно заменяют изменяемые коллекции (списки сообщений,
+        примеров и переменных) кортежами, чтобы их нельзя было изменить на месте.
+        """
+        self._frozen = True
+    
+    def _fork(self) -> 'PromptTemplateBase':
+        """
+        Возвращает изменяемый шаблон с тем же содержимым (копирование при записи).
+        
+        Подклассы разделяют с исходным шаблоном неизменяемые данные и кэши плана
+        рендеринга, копируя только то, что может изменяться на месте; реализация
+        по умолчанию создает полную копию.
+        """
+        template = copy.deepcopy(self)
+        template.__dict__.pop("_frozen", None)
+        return template
+    
+    def _bump_version(self) -> None:
+        """Отмечает изменение шаблона, делая недействительными кэши, зависящие от его содержимого."""
+        self._version += 1
+    
+    def _required_variable_set(self) -> FrozenSet[str]:
+        """Возвращает множество переменных, обязательных для форматирования."""
+        return frozenset(self.input_variables)
+    
+    def _render_plan(self) -> Callable[[Mapping[str, Any]], Any]:
+        """
+        Возвращает функцию рендеринга для уже проверенного набора переменных.
+        
+        Подклассы переопределяют метод, вынося статическую работу из цикла по строкам пакета.
+        """
+        return lambda values: self.format(**values)
+    
+    def _async_render_plan(self) -> Callable[[Mapping[str, Any]], Awaitable[Any]]:
+        """
+        Возвращает асинхронную функцию рендеринга для уже проверенного и разрешенного набора переменных.
+        
+        Подклассы переопределяют метод, чтобы отдавать управление циклу событий при рендеринге больших шаблонов.
+        """
+        render = self._render_plan()
+        
+        async def arender(values: Mapping[str, Any]) -> Any:
+            return render(values)
+        
+        return arender
+    
+    def _prefix_plan(self) -> Tuple[str, Any]:
+        """
+        Возвращает хеш префикса и данные префикса, кэшированные до изменения шаблона.
+        
+        Данные — простые значения (строки и числа), а не замыкания, поэтому
+        шаблон после format_split по-прежнему сериализуется pickle.
+        """
+        version = self._conversion_version()
+        cached_version, prefix_hash, data = self._prefix_cache
+        if cached_version != version:
+            prefix_hash, data = self._build_prefix_plan()
+            self._prefix_cache = (version, prefix_hash, data)
+        return prefix_hash, data
+    
+    def _build_prefix_plan(self) -> Tuple[str, Any]:
+        """Строит хеш статического префикса и данные, по которым _split_prefix разделяет результат."""
+        raise NotImplementedError(f"{type(self).__name__} не поддерживает разбиение на префикс")
+    
+    def _split_prefix(self, prefix_hash: str, data: Any, values: Mapping[str, Any]) -> PrefixSplit:
+        """Форматирует шаблон для уже проверенных переменных и разделяет результат по данным префикса."""
+        raise NotImplementedError(f"{type(self).__name__} не поддерживает разбиение на префикс")
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Возвращает JSON-совместимое представление шаблона для библиотеки шаблонов.
+        
+        Представление содержит только исходные строки: разбор строки при загрузке
+        быстрее чтения сохраненных сегментов из JSON, а файл получается вдвое меньше.
+        """
+        raise NotImplementedError(f"{type(self).__name__} не поддерживает сериализацию")
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PromptTemplateBase':
+        """Восстанавливает шаблон из представления to_dict."""
+        raise NotImplementedError(f"{cls.__name__} не поддерживает сериализацию")
+    
+    def partial(self, **bound) -> 'PromptTemplateBase':
+        """
+        Возвращает новый шаблон, в который значения bound уже подставлены.
+        
+        Связанные переменные исключаются из input_variables и проверок, а части
+        шаблона, ставшие статическими, рендерятся один раз, поэтому format
+        обрабатывает только оставшиеся переменные.
+        """
+        raise NotImplementedError(f"{type(self).__name__} не поддерживает частичное применение")
+    
     @classmethod
     @abstractmethod
     def from_template(cls, template: Any, input_variables: List[str], **kwargs) -> 'PromptTemplateBase':
@@ -47,12 +450,19 @@ class PromptTemplateBase(ABC):
         }
     
     @abstractmethod
-    def to_string_template(self) -> 'StringPromptTemplate':
-        """Преобразует текущий шаблон в строковый шаблон."""
+    def to_string_template(self, shared: bool = True) -> 'StringPromptTemplate':
+        """
+        Преобразует текущий шаблон в строковый шаблон.
+        
+        Как и у остальных методов to_*_template, по умолчанию результат запоминается до
+        следующего изменения шаблона, а каждый вызов получает его изменяемую копию,
+        разделяющую с запомненным результатом неизменяемые данные и план рендеринга;
+        shared=False строит результат заново без запоминания.
+        """
         pass
     
     @abstractmethod
-    def to_chat_template(self) -> 'ChatPromptTemplate':
+    def to_chat_template(self, shared: bool = True) -> 'ChatPromptTemplate':
         """Преобразует текущий шаблон в чат-шаблон."""
         pass
     
@@ -60,10 +470,41 @@ class PromptTemplateBase(ABC):
     def to_few_shot_template(self, 
                             example_separator: str = "\n\n",
                             prefix: Optional[str] = None,
-                            suffix: Optional[str] = None) -> 'FewShotPromptTemplate':
+                            suffix: Optional[str] = None,
+                            shared: bool = True) -> 'FewShotPromptTemplate':
         """Преобразует текущий шаблон в few-shot шаблон."""
         pass
     
+    def _conversion(self, key: Hashable, build: Callable[[], 'PromptTemplateBase'],
+                    shared: bool) -> 'PromptTemplateBase':
+        """
+        Возвращает копию результата преобразования, запомненного до следующего изменения шаблона.
+        
+        Запомненный результат заморожен, а вызывающий получает его копию _fork,
+        поэтому результат можно изменять, не затрагивая других вызывающих.
+        
+        Args:
+            key: Целевой тип и параметры преобразования
+            build: Функция, создающая результат
+            shared: Если False, результат создается заново и не запоминается
+        """
+        if not shared:
+            return build()
+        version = self._conversion_version()
+        cache = self.__dict__.get("_conversions")
+        if cache is None:
+            cache = self._conversions = {}
+        entry = cache.get(key)
+        if entry is None or entry[0] != version:
+            result = build()
+            result._freeze()
+            entry = cache[key] = (version, result)
+        return entry[1]._fork()
+    
+    def _conversion_version(self) -> Hashable:
+        """Возвращает значение, изменяющееся вместе с содержимым, от которого зависят преобразования."""
+        return self._version
+    
     @classmethod
     def from_other_template(cls, source_template: 'PromptTemplateBase') -> 'PromptTemplateBase':
         """
@@ -82,6 +523,6 @@ class PromptTemplateBase(ABC):
         return source_template._convert_to(cls)
     
     @abstractmethod
-    def _convert_to(self, target_type: Type['PromptTemplateBase']) -> 'PromptTemplateBase':
+    def _convert_to(self, target_type: Type['PromptTemplateBase'], shared: bool = True) -> 'PromptTemplateBase':
         """Внутренний метод для преобразования в указанный тип."""
         pass
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""Вспомогательные структуры для пакетного форматирования шаблонов."""
+
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+from .value_keys import EXACT_TYPES, format_key
+
+
+def check_rows(rows: Sequence[Mapping[str, Any]], required: FrozenSet[str]) -> None:
+    """
+    Проверяет, что каждая строка пакета содержит все обязательные переменные.
+
+    Набор ключей проверяется один раз для каждой уникальной формы строки.
+    """
+    checked: Set[Tuple[str, ...]] = set()
+    for row in rows:
+        shape = tuple(row)
+        if shape in checked:
+            continue
+        missing = required - row.keys()
+        if missing:
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        checked.add(shape)
+
+
+# Число первых значений колонки, по которым оценивается доля повторов
+FACTORIZE_SAMPLE = 1024
+
+
+def column_length(columns: Mapping[str, Sequence[Any]]) -> int:
+    """Возвращает общую длину колонок; колонки разной длины — ошибка."""
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Колонки должны иметь одинаковую длину, получено: {sorted(lengths)}")
+    return lengths.pop() if lengths else 0
+
+
+def factorize(column: Sequence[Any]) -> Tuple[Optional[List[int]], List[Any]]:
+    """
+    Раскладывает колонку на коды строк и уникальные значения.
+
+    values[codes[i]] — значение i-й строки; codes равен None, если все значения
+    различны и values совпадает с колонкой. Значения объединяются по ключам
+    format_key, поэтому по-разному форматируемые значения (1, 1.0 и True; 0.0 и -0.0)
+    не совпадают, а колонка со значениями, для которых ключ построить нельзя
+    (Decimal, типы NumPy, пользовательские объекты), не сжимается.
+    """
+    if getattr(column, "ndim", None) == 1:
+        column = _numpy_values(column)
+
+    types = set(map(type, column))
+    if len(types) == 1 and types <= EXACT_TYPES:
+        keys = column  # Равные значения одного такого типа форматируются одинаково
+    else:
+        keys = list(map(format_key, column))
+        if None in keys:
+            return None, list(column)
+
+    if len(column) > FACTORIZE_SAMPLE * 4:
+        # Колонку почти без повторов (например, идентификаторы) раскладывать бесполезно
+        if len(set(keys[:FACTORIZE_SAMPLE])) > FACTORIZE_SAMPLE * 0.9:
+            return None, list(column)
+
+    index: Dict[Any, int] = {}
+    codes: List[int]
+    values: List[Any]
+    if keys is column:
+        codes = [index.setdefault(value, len(index)) for value in column]
+        values = list(index)
+    else:
+        codes = []
+        values = []
+        for key, value in zip(keys, column):
+            code = index.get(key)
+            if code is None:
+                code = index[key] = len(values)
+                values.append(value)
+            codes.append(code)
+    if len(values) == len(codes):
+        return None, values  # Все значения различны: коды совпадают с номерами строк
+    return codes, values
+
+
+def _numpy_values(array: Any) -> Sequence[Any]:
+    """Возвращает значения одномерного массива NumPy в виде, который форматируется так же."""
+    dtype = array.dtype
+    # Целые, логические, строковые и float64 значения форматируются так же, как их аналоги в Python,
+    # остальные (например, float32) сохраняют типы NumPy
+    if dtype.kind in "biuUS" or (dtype.kind == "f" and dtype.itemsize == 8):
+        return array.tolist()
+    return list(array)
+
+
+class FactorizedColumns:
+    """
+    Колонки значений для колоночного рендеринга.
+
+    Колонки раскладываются на коды и уникальные значения только при первом
+    обращении, а наборы переменных — на коды уникальных комбинаций, поэтому
+    части шаблона, использующие одни и те же переменные, разделяют разложение.
+    """
+
+    def __init__(self, columns: Mapping[str, Sequence[Any]]):
+        self.columns = columns
+        self.length = column_length(columns)
+        self._factors: Dict[str, Tuple[Optional[List[int]], List[Any]]] = {}
+        self._groups: Dict[Tuple[str, ...], Tuple[Optional[List[int]], List[Dict[str, Any]]]] = {}
+
+    def factor(self, name: str) -> Tuple[Optional[List[int]], List[Any]]:
+        """Возвращает коды (None, если все значения различны) и уникальные значения колонки name."""
+        factor = self._factors.get(name)
+        if factor is None:
+            factor = self._factors[name] = factorize(self.columns[name])
+        return factor
+
+    def group(self, names: Tuple[str, ...]) -> Tuple[Optional[List[int]], List[Dict[str, Any]]]:
+        """
+        Возвращает коды строк и значения переменных names для каждой уникальной комбинации.
+
+        Коды равны None, если все комбинации различны и идут в порядке строк.
+        """
+        group = self._groups.get(names)
+        if group is not None:
+            return group
+        if not names:
+            group = ([0] * self.length, [{}])
+        elif len(names) == 1:
+            name = names[0]
+            codes, values = self.factor(name)
+            group = (codes, [{name: value} for value in values])
+        else:
+            factors = [self.factor(name) for name in names]
+            if any(codes is None for codes, _ in factors):
+                # Одна из колонок уникальна, значит уникальны и комбинации
+                group = (None, [dict(zip(names, row)) for row in zip(*(self._expand(factor) for factor in factors))])
+            else:
+                index: Dict[Tuple[int, ...], int] = {}
+                codes = [index.setdefault(key, len(index)) for key in zip(*(codes for codes, _ in factors))]
+                combinations = [
+                    {name: values[code] for name, (_, values), code in zip(names, factors, key)}
+                    for key in index
+                ]
+                group = (None if len(combinations) == len(codes) else codes, combinations)
+        self._groups[names] = group
+        return group
+
+    @staticmethod
+    def _expand(factor: Tuple[Optional[List[int]], List[Any]]) -> List[Any]:
+        codes, values = factor
+        return values if codes is None else [values[code] for code in codes]
+
+
+class ColumnRows(Sequence):
+    """Представление набора колонок одинаковой длины в виде последовательности словарей."""
+
+    def __init__(self, columns: Mapping[str, Sequence[Any]]):
+        self._length = column_length(columns)
+        self.names: Tuple[str, ...] = tuple(columns)
+        self.columns: Tuple[Sequence[Any], ...] = tuple(columns.values())
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ColumnRows({name: column[index] for name, column in zip(self.names, self.columns)})
+        return dict(zip(self.names, [column[index] for column in self.columns]))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        names = self.names
+        for values in zip(*self.columns):
+            yield dict(zip(names, values))
+
+
+class LazyBatch(Sequence):
+    """
+    Лениво материализуемая последовательность результатов пакетного форматирования.
+
+    Каждый элемент рендерится только при обращении к нему, поэтому полный
+    список результатов никогда не хранится в памяти.
+    """
+
+    def __init__(self, rows: Sequence[Mapping[str, Any]], render: Callable[[Mapping[str, Any]], Any]):
+        self._rows = rows
+        self._render = render
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazyBatch(self._rows[index], self._render)
+        return self._render(self._rows[index])
+
+    def __iter__(self) -> Iterator[Any]:
+        return map(self._render, self._rows)
+
+    def to_list(self) -> List[Any]:
+        """Материализует все результаты в список."""
+        return list(self)
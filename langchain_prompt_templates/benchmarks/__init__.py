@@ -0,0 +1 @@
+"""Микробенчмарки производительности промт-шаблонов."""
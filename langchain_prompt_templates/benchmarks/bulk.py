@@ -0,0 +1,46 @@
+"""Масштабирование массового рендеринга по числу процессов.
+
+Запуск: python -m langchain_prompt_templates.benchmarks.bulk
+"""
+
+import os
+import time
+from typing import Dict
+
+from ..bulk import render_bulk_chunks
+from ..few_shot import FewShotPromptTemplate
+from ..string import StringPromptTemplate
+
+
+def _template() -> FewShotPromptTemplate:
+    example_template = StringPromptTemplate.from_template("Вопрос: {question}\nОтвет: {answer} ({input})",
+                                                          ["question", "answer"])
+    return FewShotPromptTemplate.from_examples(
+        examples=[{"question": f"Вопрос {i}", "answer": f"Ответ {i}"} for i in range(50)],
+        example_prompt=example_template,
+        prefix="Решите следующие задачи:\n",
+        suffix="\nВопрос: {input}\nОтвет:",
+        input_variables=["input"],
+    )
+
+
+def run(rows: int = 200_000, chunk_size: int = 2_000) -> Dict[int, float]:
+    """Возвращает пропускную способность (строк в секунду) для разного числа процессов."""
+    template = _template()
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cpu_count} & set(range(1, cpu_count + 1)))
+    results = {}
+    for workers in worker_counts:
+        start = time.perf_counter()
+        rendered = sum(len(chunk) for chunk in render_bulk_chunks(
+            template, ({"input": f"запрос {i}"} for i in range(rows)),
+            max_workers=workers, chunk_size=chunk_size))
+        results[workers] = rendered / (time.perf_counter() - start)
+    return results
+
+
+if __name__ == "__main__":
+    results = run()
+    single = results[1]
+    for workers, throughput in results.items():
+        print(f"{workers:>3} процессов: {throughput:,.0f} строк/с (x{throughput / single:.2f})")
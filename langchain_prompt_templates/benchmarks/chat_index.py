@@ -0,0 +1,47 @@
+"""Бенчмарк инкрементального индекса переменных ChatPromptTemplate.
+
+Шаблон наращивается до 10 000 сообщений с чередующимися правками
+(update_message и remove_message). При полном пересканировании всех
+сообщений на каждую правку время росло бы квадратично.
+
+Запуск: python -m langchain_prompt_templates.benchmarks.chat_index
+"""
+
+import time
+from typing import Dict
+
+from ..chat import ChatPromptTemplate
+
+
+def grow_with_edits(size: int, edit_every: int = 10) -> ChatPromptTemplate:
+    """Наращивает шаблон до size сообщений, выполняя правку каждые edit_every вставок."""
+    template = ChatPromptTemplate.from_messages(("system", "Ты {role} по {domain}."), shared=False)
+    step = 0
+    while len(template.messages) < size:
+        step += 1
+        template.add_user_message(f"Вопрос {step} про {{topic{step % 100}}}")
+        if step % edit_every == 0:
+            index = step % len(template.messages)
+            template.update_message(index, new_content=f"Правка {step}: {{topic{step % 37}}}")
+        if step % (edit_every * 3) == 0:
+            template.remove_message(len(template.messages) // 2)
+    return template
+
+
+def run(sizes=(1_000, 2_500, 5_000, 10_000)) -> Dict[int, float]:
+    """Возвращает время построения шаблона для каждого размера, в секундах."""
+    results = {}
+    for size in sizes:
+        start = time.perf_counter()
+        template = grow_with_edits(size)
+        results[size] = time.perf_counter() - start
+
+        # Индекс должен совпадать с полным пересканированием сообщений
+        expected = {var for msg in template.messages for var in template._extract_variables(msg["content"])}
+        assert set(template._variable_refs) == expected
+    return results
+
+
+if __name__ == "__main__":
+    for size, elapsed in run().items():
+        print(f"{size:>6} сообщений: {elapsed:.3f}s ({elapsed / size * 1e6:.1f} мкс на операцию)")
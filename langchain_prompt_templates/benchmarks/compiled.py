@@ -0,0 +1,36 @@
+"""Сравнение скомпилированного плана рендеринга с обычным str.format.
+
+Запуск: python -m langchain_prompt_templates.benchmarks.compiled
+"""
+
+import timeit
+from typing import Dict, Tuple
+
+from ..compiled import compile_template
+
+CASES: Dict[str, Tuple[str, Dict[str, str]]] = {
+    "short": ("Объясни, что такое {concept}, простыми словами.", {"concept": "нейронные сети"}),
+    "long": ("Контекст. " * 300 + "{context}" + " Вопрос." * 300 + "{question}",
+             {"context": "документ", "question": "что это?"}),
+    "many_vars": (" ".join(f"{{var{i}}}" for i in range(50)),
+                  {f"var{i}": f"значение {i}" for i in range(50)}),
+}
+
+
+def run(number: int = 100_000) -> Dict[str, Dict[str, float]]:
+    """Возвращает время (в секундах) на number рендеров для каждого случая."""
+    results = {}
+    for name, (template, values) in CASES.items():
+        compiled = compile_template(template)
+        assert compiled.render(values) == template.format(**values)
+
+        baseline = min(timeit.repeat(lambda: template.format(**values), number=number, repeat=5))
+        plan = min(timeit.repeat(lambda: compiled.render(values), number=number, repeat=5))
+        results[name] = {"str.format": baseline, "compiled": plan, "speedup": baseline / plan}
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(f"{name:>10}: str.format {result['str.format']:.4f}s, "
+              f"compiled {result['compiled']:.4f}s, x{result['speedup']:.2f}")
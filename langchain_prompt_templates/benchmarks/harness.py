@@ -0,0 +1,115 @@
+"""Измерение времени операций с перцентилями и сравнение результатов с базовой линией."""
+
+import json
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List, NamedTuple
+
+# Минимальная длительность одного замера: быстрые операции повторяются внутри замера
+MIN_SAMPLE_SECONDS = 0.0002
+
+
+class Measurement(NamedTuple):
+    """Результат измерения одной операции; времена указаны в микросекундах на вызов."""
+    p50_us: float
+    p90_us: float
+    p99_us: float
+    mean_us: float
+    ops_per_sec: float
+    samples: int
+    inner: int  # Число вызовов в одном замере
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль q (от 0 до 100) отсортированного списка с линейной интерполяцией."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def _calibrate(operation: Callable[[], Any]) -> int:
+    """Подбирает число вызовов в замере так, чтобы замер длился не меньше MIN_SAMPLE_SECONDS."""
+    inner = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(inner):
+            operation()
+        if time.perf_counter() - start >= MIN_SAMPLE_SECONDS or inner >= 1 << 20:
+            return inner
+        inner *= 2
+
+
+def measure(operation: Callable[[], Any], samples: int = 50) -> Measurement:
+    """Измеряет операцию: samples замеров по inner вызовов после прогрева и калибровки."""
+    inner = _calibrate(operation)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(inner):
+            operation()
+        timings.append((time.perf_counter() - start) / inner * 1e6)
+    timings.sort()
+    mean = sum(timings) / len(timings)
+    return Measurement(
+        p50_us=percentile(timings, 50),
+        p90_us=percentile(timings, 90),
+        p99_us=percentile(timings, 99),
+        mean_us=mean,
+        ops_per_sec=1e6 / mean if mean else float("inf"),
+        samples=samples,
+        inner=inner,
+    )
+
+
+def environment() -> Dict[str, str]:
+    """Описание окружения, сохраняемое вместе с результатами."""
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def save(report: Dict[str, Any], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=2)
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float = 0.10, metric: str = "p50_us") -> List[Dict[str, Any]]:
+    """
+    Сравнивает результаты с базовой линией по общим случаям.
+
+    Args:
+        results: Текущие результаты {идентификатор случая: измерение}
+        baseline: Результаты базовой линии в том же формате
+        threshold: Допустимое относительное замедление (0.10 — на 10%)
+        metric: Сравниваемая метрика
+
+    Returns:
+        Строки сравнения: case, baseline, current, ratio и regression (True при замедлении сверх порога)
+    """
+    rows = []
+    for case, current in results.items():
+        base = baseline.get(case)
+        if base is None or not base[metric]:
+            continue
+        ratio = current[metric] / base[metric]
+        rows.append({
+            "case": case,
+            "baseline": base[metric],
+            "current": current[metric],
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold,
+        })
+    return rows
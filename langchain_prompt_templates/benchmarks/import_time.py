@@ -0,0 +1,73 @@
+"""Время холодного импорта пакета с бюджетом для CI.
+
+Каждый вариант импорта выполняется в отдельном чистом интерпретаторе;
+берется лучшее из нескольких запусков. Если время хотя бы одного варианта
+превышает бюджет или импорт пакета загружает модуль из LAZY_MODULES, модуль
+завершается с кодом 1. Те же проверки выполняет tests/test_import_time.py.
+
+Запуск: python -m langchain_prompt_templates.benchmarks.import_time
+"""
+
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Импортируемый код -> бюджет в миллисекундах: около полутора измеренных времен
+# (0.5 / 25 / 40 / 29 / 47 мс), чтобы ловить регрессии, но не шум CI
+BUDGETS_MS: Dict[str, float] = {
+    "import langchain_prompt_templates": 2.0,
+    "from langchain_prompt_templates import StringPromptTemplate": 40.0,
+    "from langchain_prompt_templates import ChatPromptTemplate": 60.0,
+    "from langchain_prompt_templates import FewShotPromptTemplate": 45.0,
+    "from langchain_prompt_templates import *": 75.0,
+}
+
+# Модули, которые не должны загружаться при импорте пакета (см. lazy.LazyModule)
+LAZY_MODULES = ("asyncio", "logging", "hashlib", "numpy", "concurrent.futures.process")
+
+_MEASURE = """
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(statement: str, repeat: int = 5) -> float:
+    """Возвращает лучшее за repeat запусков время выполнения statement в новом процессе (мс)."""
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _MEASURE.format(statement=statement)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        timings.append(float(output) * 1000)
+    return min(timings)
+
+
+def eagerly_loaded(statement: str = "from langchain_prompt_templates import *") -> List[str]:
+    """Возвращает модули из LAZY_MODULES, загруженные выполнением statement в новом процессе."""
+    output = subprocess.run(
+        [sys.executable, "-c", f"import sys\n{statement}\nprint(*sorted(sys.modules))"],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    loaded = set(output.split())
+    return [name for name in LAZY_MODULES if name in loaded]
+
+
+def run(repeat: int = 5) -> Dict[str, Tuple[float, float]]:
+    """Возвращает для каждого варианта импорта пару (время в мс, бюджет в мс)."""
+    return {statement: (measure(statement, repeat), budget) for statement, budget in BUDGETS_MS.items()}
+
+
+if __name__ == "__main__":
+    failed = False
+    for statement, (elapsed, budget) in run().items():
+        over = elapsed > budget
+        failed = failed or over
+        print(f"{elapsed:8.1f} ms / {budget:6.1f} ms  {'ПРЕВЫШЕН' if over else 'ok':>8}  {statement}")
+    eager = eagerly_loaded()
+    if eager:
+        failed = True
+        print(f"Загружены при импорте пакета: {', '.join(eager)}")
+    sys.exit(1 if failed else 0)
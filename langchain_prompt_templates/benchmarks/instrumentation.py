@@ -0,0 +1,60 @@
+"""Накладные расходы инструментирования на format.
+
+Без зарегистрированных хуков методы шаблонов остаются исходными функциями,
+поэтому время "без хуков" и "после удаления хука" должно совпадать с точностью
+до шума; модуль дополнительно проверяет, что методы восстановлены.
+
+Запуск: python -m langchain_prompt_templates.benchmarks.instrumentation
+"""
+
+import timeit
+from typing import Dict
+
+from ..chat import ChatPromptTemplate
+from ..instrumentation import MetricsCollector, add_hook, remove_hook
+from ..string import StringPromptTemplate
+
+
+def _time(template, values, number: int) -> float:
+    return min(timeit.repeat(lambda: template.format(**values), number=number, repeat=7)) / number * 1e6
+
+
+def run(number: int = 100_000) -> Dict[str, Dict[str, float]]:
+    """Возвращает время одного format (мкс) без хуков, после удаления хука, с пустым хуком и с MetricsCollector."""
+    cases = {
+        "string": (StringPromptTemplate("Объясни {concept} для {audience}", ["concept", "audience"]),
+                   {"concept": "замыкания", "audience": "новичков"}),
+        "chat": (ChatPromptTemplate.from_messages(("system", "Ты {role}"), ("user", "Объясни {concept}"),
+                                                  shared=False),
+                 {"role": "преподаватель", "concept": "замыкания"}),
+    }
+    originals = {cls: cls.__dict__["format"] for cls in (StringPromptTemplate, ChatPromptTemplate)}
+    results = {name: {} for name in cases}
+
+    for name, (template, values) in cases.items():
+        results[name]["no_hooks"] = _time(template, values, number)
+
+    def noop(event) -> None:
+        pass
+
+    add_hook(noop)
+    for name, (template, values) in cases.items():
+        results[name]["noop_hook"] = _time(template, values, number)
+    remove_hook(noop)
+
+    collector = MetricsCollector()
+    add_hook(collector)
+    for name, (template, values) in cases.items():
+        results[name]["collector"] = _time(template, values, number)
+    remove_hook(collector)
+
+    for cls, func in originals.items():
+        assert cls.__dict__["format"] is func, f"{cls.__name__}.format не восстановлен после remove_hook"
+    for name, (template, values) in cases.items():
+        results[name]["after_remove"] = _time(template, values, number)
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(f"{name:>8}: " + ", ".join(f"{key} {value:.3f} мкс" for key, value in result.items()))
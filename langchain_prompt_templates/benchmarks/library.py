@@ -0,0 +1,64 @@
+"""Сравнение загрузки шаблонов из библиотеки с их созданием из исходных строк.
+
+Запуск: python -m langchain_prompt_templates.benchmarks.library
+"""
+
+import os
+import tempfile
+import time
+from typing import Dict
+
+from ..chat import ChatPromptTemplate
+from ..library import TemplateLibrary, write_library
+from ..tokenizer import clear_tokenize_cache
+
+
+def _build_templates(count: int) -> Dict[str, ChatPromptTemplate]:
+    templates = {}
+    for i in range(count):
+        templates[f"template_{i}"] = ChatPromptTemplate.from_messages(
+            ("system", f"Ты {{role}} №{i}. " + "Отвечай подробно и приводи примеры по теме {domain}. " * 20),
+            ("user", f"Вопрос {i}: объясни {{concept}} на примере {{example}}"),
+            shared=False,
+        )
+    return templates
+
+
+def run(count: int = 2000) -> Dict[str, float]:
+    """
+    Возвращает время (в секундах) создания count шаблонов из строк, открытия библиотеки,
+    получения из нее первого шаблона и загрузки всех шаблонов.
+    """
+    templates = _build_templates(count)
+    sources = [[(msg.role, msg.content) for msg in template.messages] for template in templates.values()]
+    fd, path = tempfile.mkstemp(suffix=".lptlib")
+    os.close(fd)
+    try:
+        write_library(path, templates)
+
+        clear_tokenize_cache()
+        start = time.perf_counter()
+        for messages in sources:
+            ChatPromptTemplate.from_messages(*messages, shared=False)
+        from_source = time.perf_counter() - start
+
+        clear_tokenize_cache()
+        start = time.perf_counter()
+        with TemplateLibrary(path) as library:
+            opened = time.perf_counter() - start
+            library.load("template_0", shared=False)
+            first = time.perf_counter() - start
+            for name in library:
+                library.load(name, shared=False)
+        from_library = time.perf_counter() - start
+        size = os.path.getsize(path)
+    finally:
+        os.remove(path)
+    return {"from_source": from_source, "library_open": opened, "first_template": first,
+            "from_library": from_library,
+            "file_bytes": float(size)}
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name:>14}: {value:.4f}")
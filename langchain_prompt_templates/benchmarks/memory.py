@@ -0,0 +1,47 @@
+"""Память, занимаемая сообщениями: словари и dataclass с __dict__ против компактных записей.
+
+Запуск: python -m langchain_prompt_templates.benchmarks.memory
+"""
+
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict
+
+from ..chat import ChatMessage, TemplateMessage
+
+
+@dataclass
+class _LegacyChatMessage:
+    """ChatMessage до перехода на __slots__."""
+    role: str
+    content: str
+
+
+def _measure(factory: Callable[[int], object], count: int) -> int:
+    """Возвращает число байт, выделенных под count объектов (без содержимого строк)."""
+    contents = [f"Сообщение {i}" for i in range(count)]  # Строки общие для всех вариантов
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(contents[i]) for i in range(count)]
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return allocated
+
+
+def run(count: int = 1_000_000) -> Dict[str, int]:
+    """Возвращает объем памяти (в байтах) на count сообщений для каждого представления."""
+    return {
+        "dict": _measure(lambda content: {"role": "user", "content": content}, count),
+        "TemplateMessage": _measure(lambda content: TemplateMessage("user", content), count),
+        "ChatMessage (__dict__)": _measure(lambda content: _LegacyChatMessage("user", content), count),
+        "ChatMessage (__slots__)": _measure(lambda content: ChatMessage("user", content), count),
+    }
+
+
+if __name__ == "__main__":
+    results = run()
+    for name, allocated in results.items():
+        print(f"{name:>24}: {allocated / 2**20:8.1f} МиБ на 1M сообщений")
+    print(f"Экономия для сообщений шаблона: {(results['dict'] - results['TemplateMessage']) / 2**20:.1f} МиБ, "
+          f"для ChatMessage: {(results['ChatMessage (__dict__)'] - results['ChatMessage (__slots__)']) / 2**20:.1f} МиБ")
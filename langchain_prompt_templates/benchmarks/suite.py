@@ -0,0 +1,288 @@
+"""Набор бенчмарков для всех типов шаблонов и путей преобразования.
+
+Каждый случай — операция над шаблоном заданного размера (число сообщений,
+примеров или переменных и длина значений). Для каждого случая сообщаются
+перцентили времени вызова и число операций в секунду; результаты можно
+сохранить в JSON и сравнить с сохраненной базовой линией.
+
+Запуск:
+    python -m langchain_prompt_templates.benchmarks.suite --output results.json
+    python -m langchain_prompt_templates.benchmarks.suite --compare baseline.json --threshold 0.1
+
+В режиме сравнения модуль завершается с кодом 1, если хотя бы один случай
+замедлился сильнее порога.
+"""
+
+import argparse
+import sys
+from itertools import product
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from ..base import PromptTemplateBase
+from ..builder import ChatPromptBuilder
+from ..chat import ChatPromptTemplate
+from ..converters import auto_convert, convert_template
+from ..few_shot import FewShotPromptTemplate
+from ..string import StringPromptTemplate
+from . import harness
+
+# Размеры параметров: полный набор и сокращенный для быстрых прогонов
+SIZES: Dict[str, Tuple[int, ...]] = {
+    "messages": (10, 100, 1000),
+    "examples": (10, 100, 1000),
+    "variables": (1, 10, 50),
+    "value_len": (10, 1000),
+}
+# Число строк в случаях колоночного рендеринга
+COLUMN_ROWS = 10000
+
+QUICK_SIZES: Dict[str, Tuple[int, ...]] = {
+    "messages": (10, 100),
+    "examples": (10, 100),
+    "variables": (1, 10),
+    "value_len": (10,),
+}
+
+
+class Case(NamedTuple):
+    """Случай бенчмарка: имя операции, параметры и подготовленная операция без аргументов."""
+    name: str
+    params: Dict[str, int]
+    operation: Callable[[], Any]
+
+    @property
+    def case_id(self) -> str:
+        params = ",".join(f"{key}={value}" for key, value in self.params.items())
+        return f"{self.name}[{params}]"
+
+
+def _values(variables: int, value_len: int) -> Dict[str, str]:
+    return {f"var{i}": "x" * value_len for i in range(variables)}
+
+
+def _columns(variables: int, rows: int = COLUMN_ROWS) -> Dict[str, List[str]]:
+    """Колонки для колоночного рендеринга: var0 уникальна, остальные принимают 5 значений."""
+    columns = {"var0": [f"значение {row}" for row in range(rows)]}
+    for i in range(1, variables):
+        columns[f"var{i}"] = [f"вариант {(row * i) % 5}" for row in range(rows)]
+    return columns
+
+
+def make_string(variables: int) -> StringPromptTemplate:
+    template = "Контекст: " + " ".join(f"{{var{i}}}" for i in range(variables)) + ". Ответь кратко."
+    return StringPromptTemplate(template, [f"var{i}" for i in range(variables)])
+
+
+def make_chat(messages: int, variables: int = 10) -> ChatPromptTemplate:
+    """Чат-шаблон из чередующихся сообщений пользователя и ассистента; переменные распределены по кругу."""
+    pairs = [("system", "Ты {var0}. Отвечай подробно.")]
+    for i in range(1, messages):
+        role = "user" if i % 2 else "assistant"
+        pairs.append((role, f"Сообщение {i} про {{var{i % variables}}}"))
+    return ChatPromptTemplate.from_messages(*pairs, shared=False)
+
+
+def make_few_shot(examples: int) -> FewShotPromptTemplate:
+    example_template = StringPromptTemplate("Вопрос: {input}\nОтвет: {output}", ["input", "output"])
+    return FewShotPromptTemplate(
+        prefix="Реши задачи по теме {var0}:",
+        suffix="Вопрос: {input}\nОтвет:",
+        example_template=example_template,
+        examples=[{"input": f"вопрос {i}", "output": f"ответ {i}"} for i in range(examples)],
+        input_variables=["input", "var0"],
+    )
+
+
+def _grid(sizes: Dict[str, Tuple[int, ...]], *keys: str) -> Iterator[Dict[str, int]]:
+    for combination in product(*(sizes[key] for key in keys)):
+        yield dict(zip(keys, combination))
+
+
+def _chat_edits(template: ChatPromptTemplate) -> Tuple[Callable[[], None], Callable[[], None]]:
+    """Операции правки, сохраняющие размер шаблона между вызовами."""
+    def add_remove() -> None:
+        template.add_user_message("Новый вопрос про {extra}")
+        template.remove_message(len(template.messages) - 1)
+
+    state = {"flip": False}
+    index = len(template.messages) // 2
+
+    def update() -> None:
+        state["flip"] = not state["flip"]
+        template.update_message(index, new_content="Правка {var1}" if state["flip"] else "Правка {var2}")
+
+    return add_remove, update
+
+
+def _chat_turn(template: ChatPromptTemplate, values: Dict[str, str], session: bool) -> Callable[[], None]:
+    """Добавляет сообщение, форматирует историю и удаляет сообщение, сохраняя размер шаблона."""
+    render = template.render_session().format if session else template.format
+
+    def turn() -> None:
+        template.add_user_message("Новый вопрос про {var1}")
+        render(**values)
+        template.remove_message(len(template.messages) - 1)
+
+    return turn
+
+
+def _conversion_cases(sizes: Dict[str, Tuple[int, ...]]) -> Iterator[Case]:
+    targets = {
+        "string": StringPromptTemplate,
+        "chat": ChatPromptTemplate,
+        "few_shot": FewShotPromptTemplate,
+    }
+    sources: List[Tuple[str, str, Callable[[int], PromptTemplateBase]]] = [
+        ("string", "variables", make_string),
+        ("chat", "messages", make_chat),
+        ("few_shot", "examples", make_few_shot),
+    ]
+    for source_name, size_key, factory in sources:
+        for params in _grid(sizes, size_key):
+            source = factory(params[size_key])
+            for target_name, target_type in targets.items():
+                yield Case(f"convert_template.{source_name}->{target_name}", params,
+                           lambda s=source, t=target_type: convert_template(s, t))
+                # Без запоминания: стоимость построения результата
+                yield Case(f"convert_template_fresh.{source_name}->{target_name}", params,
+                           lambda s=source, t=target_type: convert_template(s, t, shared=False))
+                yield Case(f"auto_convert.{source_name}->{target_name}", params,
+                           lambda s=source, t=target_type: auto_convert(s, t))
+
+
+def build_cases(sizes: Dict[str, Tuple[int, ...]] = SIZES) -> Iterator[Case]:
+    """Строит все случаи бенчмарка для заданных размеров."""
+    for params in _grid(sizes, "variables", "value_len"):
+        template = make_string(params["variables"])
+        values = _values(params["variables"], params["value_len"])
+        yield Case("string.format", params, lambda t=template, v=values: t.format(**v))
+    for params in _grid(sizes, "variables"):
+        template = make_string(params["variables"])
+        values = _values(params["variables"], 10)
+        yield Case("string.validate", params, lambda t=template, v=values: t.validate(**v))
+        columns = _columns(params["variables"])
+        yield Case("string.format_many", params, lambda t=template, c=columns: t.format_many(**c))
+        yield Case("string.format_columns", params, lambda t=template, c=columns: t.format_columns(**c))
+
+    for params in _grid(sizes, "messages", "value_len"):
+        template = make_chat(params["messages"])
+        values = _values(10, params["value_len"])
+        yield Case("chat.format", params, lambda t=template, v=values: t.format(**v))
+        yield Case("chat.format_split", params, lambda t=template, v=values: t.format_split(**v))
+        yield Case("chat.estimate_length", params, lambda t=template, v=values: t.estimate_length(**v))
+        yield Case("chat.count_tokens", params, lambda t=template, v=values: t.count_tokens(**v))
+        cached = make_chat(params["messages"])
+        cached.enable_output_cache()
+        yield Case("chat.format_cached", params, lambda t=cached, v=values: t.format(**v))
+    for params in _grid(sizes, "messages"):
+        template = make_chat(params["messages"])
+        values = _values(10, 10)
+        yield Case("chat.validate", params, lambda t=template, v=values: t.validate(**v))
+        columns = _columns(10, COLUMN_ROWS // params["messages"])
+        yield Case("chat.format_many", params, lambda t=template, c=columns: t.format_many(**c))
+        yield Case("chat.format_columns", params, lambda t=template, c=columns: t.format_columns(**c))
+        # Все переменные, кроме одной, связаны заранее: рендерятся только сообщения с var1
+        partial = template.partial(**{k: v for k, v in values.items() if k != "var1"})
+        yield Case("chat.partial_format", params, lambda t=partial: t.format(var1="x" * 10))
+        add_remove, update = _chat_edits(make_chat(params["messages"]))
+        yield Case("chat.add_remove_message", params, add_remove)
+        yield Case("chat.update_message", params, update)
+        # Ход диалога: новое сообщение и форматирование всей истории
+        yield Case("chat.turn_format", params, _chat_turn(make_chat(params["messages"]), values, False))
+        yield Case("chat.turn_session", params, _chat_turn(make_chat(params["messages"]), values, True))
+
+        builder = ChatPromptBuilder().from_template(template)
+        yield Case("builder.build", params, builder.build)
+        # Типичный запрос: общий базовый шаблон, пара правок и сборка
+        yield Case("builder.derive", params,
+                   lambda t=template: ChatPromptBuilder().from_template(t)
+                   .add_user_message("Уточнение про {var3}").add_assistant_message("Ответ").build())
+
+    for params in _grid(sizes, "examples", "value_len"):
+        template = make_few_shot(params["examples"])
+        values = {"input": "y" * params["value_len"], "var0": "математика"}
+        yield Case("few_shot.format", params, lambda t=template, v=values: t.format(**v))
+        yield Case("few_shot.format_split", params, lambda t=template, v=values: t.format_split(**v))
+        # Примеры make_few_shot используют input, поэтому для длины без рендеринга он связывается заранее
+        partial = template.partial(input=values["input"])
+        yield Case("few_shot.len_format", params,
+                   lambda t=partial, v=values: len(t.format(var0=v["var0"])))
+        yield Case("few_shot.estimate_length", params,
+                   lambda t=partial, v=values: t.estimate_length(var0=v["var0"]))
+        yield Case("few_shot.count_tokens", params,
+                   lambda t=partial, v=values: t.count_tokens(var0=v["var0"]))
+        cached = make_few_shot(params["examples"])
+        cached.enable_output_cache()
+        yield Case("few_shot.format_cached", params, lambda t=cached, v=values: t.format(**v))
+    for params in _grid(sizes, "examples"):
+        template = make_few_shot(params["examples"])
+        values = {"input": "вопрос", "var0": "математика"}
+        yield Case("few_shot.validate", params, lambda t=template, v=values: t.validate(**v))
+        partial = template.partial(var0="математика")
+        yield Case("few_shot.partial_format", params, lambda t=partial: t.format(input="вопрос"))
+
+    yield from _conversion_cases(sizes)
+
+
+def run(quick: bool = False, name_filter: Optional[str] = None,
+        samples: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Выполняет бенчмарки и возвращает отчет {"environment": ..., "results": {case_id: измерение}}.
+
+    Args:
+        quick: Использовать сокращенные размеры и меньше замеров
+        name_filter: Выполнять только случаи, идентификатор которых содержит эту подстроку
+        samples: Число замеров на случай (по умолчанию 15 в быстром режиме и 50 в полном)
+    """
+    sizes = QUICK_SIZES if quick else SIZES
+    samples = samples or (15 if quick else 50)
+    results = {}
+    for case in build_cases(sizes):
+        if name_filter and name_filter not in case.case_id:
+            continue
+        measurement = harness.measure(case.operation, samples)
+        results[case.case_id] = {"name": case.name, "params": case.params, **measurement._asdict()}
+    return {"environment": harness.environment(), "quick": quick, "results": results}
+
+
+def _print_results(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'случай':<60} {'p50 мкс':>11} {'p90 мкс':>11} {'p99 мкс':>11} {'оп/с':>12}")
+    for case_id, result in results.items():
+        print(f"{case_id:<60} {result['p50_us']:>11.2f} {result['p90_us']:>11.2f} "
+              f"{result['p99_us']:>11.2f} {result['ops_per_sec']:>12.0f}")
+
+
+def _print_comparison(rows: List[Dict[str, Any]], threshold: float) -> None:
+    print(f"\nСравнение p50 с базовой линией (порог {threshold:.0%}):")
+    for row in rows:
+        mark = "РЕГРЕССИЯ" if row["regression"] else ""
+        print(f"{row['case']:<60} {row['baseline']:>11.2f} -> {row['current']:>11.2f} "
+              f"({row['ratio'] - 1:+.1%}) {mark}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="сокращенные размеры и меньше замеров")
+    parser.add_argument("--filter", dest="name_filter", help="подстрока идентификатора случая")
+    parser.add_argument("--samples", type=int, help="число замеров на случай")
+    parser.add_argument("--output", help="путь для сохранения результатов в JSON")
+    parser.add_argument("--compare", help="JSON с результатами базовой линии")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="допустимое относительное замедление p50 (по умолчанию 0.10)")
+    args = parser.parse_args(argv)
+
+    report = run(args.quick, args.name_filter, args.samples)
+    _print_results(report["results"])
+    if args.output:
+        harness.save(report, args.output)
+
+    if args.compare:
+        rows = harness.compare(report["results"], harness.load(args.compare)["results"], args.threshold)
+        _print_comparison(rows, args.threshold)
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
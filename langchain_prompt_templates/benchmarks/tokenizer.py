@@ -0,0 +1,36 @@
+"""Сравнение общего токенизатора с прежним извлечением переменных регулярным выражением.
+
+Запуск: python -m langchain_prompt_templates.benchmarks.tokenizer
+"""
+
+import re
+import timeit
+from typing import Dict
+
+from ..tokenizer import _parse, tokenize
+
+_LEGACY_PATTERN = re.compile(r'\{(\w+)\}')
+
+CASES: Dict[str, str] = {
+    "short": "Объясни, что такое {concept}, простыми словами.",
+    "system_prompt": "Ты {role} по {domain}. " + "Отвечай подробно и приводи примеры. " * 100,
+    "many_vars": " ".join(f"{{var{i}}}" for i in range(50)),
+}
+
+
+def run(number: int = 50_000) -> Dict[str, Dict[str, float]]:
+    """Возвращает время (в секундах) на number разборов для каждого случая."""
+    results = {}
+    for name, text in CASES.items():
+        tokenize(text)  # Прогреваем кэш
+        results[name] = {
+            "regex": min(timeit.repeat(lambda: _LEGACY_PATTERN.findall(text), number=number, repeat=5)),
+            "tokenize_cold": min(timeit.repeat(lambda: _parse(text), number=number, repeat=5)),
+            "tokenize_cached": min(timeit.repeat(lambda: tokenize(text), number=number, repeat=5)),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(f"{name:>14}: " + ", ".join(f"{key} {value:.4f}s" for key, value in result.items()))
@@ -1,59 +1,116 @@
 """Builder-паттерн для создания и модификации чат-промтов."""
 
-import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 
-from .chat import ChatPromptTemplate, ChatMessage
+from .chat import ChatPromptTemplate, ChatMessage, TemplateMessage
+from .tokenizer import tokenize
 
 class ChatPromptBuilder:
-    """Строитель для создания и модификации чат-промтов."""
+    """
+    Строитель для создания и модификации чат-промтов.
+    
+    Строитель, созданный from_template, и шаблоны, полученные build(), разделяют
+    сообщения и индекс переменных с исходным шаблоном (копирование при записи):
+    данные хранятся общими кортежами и копируются только при первом изменении
+    или обращении к спискам messages и input_variables, а build() не перебирает сообщения.
+    """
     
     def __init__(self):
-        self.messages = []
-        self.input_variables = []
+        self._messages: List[TemplateMessage] = []
+        self._input_variables: List[str] = []
+        self._message_vars: List[Tuple[str, ...]] = []
+        self._variable_refs: Dict[str, int] = {}
+        self._shared = False  # True, пока данные разделяются с шаблоном и не могут изменяться на месте
+    
+    @property
+    def messages(self) -> List[TemplateMessage]:
+        self._own()
+        return self._messages
+    
+    @messages.setter
+    def messages(self, value: List[TemplateMessage]) -> None:
+        self._own()
+        self._messages = value
+    
+    @property
+    def input_variables(self) -> List[str]:
+        self._own()
+        return self._input_variables
+    
+    @input_variables.setter
+    def input_variables(self, value: List[str]) -> None:
+        self._own()
+        self._input_variables = value
     
     def add_system_message(self, content: str) -> 'ChatPromptBuilder':
         """Добавляет системное сообщение."""
-        self.messages.append({"role": "system", "content": content})
-        self._update_variables(content)
+        self._append("system", content)
         return self
     
     def add_user_message(self, content: str) -> 'ChatPromptBuilder':
         """Добавляет сообщение пользователя."""
-        self.messages.append({"role": "user", "content": content})
-        self._update_variables(content)
+        self._append("user", content)
         return self
     
     def add_assistant_message(self, content: str) -> 'ChatPromptBuilder':
         """Добавляет сообщение ассистента."""
-        self.messages.append({"role": "assistant", "content": content})
-        self._update_variables(content)
+        self._append("assistant", content)
         return self
     
-    def _update_variables(self, content: str):
-        """Извлекает и добавляет переменные из содержимого."""
-        new_vars = re.findall(r'\{(\w+)\}', content)
+    def _append(self, role: str, content: str) -> None:
+        self._own()
+        self._messages.append(TemplateMessage(role, content))
+        new_vars = tokenize(content).variables
+        self._message_vars.append(new_vars)
+        self._update_variables(new_vars)
+    
+    def _update_variables(self, new_vars: Tuple[str, ...]):
+        """Учитывает переменные добавленного сообщения в индексе и input_variables."""
+        refs = self._variable_refs
         for var in new_vars:
-            if var not in self.input_variables:
-                self.input_variables.append(var)
+            refs[var] = refs.get(var, 0) + 1
+            if var not in self._input_variables:
+                self._input_variables.append(var)
+    
+    def _own(self) -> None:
+        """Копирует разделяемые с шаблоном данные в собственные списки перед первым изменением."""
+        if self._shared:
+            self._messages = list(self._messages)
+            self._input_variables = list(self._input_variables)
+            self._message_vars = list(self._message_vars)
+            self._variable_refs = dict(self._variable_refs)
+            self._shared = False
     
     def build(self) -> ChatPromptTemplate:
-        """Создает финальный шаблон чата."""
-        return ChatPromptTemplate(
-            messages=self.messages.copy(),
-            input_variables=self.input_variables.copy()
-        )
+        """
+        Создает финальный шаблон чата.
+        
+        Шаблон разделяет сообщения и индекс переменных со строителем: сообщения
+        не копируются и не разбираются повторно.
+        """
+        if len(self._message_vars) != len(self._messages):
+            # Список messages изменен напрямую, поэтому индекс строится заново
+            return ChatPromptTemplate(messages=list(self._messages), input_variables=list(self._input_variables))
+        if not self._shared:
+            # Разделяемые данные хранятся кортежами, чтобы ни одна из сторон не изменила их на месте
+            self._messages = tuple(self._messages)
+            self._message_vars = tuple(self._message_vars)
+            self._input_variables = tuple(self._input_variables)
+            self._shared = True
+        return ChatPromptTemplate._from_index(self._messages, self._message_vars,
+                                              self._variable_refs, self._input_variables)
     
     def reset(self) -> 'ChatPromptBuilder':
         """Сбрасывает строитель к начальному состоянию."""
-        self.messages = []
-        self.input_variables = []
+        self._messages = []
+        self._input_variables = []
+        self._message_vars = []
+        self._variable_refs = {}
+        self._shared = False
         return self
     
     def from_template(self, template: ChatPromptTemplate) -> 'ChatPromptBuilder':
-        """Инициализирует строитель на основе существующего шаблона."""
-        self.reset()
-        for msg in template.messages:
-            self.messages.append(msg.copy())
-        self.input_variables = template.input_variables.copy()
-        return self
\ No newline at end of file
+        """Инициализирует строитель на основе существующего шаблона без копирования сообщений."""
+        self._messages, self._message_vars, self._variable_refs, self._input_variables = template._share_index()
+        self._shared = True
+        return self
@@ -0,0 +1,87 @@
+"""Массовый рендеринг шаблонов в пуле процессов для офлайн-генерации датасетов."""
+
+import json
+import os
+from collections import deque
+from itertools import chain, islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, TYPE_CHECKING
+
+from .base import PromptTemplateBase
+from .lazy import LazyModule
+
+if TYPE_CHECKING:
+    from concurrent import futures
+else:
+    # Пул процессов тянет multiprocessing (около 20 мс) и нужен только при вызове render_bulk
+    futures = LazyModule("concurrent.futures")
+
+# Шаблон, переданный процессу-воркеру один раз при его запуске
+_worker_template: Optional[PromptTemplateBase] = None
+
+
+def _init_worker(template: PromptTemplateBase) -> None:
+    global _worker_template
+    _worker_template = template
+
+
+def _render_chunk(rows: List[Mapping[str, Any]]) -> List[Any]:
+    return _worker_template.format_batch(rows)
+
+
+def _chunks(rows: Iterable[Mapping[str, Any]], chunk_size: int) -> Iterator[List[Mapping[str, Any]]]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_jsonl(path: str, encoding: str = "utf-8") -> Iterator[Dict[str, Any]]:
+    """Лениво читает JSONL-файл, возвращая по словарю на каждую непустую строку."""
+    with open(path, encoding=encoding) as fp:
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
+
+
+def render_bulk_chunks(template: PromptTemplateBase,
+                       rows: Iterable[Mapping[str, Any]],
+                       max_workers: Optional[int] = None,
+                       chunk_size: int = 1000,
+                       max_pending: Optional[int] = None) -> Iterator[List[Any]]:
+    """
+    Рендерит строки в пуле процессов и возвращает результаты пачками в исходном порядке.
+
+    Шаблон передается каждому процессу один раз через инициализатор пула,
+    а задачи содержат только пачки строк. Входные данные читаются лениво:
+    в работе одновременно находится не более max_pending пачек.
+
+    Args:
+        template: Шаблон для рендеринга (должен сериализоваться pickle)
+        rows: Итерируемый набор словарей с переменными, например read_jsonl(path)
+        max_workers: Число процессов (по умолчанию число ядер)
+        chunk_size: Количество строк в одной задаче
+        max_pending: Максимум одновременно отправленных пачек (по умолчанию 2 * число процессов)
+    """
+    workers = max_workers or os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * workers
+    with futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(template,)) as executor:
+        pending: Deque[futures.Future] = deque()
+        for chunk in _chunks(rows, chunk_size):
+            pending.append(executor.submit(_render_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def render_bulk(template: PromptTemplateBase,
+                rows: Iterable[Mapping[str, Any]],
+                max_workers: Optional[int] = None,
+                chunk_size: int = 1000,
+                max_pending: Optional[int] = None) -> Iterator[Any]:
+    """Как render_bulk_chunks, но возвращает результаты по одному в исходном порядке."""
+    return chain.from_iterable(render_bulk_chunks(template, rows, max_workers, chunk_size, max_pending))
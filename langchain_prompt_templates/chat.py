@@ -1,82 +1,459 @@
 """Реализация чат-ориентированного шаблона промта с возможностью динамического изменения."""
 
-import re
-from typing import Dict, List, Any, Optional
+import sys
+from itertools import repeat
+from typing import Dict, List, Any, Optional, Type, Awaitable, Callable, FrozenSet, Hashable, Iterable, Iterator, Mapping, Sequence, Tuple
 from dataclasses import dataclass
 
+from .async_utils import ASYNC_YIELD_EVERY, asyncio
 from .base import PromptTemplateBase
+from .batch import FactorizedColumns
+from .compiled import CompiledTemplate, compile_template
+from .lengths import TokenCounter, approximate_token_count, static_token_counts
+from .prefix import PrefixSplit, hash_messages
+from .template_types import template_type
+from .tokenizer import tokenize
+from .tracked import TrackedList
+from .value_keys import format_key
+
+def intern_role(role: str) -> str:
+    """Возвращает единственный экземпляр строки роли, общий для всех сообщений процесса."""
+    return sys.intern(role)
+
 
 @dataclass
 class ChatMessage:
     """Представление сообщения в чат-промте."""
+    __slots__ = ("role", "content")  # Без __dict__ на каждое сообщение
     role: str  # system, user, assistant
     content: str
 
+
+class TemplateMessage(Mapping):
+    """
+    Компактное неизменяемое сообщение шаблона.
+
+    Хранит роль и содержание в слотах вместо словаря и поддерживает доступ
+    в стиле словаря (msg["role"], msg.get("content"), dict(msg)) для обратной совместимости.
+    """
+    __slots__ = ("role", "content")
+    _KEYS = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        object.__setattr__(self, "role", intern_role(role))
+        object.__setattr__(self, "content", content)
+
+    @classmethod
+    def coerce(cls, message: Mapping[str, str]) -> 'TemplateMessage':
+        """Приводит словарь сообщения к TemplateMessage; готовые записи возвращаются как есть."""
+        if message.__class__ is cls:
+            return message
+        return cls(message["role"], message["content"])
+
+    def replace(self, role: Optional[str] = None, content: Optional[str] = None) -> 'TemplateMessage':
+        """Возвращает копию сообщения с измененными полями."""
+        return TemplateMessage(self.role if role is None else role,
+                               self.content if content is None else content)
+
+    def copy(self) -> Dict[str, str]:
+        """Возвращает изменяемую копию сообщения в виде словаря."""
+        return {"role": self.role, "content": self.content}
+
+    def __getitem__(self, key: str) -> str:
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return 2
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("TemplateMessage неизменяем, используйте replace()")
+
+    def __hash__(self) -> int:
+        return hash((self.role, self.content))
+
+    def __reduce__(self):
+        return (TemplateMessage, (self.role, self.content))
+
+    def __repr__(self) -> str:
+        return f"TemplateMessage(role={self.role!r}, content={self.content!r})"
+
 class ChatPromptTemplate(PromptTemplateBase):
     """Реализация шаблона для чат-ориентированных промтов с возможностью динамического изменения."""
     
+    _required_cache = (-1, frozenset())
+    _plan_cache = (-1, None)
+    
+    # (план сообщений, число токенов статических сообщений для каждой функции подсчета)
+    _token_cache = (None, None)
+    
+    # True, пока список сообщений и индекс переменных разделяются с ChatPromptBuilder
+    _storage_shared = False
+    
     def __init__(self, messages: List[Dict[str, str]], input_variables: List[str], **kwargs):
         super().__init__(input_variables, **kwargs)
-        self.messages = messages
-        self._original_input_vars = input_variables.copy()  # Сохраняем исходные переменные для отслеживания
+        # Сообщения хранятся компактными неизменяемыми записями
+        self.messages = [TemplateMessage.coerce(msg) for msg in messages]
+        self._original_input_vars = list(input_variables)  # Сохраняем исходные переменные для отслеживания
+    
+    @classmethod
+    def _from_index(cls, messages: Sequence[TemplateMessage], message_vars: Sequence[Tuple[str, ...]],
+                    variable_refs: Dict[str, int], input_variables: Sequence[str]) -> 'ChatPromptTemplate':
+        """
+        Создает шаблон поверх готовых сообщений и индекса переменных без их копирования.
+        
+        Переданные кортежи и словарь разделяются с вызывающим и копируются шаблоном
+        при первом изменении или обращении к спискам messages и input_variables.
+        """
+        template = cls.__new__(cls)
+        PromptTemplateBase.__init__(template, input_variables)
+        template._messages = messages
+        template._original_input_vars = list(input_variables)
+        template._message_vars = message_vars
+        template._variable_refs = variable_refs
+        template._storage_shared = True
+        return template
+    
+    def _share_index(self) -> Tuple[Tuple[TemplateMessage, ...], Tuple[Tuple[str, ...], ...], Dict[str, int], Tuple[str, ...]]:
+        """
+        Отдает сообщения, индекс переменных и input_variables для разделения без копирования.
+        
+        Разделяемые последовательности хранятся кортежами, поэтому их нельзя изменить на месте;
+        обе стороны копируют их в списки перед первым изменением.
+        """
+        self._ensure_index()
+        if not self._storage_shared:
+            self._messages = tuple(self._messages)
+            self._message_vars = tuple(self._message_vars)
+            self._input_variables = tuple(self._input_variables)
+            self._storage_shared = True
+        return self._messages, self._message_vars, self._variable_refs, self._input_variables
+    
+    def _own_storage(self) -> None:
+        """Копирует разделяемые данные в собственные списки перед первым изменением (копирование при записи)."""
+        if self._storage_shared:
+            self._messages = TrackedList(self._messages)
+            self._index_mutations = 0  # Разделяемый кортеж не менялся, поэтому индекс актуален
+            self._message_vars = list(self._message_vars)
+            self._variable_refs = dict(self._variable_refs)
+            self._input_variables = list(self._input_variables)
+            self._storage_shared = False
+    
+    @property
+    def messages(self) -> List[TemplateMessage]:
+        # Список публичный и изменяемый, поэтому разделяемые сообщения сначала копируются
+        if self._storage_shared and not self._frozen:
+            self._own_storage()
+        return self._messages
+    
+    @messages.setter
+    def messages(self, value: List[TemplateMessage]) -> None:
+        self._check_mutable()
+        self._own_storage()
+        self._messages = TrackedList(value)
+        self._reindex()
+    
+    @property
+    def input_variables(self) -> List[str]:
+        if self._storage_shared and not self._frozen:
+            self._own_storage()
+        return self._input_variables
+    
+    @input_variables.setter
+    def input_variables(self, value: List[str]) -> None:
+        self._check_mutable()
+        self._input_variables = value
+        self._input_set = set(value)  # Быстрая проверка принадлежности без прохода по списку
+        self._bump_version()
     
     def format(self, **kwargs) -> List[ChatMessage]:
-        if not self.validate(**kwargs):
-            missing = set(self.input_variables) - set(kwargs.keys())
+        required = self._required_variable_set()
+        if not kwargs.keys() >= required:
+            missing = required - kwargs.keys()
             raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
         
-        formatted_messages = []
-        for msg in self.messages:
-            role = msg["role"]
-            # Форматируем содержимое сообщения, если оно содержит переменные
-            content = msg["content"]
-            if "{" in content and "}" in content:
-                content = content.format(**kwargs)
-            formatted_messages.append(ChatMessage(role=role, content=content))
+        # Статические сообщения отрендерены в плане заранее, форматируются только сообщения с переменными
+        return [
+            ChatMessage(role=role, content=content if compiled is None else compiled.render(kwargs))
+            for role, content, compiled in self._message_plan()
+        ]
+    
+    def format_iter(self, **kwargs) -> Iterator[str]:
+        """
+        Выдает сообщения по одному в текстовом виде "[ROLE]: содержание".
+        
+        Сообщения разделяются переводом строки, как в to_string_template.
+        """
+        required = self._required_variable_set()
+        if not kwargs.keys() >= required:
+            missing = required - kwargs.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
         
-        return formatted_messages
+        for i, (role, content, compiled) in enumerate(self._message_plan()):
+            if compiled is not None:
+                content = compiled.render(kwargs)
+            separator = "\n" if i else ""
+            yield f"{separator}[{role.upper()}]: {content}"
     
     def validate(self, **kwargs) -> bool:
         # Проверяем, что все переменные, используемые в шаблонах, предоставлены
-        all_vars = []
-        for msg in self.messages:
-            content = msg["content"]
-            # Извлекаем переменные из шаблона
-            if "{" in content and "}" in content:
-                vars_in_msg = re.findall(r'\{(\w+)\}', content)
-                all_vars.extend(vars_in_msg)
+        return kwargs.keys() >= self._required_variable_set()
+    
+    def estimate_length(self, **kwargs) -> int:
+        """Возвращает суммарную длину содержимого сообщений, не форматируя их."""
+        return sum(self.message_lengths(**kwargs))
+    
+    def count_tokens(self, *, counter: Optional[TokenCounter] = None, **kwargs) -> int:
+        """Оценивает суммарное число токенов в содержимом сообщений, не форматируя их."""
+        return sum(self.message_token_counts(counter=counter, **kwargs))
+    
+    def message_lengths(self, **kwargs) -> List[int]:
+        """Возвращает длину содержимого каждого сообщения после форматирования."""
+        required = self._required_variable_set()
+        if not kwargs.keys() >= required:
+            missing = required - kwargs.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        
+        return [len(content) if compiled is None else compiled.estimate_length(kwargs)
+                for _, content, compiled in self._message_plan()]
+    
+    def message_token_counts(self, *, counter: Optional[TokenCounter] = None, **kwargs) -> List[int]:
+        """Оценивает число токенов в содержимом каждого сообщения после форматирования."""
+        required = self._required_variable_set()
+        if not kwargs.keys() >= required:
+            missing = required - kwargs.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        
+        if counter is None:
+            counter = approximate_token_count
+        plan = self._message_plan()
+        cached_plan, cache = self._token_cache
+        if cached_plan is not plan:
+            cache = {}
+            self._token_cache = (plan, cache)
+        # Статические сообщения подсчитываются один раз на план и функцию подсчета
+        static = static_token_counts(cache, counter, [content if compiled is None else None
+                                                      for _, content, compiled in plan])
+        # Одно значение обычно подставляется в несколько сообщений и подсчитывается один раз
+        memo: Dict[str, int] = {}
+        return [count if compiled is None else compiled.count_tokens(kwargs, counter, memo)
+                for count, (_, _, compiled) in zip(static, plan)]
+    
+    def _required_variable_set(self) -> FrozenSet[str]:
+        # Множество пересчитывается из индекса переменных только после изменения шаблона
+        self._ensure_index()
+        version, required = self._required_cache
+        if version != self._version:
+            required = frozenset(self._variable_refs.keys() & self._input_set)
+            self._required_cache = (self._version, required)
+        return required
+    
+    def _message_plan(self) -> List[Tuple[str, str, Optional[CompiledTemplate]]]:
+        """
+        Возвращает план сообщений: (роль, содержание, скомпилированный шаблон или None).
+        
+        Сообщения с переменными компилируются, статические хранятся уже отрендеренными
+        строками. План кэшируется до следующего изменения шаблона.
+        """
+        # Замена сообщения прямой записью в список messages перестраивает индекс и меняет версию
+        self._ensure_index()
+        version, plan = self._plan_cache
+        if version != self._version:
+            plan = []
+            for msg in self._messages:
+                content = msg["content"]
+                compiled = compile_template(content) if "{" in content and "}" in content else None
+                if compiled is not None and compiled.is_static:
+                    # Только экранированные скобки: результат не зависит от переменных
+                    content, compiled = compiled.text, None
+                plan.append((msg["role"], content, compiled))
+            self._plan_cache = (self._version, plan)
+        return plan
+    
+    def _render_plan(self) -> Callable[[Mapping[str, Any]], List[ChatMessage]]:
+        plan = self._message_plan()
+        
+        def render(values: Mapping[str, Any]) -> List[ChatMessage]:
+            return [
+                ChatMessage(role=role, content=content if compiled is None else compiled.render(values))
+                for role, content, compiled in plan
+            ]
         
-        required_vars = set(all_vars) & set(self.input_variables)
-        return all(var in kwargs for var in required_vars)
+        return render
+    
+    def format_columns(self, **columns: Sequence[Any]) -> List[List[ChatMessage]]:
+        required = self._required_variable_set()
+        if not columns.keys() >= required:
+            missing = required - columns.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        
+        # Разложение колонок разделяется сообщениями, использующими одни и те же переменные
+        factorized = FactorizedColumns(columns)
+        plan = self._message_plan()
+        if not plan:
+            return [[] for _ in range(factorized.length)]
+        messages = [
+            list(map(ChatMessage, repeat(role, factorized.length),
+                     repeat(content, factorized.length) if compiled is None else compiled.render_columns(factorized)))
+            for role, content, compiled in plan
+        ]
+        return list(map(list, zip(*messages)))
+    
+    def static_flags(self) -> Tuple[bool, ...]:
+        """Для каждого сообщения сообщает, статично ли оно (не содержит переменных)."""
+        return tuple(compiled is None for _, _, compiled in self._message_plan())
+    
+    def _build_prefix_plan(self) -> Tuple[str, int]:
+        # Префикс — статические сообщения до первого сообщения с переменными
+        plan = self._message_plan()
+        size = next((i for i, (_, _, compiled) in enumerate(plan) if compiled is not None), len(plan))
+        return hash_messages((role, content) for role, content, _ in plan[:size]), size
+    
+    def _split_prefix(self, prefix_hash: str, size: int, values: Mapping[str, Any]) -> PrefixSplit:
+        plan = self._message_plan()
+        return PrefixSplit(
+            [ChatMessage(role=role, content=content) for role, content, _ in plan[:size]],
+            [ChatMessage(role=role, content=content if compiled is None else compiled.render(values))
+             for role, content, compiled in plan[size:]],
+            prefix_hash
+        )
+    
+    def _copy_output(self, result: List[ChatMessage]) -> List[ChatMessage]:
+        # ChatMessage изменяем, поэтому кэш хранит и выдает копии сообщений
+        return [ChatMessage(msg.role, msg.content) for msg in result]
+    
+    def render_session(self) -> 'ChatRenderSession':
+        """Создает сессию инкрементального рендеринга для растущего диалога."""
+        return ChatRenderSession(self)
+    
+    def _async_render_plan(self) -> Callable[[Mapping[str, Any]], Awaitable[List[ChatMessage]]]:
+        plan = self._message_plan()
+        
+        async def arender(values: Mapping[str, Any]) -> List[ChatMessage]:
+            messages = []
+            for i, (role, content, compiled) in enumerate(plan, 1):
+                messages.append(ChatMessage(role=role, content=content if compiled is None else compiled.render(values)))
+                # Длинные диалоги не должны надолго занимать цикл событий
+                if i % ASYNC_YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+            return messages
+        
+        return arender
     
     @classmethod
-    def from_template(cls, messages: List[Dict[str, str]], input_variables: List[str], **kwargs) -> 'ChatPromptTemplate':
-        """Создает экземпляр из списка сообщений."""
-        return cls(messages, input_variables, **kwargs)
+    def from_template(cls, messages: List[Dict[str, str]], input_variables: List[str],
+                      shared: bool = True, **kwargs) -> 'ChatPromptTemplate':
+        """
+        Создает экземпляр из списка сообщений.
+        
+        По умолчанию сообщения и их разбор разделяются с другими экземплярами
+        с тем же содержимым через реестр шаблонов (копирование при записи);
+        shared=False создает шаблон без реестра.
+        """
+        if not shared:
+            return cls(messages, input_variables, **kwargs)
+        key = (cls, tuple((msg["role"], msg["content"]) for msg in messages),
+               tuple(input_variables), tuple(sorted(kwargs.items())))
+        return cls._from_registry(key, lambda: cls(messages, list(input_variables), **kwargs))
     
     @classmethod
-    def from_messages(cls, *message_tuples) -> 'ChatPromptTemplate':
+    def from_messages(cls, *message_tuples, shared: bool = True) -> 'ChatPromptTemplate':
         """
         Альтернативный конструктор для создания из кортежей (роль, содержание).
         
+        По умолчанию сообщения и их разбор разделяются с другими экземплярами
+        с тем же содержимым через реестр шаблонов; результат можно изменять
+        (add_message и т.п.), это не затрагивает остальные экземпляры.
+        
         Пример:
         ChatPromptTemplate.from_messages(
             ("system", "Ты {role}"),
             ("user", "Объясни {concept}")
         )
         """
-        messages = [{"role": role, "content": content} for role, content in message_tuples]
+        if shared:
+            key = (cls, tuple((role, content) for role, content in message_tuples))
+            return cls._from_registry(key, lambda: cls.from_messages(*message_tuples, shared=False))
+        
+        messages = [TemplateMessage(role, content) for role, content in message_tuples]
         
         # Автоматически извлекаем переменные из содержимого
         input_variables = []
         for _, content in message_tuples:
             if "{" in content and "}" in content:
-                vars_in_msg = re.findall(r'\{(\w+)\}', content)
-                input_variables.extend(vars_in_msg)
+                input_variables.extend(tokenize(content).variables)
         
         input_variables = list(set(input_variables))  # Уникальные переменные
         return cls(messages, input_variables)
     
+    def _content_key(self) -> Hashable:
+        return (type(self), tuple((msg["role"], msg["content"]) for msg in self._messages),
+                tuple(self._input_variables))
+    
+    def _freeze(self) -> None:
+        # Сообщения, индекс переменных и input_variables становятся кортежами
+        self._share_index()
+        self._original_input_vars = tuple(self._original_input_vars)
+        # План сообщений строится сразу, чтобы все копии общего экземпляра использовали один план
+        self._message_plan()
+        self._required_variable_set()
+        super()._freeze()
+    
+    def _fork(self) -> 'ChatPromptTemplate':
+        template = type(self)._from_index(*self._share_index())
+        template.kwargs = dict(self.kwargs)
+        template._original_input_vars = list(self._original_input_vars)
+        # План сообщений зависит только от разделяемых сообщений, поэтому он тоже разделяется
+        template._version = self._version
+        template._plan_cache = self._plan_cache
+        template._required_cache = self._required_cache
+        return template
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # Кэш токенов ключуется функциями подсчета, которые часто не сериализуются (lambda)
+        state = self.__dict__.copy()
+        state.pop("_token_cache", None)
+        return state
+    
+    def partial(self, **bound) -> 'ChatPromptTemplate':
+        self._ensure_index()
+        messages = []
+        remaining = set()
+        for msg, names in zip(self._messages, self._message_vars):
+            if any(var in bound for var in names):
+                content = compile_template(msg["content"]).bind(bound)
+                # Переменная остается обязательной, если поле с ней не удалось подставить целиком
+                remaining.update(tokenize(content).variables)
+                msg = TemplateMessage(msg["role"], content)
+            messages.append(msg)  # Сообщения без связанных переменных разделяются с исходным шаблоном
+        return ChatPromptTemplate(
+            messages,
+            [var for var in self.input_variables if var not in bound or var in remaining],
+            **self.kwargs
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "chat",
+            "messages": [
+                {"role": msg["role"], "content": msg["content"]}
+                for msg in self._messages
+            ],
+            "input_variables": list(self.input_variables),
+            "kwargs": self.kwargs,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ChatPromptTemplate':
+        messages = [TemplateMessage(msg["role"], msg["content"]) for msg in data["messages"]]
+        return cls(messages, list(data["input_variables"]), **data.get("kwargs", {}))
+    
     def add_message(self, role: str, content: str, index: Optional[int] = None) -> None:
         """
         Добавляет новое сообщение в шаблон.
@@ -86,20 +463,24 @@ class ChatPromptTemplate(PromptTemplateBase):
             content: Содержание сообщения, может содержать переменные в формате {variable}
             index: Позиция для вставки. Если None, добавляет в конец.
         """
-        # Извлекаем переменные из нового содержимого
-        new_vars = self._extract_variables(content)
+        self._check_mutable()
+        self._own_storage()
+        self._ensure_index()
         
-        # Добавляем новые переменные в input_variables, если их там нет
-        for var in new_vars:
-            if var not in self.input_variables:
-                self.input_variables.append(var)
+        # Извлекаем переменные из нового содержимого и добавляем новые в input_variables
+        new_vars = self._message_variables(content)
+        self._acquire_variables(new_vars)
         
         # Добавляем сообщение
-        message = {"role": role, "content": content}
+        message = TemplateMessage(role, content)
         if index is None:
-            self.messages.append(message)
+            self._messages.append(message)
+            self._message_vars.append(new_vars)
         else:
-            self.messages.insert(index, message)
+            self._messages.insert(index, message)
+            self._message_vars.insert(index, new_vars)
+        self._index_mutations = self._messages.mutations
+        self._bump_version()
     
     def add_system_message(self, content: str, index: Optional[int] = None) -> None:
         """Добавляет системное сообщение."""
@@ -115,123 +496,173 @@ class ChatPromptTemplate(PromptTemplateBase):
     
     def remove_message(self, index: int) -> None:
         """Удаляет сообщение по индексу."""
-        if 0 <= index < len(self.messages):
-            # Удаляем сообщение
-            removed_msg = self.messages.pop(index)
+        self._check_mutable()
+        if 0 <= index < len(self._messages):
+            self._own_storage()
+            self._ensure_index()
             
-            # Проверяем, не использовались ли переменные из этого сообщения в других
-            content = removed_msg["content"]
-            removed_vars = self._extract_variables(content)
+            # Удаляем сообщение вместе с его записью в индексе переменных
+            self._messages.pop(index)
+            self._index_mutations = self._messages.mutations
+            removed_vars = self._message_vars.pop(index)
             
             # Если переменные больше нигде не используются, удаляем их из input_variables
-            remaining_vars = set()
-            for msg in self.messages:
-                remaining_vars.update(self._extract_variables(msg["content"]))
-            
-            self.input_variables = [
-                var for var in self.input_variables 
-                if var in remaining_vars or var in self._original_input_vars
-            ]
+            unused = self._release_variables(removed_vars)
+            self._drop_input_variables(
+                var for var in unused if var not in self._original_input_vars
+            )
+            self._bump_version()
         else:
             raise IndexError("Индекс сообщения вне диапазона")
     
     def update_message(self, index: int, new_content: Optional[str] = None, 
                       new_role: Optional[str] = None) -> None:
         """Обновляет существующее сообщение."""
-        if 0 <= index < len(self.messages):
-            old_content = self.messages[index]["content"]
-            old_vars = self._extract_variables(old_content)
-            
+        self._check_mutable()
+        if 0 <= index < len(self._messages):
+            self._own_storage()
+            self._ensure_index()
             if new_content is not None:
-                # Обновляем содержимое
-                self.messages[index]["content"] = new_content
+                old_vars = self._message_vars[index]
+                new_vars = self._message_variables(new_content)
                 
-                # Обновляем переменные
-                new_vars = self._extract_variables(new_content)
+                # Обновляем содержимое и запись в индексе
+                self._messages[index] = TemplateMessage.coerce(self._messages[index]).replace(content=new_content)
+                self._message_vars[index] = new_vars
                 
-                # Удаляем старые переменные, если они больше не нужны
-                for var in old_vars:
-                    if var not in new_vars:
-                        # Проверяем, не используется ли переменная в других сообщениях
-                        used_elsewhere = any(
-                            var in self._extract_variables(msg["content"]) 
-                            for i, msg in enumerate(self.messages) if i != index
-                        )
-                        if not used_elsewhere and var in self.input_variables:
-                            self.input_variables.remove(var)
-                
-                # Добавляем новые переменные
-                for var in new_vars:
-                    if var not in self.input_variables:
-                        self.input_variables.append(var)
+                # Сначала учитываем новые переменные, чтобы общие со старыми не освобождались
+                self._acquire_variables(new_vars)
+                self._drop_input_variables(self._release_variables(old_vars))
             
             if new_role is not None:
-                self.messages[index]["role"] = new_role
+                self._messages[index] = TemplateMessage.coerce(self._messages[index]).replace(role=new_role)
+            self._index_mutations = self._messages.mutations
+            self._bump_version()
         else:
             raise IndexError("Индекс сообщения вне диапазона")
     
+    def _message_variables(self, content: str) -> Tuple[str, ...]:
+        """Возвращает уникальные переменные сообщения в порядке появления."""
+        return tokenize(content).variables
+    
+    def _reindex(self) -> None:
+        """Перестраивает индекс переменных: списки переменных сообщений и счетчики ссылок."""
+        self._message_vars: List[Tuple[str, ...]] = [
+            self._message_variables(msg["content"]) for msg in self._messages
+        ]
+        # Счетчик изменений списка messages, которому соответствует индекс
+        self._index_mutations = self._messages.mutations
+        self._variable_refs: Dict[str, int] = {}
+        for names in self._message_vars:
+            for var in names:
+                self._variable_refs[var] = self._variable_refs.get(var, 0) + 1
+        self._bump_version()
+    
+    def _ensure_index(self) -> None:
+        # Список messages публичный, поэтому после его прямого изменения индекс перестраивается;
+        # разделяемые сообщения хранятся кортежем и не могут быть изменены
+        messages = self._messages
+        if messages.__class__ is not tuple and messages.mutations != self._index_mutations:
+            self._reindex()
+    
+    def _acquire_variables(self, names: Tuple[str, ...]) -> None:
+        """Увеличивает счетчики ссылок и добавляет новые переменные в input_variables."""
+        refs = self._variable_refs
+        for var in names:
+            refs[var] = refs.get(var, 0) + 1
+            if var not in self._input_set:
+                self._input_variables.append(var)
+                self._input_set.add(var)
+    
+    def _release_variables(self, names: Tuple[str, ...]) -> List[str]:
+        """Уменьшает счетчики ссылок и возвращает переменные, которые больше не используются."""
+        refs = self._variable_refs
+        unused = []
+        for var in names:
+            count = refs[var] - 1
+            if count:
+                refs[var] = count
+            else:
+                del refs[var]
+                unused.append(var)
+        return unused
+    
+    def _drop_input_variables(self, names: Iterable[str]) -> None:
+        """Удаляет переменные из input_variables; список перестраивается только если есть что удалять."""
+        dropped = {var for var in names if var in self._input_set}
+        if dropped:
+            self.input_variables = [var for var in self._input_variables if var not in dropped]
+    
     def _extract_variables(self, text: str) -> List[str]:
         """Извлекает имена переменных из текста шаблона."""
-        return re.findall(r'\{(\w+)\}', text)
+        return list(tokenize(text).variables)
     
     def get_message_history(self) -> List[Dict[str, str]]:
         """Возвращает текущую историю сообщений."""
-        return self.messages.copy()
+        return list(self._messages)
+    
+    def _conversion_version(self) -> Hashable:
+        # Прямые изменения списка messages учитываются перестроением индекса при сверке плана
+        self._message_plan()
+        return self._version
     
-    def to_string_template(self) -> 'StringPromptTemplate':
+    def to_string_template(self, shared: bool = True) -> 'StringPromptTemplate':
         """Преобразует чат-шаблон в строковый, объединяя все сообщения."""
-        from .string import StringPromptTemplate
-        
+        return self._conversion("string", self._build_string_template, shared)
+    
+    def _build_string_template(self) -> 'StringPromptTemplate':
         # Создаем строку с разделением по ролям
-        formatted_messages = []
-        for msg in self.messages:
-            role = msg["role"].upper()
-            content = msg["content"]
-            formatted_messages.append(f"[{role}]: {content}")
-        
-        combined = "\n".join(formatted_messages)
-        return StringPromptTemplate(
+        combined = "\n".join(f"[{msg['role'].upper()}]: {msg['content']}" for msg in self._messages)
+        return template_type("string")(
             template=combined,
-            input_variables=self.input_variables.copy()
+            input_variables=list(self.input_variables)
         )
     
-    def to_chat_template(self) -> 'ChatPromptTemplate':
+    def to_chat_template(self, shared: bool = True) -> 'ChatPromptTemplate':
         return self  # Уже чат-шаблон
     
     def to_few_shot_template(self, 
                             example_separator: str = "\n\n",
                             prefix: Optional[str] = None,
-                            suffix: Optional[str] = None) -> 'FewShotPromptTemplate':
+                            suffix: Optional[str] = None,
+                            shared: bool = True) -> 'FewShotPromptTemplate':
         """
         Преобразует чат-шаблон в few-shot шаблон.
         Предполагает, что чат содержит пары сообщений (пользователь-ассистент) как примеры.
         """
-        from .few_shot import FewShotPromptTemplate
-        from .string import StringPromptTemplate
-        
-        # Группируем сообщения в пары (пользователь-ассистент)
+        return self._conversion(
+            ("few_shot", example_separator, prefix, suffix),
+            lambda: self._build_few_shot_template(example_separator, prefix, suffix, shared),
+            shared
+        )
+    
+    def _build_few_shot_template(self, example_separator: str, prefix: Optional[str],
+                                 suffix: Optional[str], shared: bool) -> 'FewShotPromptTemplate':
+        # Группируем сообщения в пары (пользователь-ассистент) за один проход,
+        # попутно запоминая последнее сообщение пользователя
         examples = []
         current_example = {}
+        last_user_msg = "{input}"
         
-        for i, msg in enumerate(self.messages):
-            if msg["role"] == "user":
-                if current_example and "input" in current_example:
+        for msg in self._messages:
+            role = msg["role"]
+            if role == "user":
+                if current_example:
                     examples.append(current_example)
-                    current_example = {}
-                current_example["input"] = msg["content"]
-            elif msg["role"] == "assistant" and "input" in current_example:
+                current_example = {"input": msg["content"]}
+                last_user_msg = msg["content"]
+            elif role == "assistant" and current_example:
                 current_example["output"] = msg["content"]
                 examples.append(current_example)
                 current_example = {}
         
         # Если остался незавершенный пример
-        if current_example and "input" in current_example:
+        if current_example:
             examples.append(current_example)
         
-        # Создаем шаблон для примеров
-        example_template = StringPromptTemplate(
-            template="Вопрос: {input}\nОтвет: {output}",
-            input_variables=["input", "output"]
+        # Шаблон примеров одинаков для всех чатов; для общего результата он берется из реестра
+        example_template = template_type("string").from_template(
+            "Вопрос: {input}\nОтвет: {output}", ["input", "output"], shared=shared
         )
         
         # Настройка префикса и суффикса
@@ -240,11 +671,9 @@ class ChatPromptTemplate(PromptTemplateBase):
         
         if suffix is None:
             # Последнее сообщение пользователя становится шаблоном для ввода
-            last_user_msg = next((msg["content"] for msg in reversed(self.messages) 
-                                if msg["role"] == "user"), "{input}")
             suffix = f"\nВопрос: {last_user_msg}\nОтвет:"
         
-        return FewShotPromptTemplate(
+        return template_type("few_shot")(
             prefix=prefix,
             suffix=suffix,
             example_template=example_template,
@@ -253,12 +682,97 @@ class ChatPromptTemplate(PromptTemplateBase):
             example_separator=example_separator
         )
     
-    def _convert_to(self, target_type: Type['PromptTemplateBase']) -> 'PromptTemplateBase':
-        from .string import StringPromptTemplate
-        from .few_shot import FewShotPromptTemplate
+    def _convert_to(self, target_type: Type['PromptTemplateBase'], shared: bool = True) -> 'PromptTemplateBase':
+        if target_type == template_type("string"):
+            return self.to_string_template(shared=shared)
+        elif target_type == template_type("few_shot"):
+            return self.to_few_shot_template(shared=shared)
+        return self
+
+
+class ChatRenderSession:
+    """
+    Сессия инкрементального рендеринга чат-шаблона.
+    
+    Запоминает отформатированное содержание каждого сообщения вместе с ключами
+    (format_key) значений переменных, которые это сообщение использует; значения,
+    для которых ключ построить нельзя, рендерятся заново. Повторный format рендерит только
+    новые и измененные сообщения и сообщения, значения переменных которых изменились,
+    поэтому диалог, растущий на несколько сообщений за ход, не форматируется заново целиком.
+    
+    Пример:
+    session = template.render_session()
+    session.format(name="Анна")
+    template.add_user_message("Новый вопрос")
+    session.format(name="Анна")  # Рендерится только новое сообщение
+    """
+    
+    # Кэш перестраивается, когда в нем накапливается столько записей удаленных сообщений
+    _PRUNE_SLACK = 64
+    
+    def __init__(self, template: ChatPromptTemplate):
+        self.template = template
+        self.clear()
+    
+    def format(self, **kwargs) -> List[ChatMessage]:
+        """Форматирует шаблон, как ChatPromptTemplate.format, переиспользуя уже отрендеренные сообщения."""
+        template = self.template
+        required = template._required_variable_set()
+        if not kwargs.keys() >= required:
+            missing = required - kwargs.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        
+        # Переменные, значения которых могут форматироваться не так, как в предыдущем вызове
+        previous = self._keys
+        keys = {var: format_key(value) for var, value in kwargs.items()}
+        changed = {var for var, key in keys.items() if key is None or previous.get(var) != key}
+        changed.update(previous.keys() - keys.keys())
+        checked = self._generation
+        generation = self._generation = checked + 1
+        
+        entries = self._entries
+        formatted = []
+        for msg in template._messages:
+            if msg.__class__ is not TemplateMessage:
+                msg = TemplateMessage.coerce(msg)  # Сообщение, записанное в список напрямую
+            # Запись ищется по идентичности сообщения: измененное сообщение — новый объект
+            entry = entries.get(id(msg))
+            if entry is None or entry[0] is not msg:
+                entry = entries[id(msg)] = self._render(msg, kwargs, keys, generation)
+            elif entry[1] is not None:
+                compiled = entry[1]
+                # Запись, проверенная в прошлом вызове, актуальна, если ее переменные не изменились
+                if entry[4] != checked or not changed.isdisjoint(compiled.variable_set):
+                    message_keys = tuple(keys[var] for var in compiled.variables)
+                    if None in message_keys or message_keys != entry[2]:
+                        entry[2] = message_keys
+                        entry[3] = compiled.render(kwargs)
+            entry[4] = generation
+            formatted.append(ChatMessage(role=msg.role, content=entry[3]))
         
-        if target_type == StringPromptTemplate:
-            return self.to_string_template()
-        elif target_type == FewShotPromptTemplate:
-            return self.to_few_shot_template()
-        return self
\ No newline at end of file
+        self._keys = keys
+        if len(entries) > len(formatted) + self._PRUNE_SLACK:
+            # Записи удаленных и замененных сообщений больше не нужны
+            self._entries = {key: entry for key, entry in entries.items() if entry[4] == generation}
+        return formatted
+    
+    def clear(self) -> None:
+        """Сбрасывает все запомненные сообщения."""
+        # id(сообщение) -> [сообщение, скомпилированный шаблон, ключи значений его переменных (format_key),
+        #                   отформатированное содержание, номер последнего вызова, проверившего запись]
+        self._entries: Dict[int, List[Any]] = {}
+        self._keys: Dict[str, Any] = {}
+        self._generation = 0
+    
+    @staticmethod
+    def _render(msg: TemplateMessage, values: Mapping[str, Any], keys: Mapping[str, Any],
+                generation: int) -> List[Any]:
+        content = msg.content
+        if "{" not in content or "}" not in content:
+            return [msg, None, None, content, generation]
+        compiled = compile_template(content)
+        if compiled.is_static:
+            return [msg, None, None, compiled.text, generation]
+        return [msg, compiled, tuple(keys[var] for var in compiled.variables),
+                compiled.render(values), generation]
+
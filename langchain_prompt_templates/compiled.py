@@ -0,0 +1,280 @@
+"""Скомпилированный план рендеринга строковых шаблонов."""
+
+import _string
+from operator import add
+from typing import Any, Dict, FrozenSet, Iterator, List, Mapping, Optional, Tuple
+
+from .batch import FactorizedColumns
+from .lengths import TokenCounter, static_token_counts
+from .tokenizer import tokenize
+
+# Слот: (позиция в списке сегментов, имя переменной, поле для format_map или None)
+Slot = Tuple[int, Optional[str], Optional[str]]
+
+
+class CompiledTemplate:
+    """
+    План рендеринга шаблона: литеральные сегменты и слоты переменных.
+
+    Шаблон разбирается один раз при компиляции, после чего render только
+    подставляет значения в слоты и склеивает сегменты.
+    """
+
+    __slots__ = ("template", "parts", "slots", "variables", "variable_set", "text", "valid",
+                 "static_length", "_token_counts")
+
+    def __init__(self, template: str):
+        self.template = template
+        tokens = tokenize(template)
+        parts: List[Optional[str]] = []
+        slots: List[Slot] = []
+
+        if tokens.valid:
+            for segment in tokens.segments:
+                if segment.__class__ is str:
+                    parts.append(segment)
+                else:
+                    slots.append((len(parts), segment.name, segment.field))
+                    parts.append(None)
+        else:
+            # Некорректный шаблон: ошибка будет выброшена при рендеринге, как и у str.format
+            parts = [None]
+            slots = [(0, None, template)]
+
+        self.parts: Tuple[Optional[str], ...] = tuple(parts)
+        self.slots: Tuple[Slot, ...] = tuple(slots)
+        self.variables: Tuple[str, ...] = tokens.variables if tokens.valid else ()
+        self.variable_set: FrozenSet[str] = frozenset(self.variables)
+        self.text: Optional[str] = None if slots else "".join(parts)
+        self.valid: bool = tokens.valid
+        # Длина литеральных сегментов: длина результата без рендеринга — она плюс длины значений
+        self.static_length: int = sum(len(part) for part in parts if part is not None)
+        self._token_counts: Dict[TokenCounter, List[int]] = {}
+
+    @property
+    def is_static(self) -> bool:
+        """True, если шаблон не содержит переменных."""
+        return not self.slots
+
+    @property
+    def leading_text(self) -> str:
+        """Литеральный текст до первого поля (весь текст для статического шаблона)."""
+        if self.text is not None:
+            return self.text
+        return self.parts[0] or ""
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        """Подставляет значения в слоты и возвращает итоговую строку."""
+        if self.text is not None:
+            return self.text
+
+        parts = list(self.parts)
+        for index, name, field in self.slots:
+            if field is None:
+                value = values[name]
+                parts[index] = value if value.__class__ is str else format(value)
+            else:
+                parts[index] = field.format_map(values)
+        return "".join(parts)
+
+    def estimate_length(self, values: Mapping[str, Any]) -> int:
+        """Возвращает длину результата render, не собирая его: литералы учитываются готовой суммой."""
+        if self.text is not None:
+            return len(self.text)
+
+        length = self.static_length
+        for _, name, field in self.slots:
+            if field is None:
+                value = values[name]
+                length += len(value if value.__class__ is str else format(value))
+            else:
+                length += len(field.format_map(values))
+        return length
+
+    def count_tokens(self, values: Mapping[str, Any], counter: TokenCounter,
+                     memo: Optional[Dict[str, int]] = None) -> int:
+        """
+        Оценивает число токенов результата как сумму токенов литералов и значений.
+
+        Литералы подсчитываются один раз на функцию подсчета. Токены на границах
+        литералов и значений могут сливаться, поэтому результат обычно не меньше точного.
+        memo запоминает число токенов подставленных значений, если один набор значений
+        подсчитывается для нескольких шаблонов.
+        """
+        total = sum(static_token_counts(self._token_counts, counter, self.parts))
+        for _, name, field in self.slots:
+            if field is None:
+                value = values[name]
+                text = value if value.__class__ is str else format(value)
+            else:
+                text = field.format_map(values)
+            if memo is None:
+                total += counter(text)
+                continue
+            count = memo.get(text)
+            if count is None:
+                count = memo[text] = counter(text)
+            total += count
+        return total
+
+    def iter_chunks(self, values: Mapping[str, Any]) -> Iterator[str]:
+        """Выдает литеральные сегменты и подставленные значения по очереди."""
+        if self.text is not None:
+            yield self.text
+            return
+
+        # Слоты идут в том же порядке, что и пустые позиции в parts
+        slots = iter(self.slots)
+        for part in self.parts:
+            if part is not None:
+                yield part
+                continue
+            _, name, field = next(slots)
+            if field is None:
+                value = values[name]
+                yield value if value.__class__ is str else format(value)
+            else:
+                yield field.format_map(values)
+
+    def render_columns(self, columns: FactorizedColumns) -> List[str]:
+        """
+        Рендерит шаблон для всех строк колонок.
+
+        Соседние поля с одинаковым набором переменных объединяются во фрагменты
+        вместе с литералами между ними. Каждый фрагмент рендерится один раз на
+        уникальную комбинацию своих переменных, а строки результата собираются
+        из готовых фрагментов по кодам. Шаблон из одного фрагмента (например,
+        с одной переменной) не склеивается вовсе: строки с одинаковыми значениями
+        разделяют один объект результата.
+        """
+        length = columns.length
+        if self.text is not None:
+            return [self.text] * length
+
+        pieces = []
+        for fragment_names, fragment in self._fragments():
+            literals = _simple_literals(fragment) if len(fragment_names) == 1 else None
+            if literals is not None:
+                # Фрагмент из простых полей одной переменной: значение вставляется между литералами
+                codes, values = columns.factor(fragment_names[0])
+                rendered = [(value if value.__class__ is str else format(value)).join(literals)
+                            for value in values]
+            else:
+                codes, combinations = columns.group(fragment_names)
+                rendered = [_render_fragment(fragment, values) for values in combinations]
+            pieces.append(rendered if codes is None else [rendered[code] for code in codes])
+        if len(pieces) == 1:
+            return pieces[0]
+        if len(pieces) == 2:
+            return list(map(add, *pieces))
+        return list(map("".join, zip(*pieces)))
+
+    def _fragments(self) -> List[Tuple[Tuple[str, ...], List[Any]]]:
+        """Делит шаблон на фрагменты: (переменные, литералы и слоты фрагмента)."""
+        fragments: List[Tuple[Tuple[str, ...], List[Any]]] = []
+        leading: List[Any] = []
+        slots = iter(self.slots)
+        for part in self.parts:
+            if part is not None:
+                # Литерал относится к предыдущему фрагменту, литерал в начале — к первому
+                (fragments[-1][1] if fragments else leading).append(part)
+                continue
+            slot = next(slots)
+            _, name, field = slot
+            names = (name,) if field is None else tokenize(field).variables
+            if fragments and fragments[-1][0] == names:
+                fragments[-1][1].append(slot)
+            else:
+                fragments.append((names, leading + [slot]))
+                leading = []
+        return fragments
+
+    def bind(self, values: Mapping[str, Any]) -> str:
+        """
+        Возвращает текст шаблона, в котором поля с известными значениями уже подставлены.
+
+        Подставленные значения и литеральные сегменты экранируются, поля остальных
+        переменных сохраняются без изменений. Сложное поле подставляется, только если
+        известны все его переменные (включая переменные спецификации формата).
+        """
+        if not self.slots or not self.valid:
+            return self.template
+
+        pieces = []
+        slots = iter(self.slots)
+        for part in self.parts:
+            if part is not None:
+                pieces.append(_escape(part))
+                continue
+            _, name, field = next(slots)
+            if field is None:
+                if name in values:
+                    value = values[name]
+                    pieces.append(_escape(value if value.__class__ is str else format(value)))
+                else:
+                    pieces.append("{" + name + "}")
+            else:
+                needed = tokenize(field).variables
+                if needed and all(var in values for var in needed):
+                    pieces.append(_escape(field.format_map(values)))
+                else:
+                    pieces.append(_bind_format_spec(field, values))
+        return "".join(pieces)
+
+    def __reduce__(self):
+        # План пересобирается из строки: кэш токенов ключуется функциями подсчета, которые часто не сериализуются
+        return (CompiledTemplate, (self.template,))
+
+    def __repr__(self) -> str:
+        return f"CompiledTemplate({self.template!r})"
+
+
+def _bind_format_spec(field: str, values: Mapping[str, Any]) -> str:
+    """Подставляет известные значения во вложенные поля спецификации формата."""
+    _, field_name, format_spec, conversion = next(_string.formatter_parser(field))
+    if "{" not in format_spec or not all(var in values for var in tokenize(format_spec).variables):
+        return field
+    format_spec = format_spec.format_map(values)
+    if "{" in format_spec or "}" in format_spec:
+        return field  # Скобки в спецификации формата не экранируются, поле остается как есть
+    conversion = "!" + conversion if conversion else ""
+    return "{" + field_name + conversion + ":" + format_spec + "}"
+
+
+def _simple_literals(fragment: List[Any]) -> Optional[List[str]]:
+    """Возвращает литералы между простыми полями фрагмента или None, если есть сложные поля."""
+    literals = [""]
+    for piece in fragment:
+        if piece.__class__ is str:
+            literals[-1] += piece
+        elif piece[2] is None:
+            literals.append("")
+        else:
+            return None
+    return literals
+
+
+def _render_fragment(fragment: List[Any], values: Mapping[str, Any]) -> str:
+    """Рендерит литералы и слоты фрагмента так же, как render."""
+    chunks = []
+    for piece in fragment:
+        if piece.__class__ is str:
+            chunks.append(piece)
+            continue
+        _, name, field = piece
+        if field is None:
+            value = values[name]
+            chunks.append(value if value.__class__ is str else format(value))
+        else:
+            chunks.append(field.format_map(values))
+    return "".join(chunks)
+
+
+def _escape(text: str) -> str:
+    """Экранирует фигурные скобки, чтобы текст остался литералом шаблона."""
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def compile_template(template: str) -> CompiledTemplate:
+    """Компилирует строку шаблона в план рендеринга."""
+    return CompiledTemplate(template)
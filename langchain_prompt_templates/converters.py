@@ -5,22 +5,25 @@ from typing import Type, Any
 from .base import PromptTemplateBase
 
 def convert_template(source_template: PromptTemplateBase, 
-                    target_type: Type[PromptTemplateBase]) -> PromptTemplateBase:
+                    target_type: Type[PromptTemplateBase],
+                    shared: bool = True) -> PromptTemplateBase:
     """
     Универсальная функция для преобразования одного типа промт-шаблона в другой.
     
     Args:
         source_template: Исходный шаблон для преобразования
         target_type: Целевой тип шаблона
+        shared: Если True, возвращается копия запомненного результата, разделяющая с ним
+            план рендеринга; False строит результат заново
         
     Returns:
-        Новый экземпляр целевого типа
+        Экземпляр целевого типа
         
     Example:
         # Преобразование строкового шаблона в чат-шаблон
         chat_template = convert_template(string_template, ChatPromptTemplate)
     """
-    return source_template._convert_to(target_type)
+    return source_template._convert_to(target_type, shared)
 
 def auto_convert(source_template: PromptTemplateBase, 
                 target_type: Type[PromptTemplateBase],
@@ -31,10 +34,10 @@ def auto_convert(source_template: PromptTemplateBase,
     Args:
         source_template: Исходный шаблон для преобразования
         target_type: Целевой тип шаблона
-        **kwargs: Дополнительные параметры для метода преобразования
+        **kwargs: Дополнительные параметры для метода преобразования (включая shared)
         
     Returns:
-        Новый экземпляр целевого типа
+        Экземпляр целевого типа
     """
     if target_type.__name__ == "ChatPromptTemplate":
         return source_template.to_chat_template(**kwargs)
@@ -43,4 +46,4 @@ def auto_convert(source_template: PromptTemplateBase,
     elif target_type.__name__ == "FewShotPromptTemplate":
         return source_template.to_few_shot_template(**kwargs)
     else:
-        return source_template._convert_to(target_type)
\ No newline at end of file
+        return source_template._convert_to(target_type, kwargs.get("shared", True))
\ No newline at end of file
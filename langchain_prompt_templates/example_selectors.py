@@ -0,0 +1,227 @@
+"""Селекторы примеров для few-shot шаблонов."""
+
+import re
+import zlib
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, TYPE_CHECKING
+
+from .base import PromptTemplateBase
+from .lazy import LazyModule
+
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    # NumPy нужен только для эмбеддингов и импортируется при создании первого объекта, которому он нужен
+    np = LazyModule("numpy")
+
+
+def _require_numpy(owner: str) -> None:
+    try:
+        np.ndarray
+    except ImportError:
+        raise ImportError(f"Для {owner} требуется пакет numpy")
+
+
+class BaseExampleSelector(ABC):
+    """Абстрактный интерфейс выбора примеров для FewShotPromptTemplate."""
+
+    @abstractmethod
+    def select_examples(self, input_variables: Mapping[str, Any], reserved_text: str = "") -> List[Dict[str, str]]:
+        """
+        Выбирает примеры для подстановки в промт.
+
+        Args:
+            input_variables: Переменные текущего запроса
+            reserved_text: Уже отрендеренные префикс и суффикс промта, занимающие часть бюджета.
+                Селекторы, не ограниченные длиной, могут его игнорировать.
+        """
+        pass
+
+    async def aselect_examples(self, input_variables: Mapping[str, Any],
+                               reserved_text: str = "") -> List[Dict[str, str]]:
+        """Асинхронный вариант select_examples для селекторов, выполняющих ввод-вывод."""
+        return self.select_examples(input_variables, reserved_text)
+
+    @abstractmethod
+    def add_example(self, example: Dict[str, str]) -> None:
+        """Добавляет пример в пул селектора."""
+        pass
+
+
+class LengthBasedExampleSelector(BaseExampleSelector):
+    """
+    Выбирает наибольшее число первых примеров, помещающихся в max_length.
+
+    Длина каждого отрендеренного примера (в символах или токенах через
+    length_function) вычисляется один раз и хранится в массиве префиксных сумм,
+    поэтому выбор выполняется бинарным поиском за O(log n) без повторного рендеринга.
+    Длины примеров, зависящих от переменных запроса, оцениваются по значениям из самих примеров.
+    """
+
+    def __init__(self,
+                 examples: List[Dict[str, str]],
+                 example_template: PromptTemplateBase,
+                 max_length: int = 2048,
+                 length_function: Callable[[str], int] = len,
+                 example_separator: str = "\n\n"):
+        """
+        Args:
+            examples: Пул примеров в порядке приоритета
+            example_template: Шаблон для рендеринга примера при измерении его длины
+            max_length: Максимальная длина всего промта
+            length_function: Функция измерения длины (например, счетчик токенов)
+            example_separator: Разделитель между примерами, учитываемый в длине
+        """
+        self.examples = []
+        self.example_template = example_template
+        self.max_length = max_length
+        self.length_function = length_function
+        self.example_separator = example_separator
+        self._separator_length = length_function(example_separator)
+        # _cumulative[i] — суммарная длина первых i примеров, каждый со своим разделителем
+        self._cumulative = [0]
+        for example in examples:
+            self.add_example(example)
+
+    def add_example(self, example: Dict[str, str]) -> None:
+        length = self.length_function(self.example_template.format(**example))
+        self.examples.append(example)
+        self._cumulative.append(self._cumulative[-1] + length + self._separator_length)
+
+    def select_examples(self, input_variables: Mapping[str, Any], reserved_text: str = "") -> List[Dict[str, str]]:
+        budget = self.max_length - self.length_function(reserved_text)
+        # Между k примерами k - 1 разделителей, поэтому лишний разделитель добавляем к бюджету
+        count = bisect_right(self._cumulative, budget + self._separator_length) - 1
+        return self.examples[:max(count, 0)]
+
+    @property
+    def example_lengths(self) -> List[int]:
+        """Длины отрендеренных примеров без разделителей."""
+        cumulative = self._cumulative
+        return [cumulative[i + 1] - cumulative[i] - self._separator_length for i in range(len(self.examples))]
+
+
+class HashingEmbedder:
+    """
+    Детерминированный локальный эмбеддер на основе хеширования слов.
+
+    Каждое слово хешируется (crc32) в одну из dim корзин со знаком, после чего
+    вектор нормируется. Не требует модели и дает одинаковые векторы во всех процессах.
+    """
+
+    _WORD_PATTERN = re.compile(r"\w+")
+
+    def __init__(self, dim: int = 256):
+        _require_numpy("HashingEmbedder")
+        self.dim = dim
+
+    def __call__(self, texts: Sequence[str]) -> "np.ndarray":
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in self._WORD_PATTERN.findall(text.lower()):
+                digest = zlib.crc32(word.encode("utf-8"))
+                # Старший бит хеша задает знак, чтобы коллизии частично гасили друг друга
+                matrix[row, digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        return matrix
+
+
+class SemanticSimilarityExampleSelector(BaseExampleSelector):
+    """
+    Выбирает k примеров, наиболее похожих на входные переменные запроса.
+
+    Нормированные эмбеддинги примеров хранятся в одной непрерывной матрице
+    float32; косинусная близость считается одним матрично-векторным
+    произведением, а лучшие k находятся через argpartition. Матрица растет с
+    удвоением емкости, поэтому add_examples не перестраивает ее целиком.
+    """
+
+    def __init__(self,
+                 examples: List[Dict[str, str]],
+                 k: int = 4,
+                 embedding_function: Optional[Callable[[Sequence[str]], Any]] = None,
+                 example_keys: Optional[List[str]] = None,
+                 input_keys: Optional[List[str]] = None):
+        """
+        Args:
+            examples: Пул примеров
+            k: Количество выбираемых примеров
+            embedding_function: Функция, возвращающая матрицу эмбеддингов (n, d) для списка текстов.
+                По умолчанию используется HashingEmbedder.
+            example_keys: Ключи примера, из значений которых строится его текст (по умолчанию все)
+            input_keys: Входные переменные, из которых строится текст запроса (по умолчанию все)
+        """
+        _require_numpy("SemanticSimilarityExampleSelector")
+        self.k = k
+        self.embedding_function = embedding_function or HashingEmbedder()
+        self.example_keys = example_keys
+        self.input_keys = input_keys
+        self.examples: List[Dict[str, str]] = []
+        self._matrix = None
+        self._size = 0
+        self.add_examples(examples)
+
+    @property
+    def embeddings(self) -> "np.ndarray":
+        """Нормированные эмбеддинги примеров (представление без копирования)."""
+        if self._matrix is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    def add_example(self, example: Dict[str, str]) -> None:
+        self.add_examples([example])
+
+    def add_examples(self, examples: List[Dict[str, str]]) -> None:
+        """Добавляет примеры, вычисляя эмбеддинги только для новых строк."""
+        if not examples:
+            return
+        vectors = self._embed([self._example_text(example) for example in examples])
+
+        needed = self._size + len(examples)
+        if self._matrix is None or needed > self._matrix.shape[0]:
+            capacity = max(needed, 2 * (0 if self._matrix is None else self._matrix.shape[0]), 16)
+            grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            if self._matrix is not None:
+                grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+
+        self._matrix[self._size:needed] = vectors
+        self._size = needed
+        self.examples.extend(examples)
+
+    def select_examples(self, input_variables: Mapping[str, Any], reserved_text: str = "") -> List[Dict[str, str]]:
+        if not self._size:
+            return []
+        query = self._embed([self._query_text(input_variables)])[0]
+        scores = self.embeddings @ query
+        return [self.examples[i] for i in self._top_k(scores)]
+
+    def select_examples_batch(self, queries: Sequence[Mapping[str, Any]]) -> List[List[Dict[str, str]]]:
+        """Выбирает примеры сразу для многих запросов одним матрично-матричным произведением."""
+        if not self._size or not queries:
+            return [[] for _ in queries]
+        query_matrix = self._embed([self._query_text(query) for query in queries])
+        scores = query_matrix @ self.embeddings.T
+        return [[self.examples[i] for i in self._top_k(row)] for row in scores]
+
+    def _top_k(self, scores: "np.ndarray") -> "np.ndarray":
+        """Индексы k лучших оценок по убыванию."""
+        k = min(self.k, scores.shape[0])
+        if k <= 0:
+            return scores[:0].astype(np.intp)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def _embed(self, texts: List[str]) -> "np.ndarray":
+        vectors = np.asarray(self.embedding_function(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _example_text(self, example: Mapping[str, Any]) -> str:
+        keys = self.example_keys if self.example_keys is not None else example.keys()
+        return " ".join(str(example[key]) for key in keys if key in example)
+
+    def _query_text(self, input_variables: Mapping[str, Any]) -> str:
+        keys = self.input_keys if self.input_keys is not None else input_variables.keys()
+        return " ".join(str(input_variables[key]) for key in keys if key in input_variables)
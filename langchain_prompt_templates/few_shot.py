@@ -1,13 +1,154 @@
 """Реализация шаблона с примерами (few-shot learning)."""
 
-from typing import Dict, List, Any, Optional
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Type, Awaitable, Callable, FrozenSet, Hashable, Iterator, Mapping, Tuple, Union
 
+from .async_utils import join_chunks
 from .base import PromptTemplateBase
+from .example_selectors import BaseExampleSelector
+from .compiled import CompiledTemplate, compile_template
+from .lengths import TokenCounter, approximate_token_count, static_token_counts
+from .prefix import PrefixSplit, hash_text
+from .template_types import template_from_dict, template_type
+from .tokenizer import tokenize
+from .tracked import TrackedRecords
 from .string import StringPromptTemplate
 
+# Атрибуты, изменение которых делает недействительным кэш отрендеренных примеров
+_PLAN_ATTRIBUTES = frozenset({
+    "prefix", "suffix", "example_template", "examples", "example_separator", "input_variables",
+    "example_selector",
+})
+
+
+class _DynamicExample:
+    """Пример, который зависит от input_variables и рендерится при каждом вызове."""
+    
+    __slots__ = ("example",)
+    
+    def __init__(self, example: Dict[str, str]):
+        self.example = example
+
+
+class _FewShotPlan:
+    """План рендеринга few-shot шаблона: кэшированные статические блоки и динамические сегменты."""
+    
+    __slots__ = ("segments", "suffix", "example_template", "input_variables", "_token_counts")
+    
+    def __init__(self, segments: List[Any], suffix: CompiledTemplate,
+                 example_template: PromptTemplateBase, input_variables: Tuple[str, ...]):
+        self.segments = segments
+        self.suffix = suffix
+        self.example_template = example_template
+        self.input_variables = input_variables
+        self._token_counts: Dict[TokenCounter, List[int]] = {}
+    
+    def __reduce__(self):
+        # Кэш токенов не сериализуется: он ключуется функциями подсчета, в том числе lambda
+        return (_FewShotPlan, (self.segments, self.suffix, self.example_template, self.input_variables))
+    
+    def __call__(self, values: Mapping[str, Any]) -> str:
+        return "".join(self.iter_chunks(values))
+    
+    def iter_chunks(self, values: Mapping[str, Any], start: int = 0) -> Iterator[str]:
+        """Последовательно выдает части результата, начиная с сегмента start, не собирая его целиком."""
+        overrides = None
+        for segment in self.segments[start:] if start else self.segments:
+            if segment.__class__ is str:
+                yield segment
+            elif segment.__class__ is _DynamicExample:
+                if overrides is None:
+                    overrides = {k: values[k] for k in self.input_variables if k in values}
+                yield self.example_template.format(**{**segment.example, **overrides})
+            else:
+                yield segment.render(values)
+        yield self.suffix.render(values)
+    
+    def estimate_length(self, values: Mapping[str, Any]) -> int:
+        """Возвращает длину результата: статические блоки уже отрендерены, считаются только остальные сегменты."""
+        overrides = None
+        length = self.suffix.estimate_length(values)
+        for segment in self.segments:
+            if segment.__class__ is str:
+                length += len(segment)
+            elif segment.__class__ is _DynamicExample:
+                if overrides is None:
+                    overrides = {k: values[k] for k in self.input_variables if k in values}
+                length += self.example_template.estimate_length(**{**segment.example, **overrides})
+            else:
+                length += segment.estimate_length(values)
+        return length
+    
+    def count_tokens(self, values: Mapping[str, Any], counter: TokenCounter) -> int:
+        """Оценивает число токенов; токены статических блоков подсчитываются один раз на функцию подсчета."""
+        static = static_token_counts(self._token_counts, counter,
+                                     [segment if segment.__class__ is str else None for segment in self.segments])
+        overrides = None
+        total = self.suffix.count_tokens(values, counter)
+        for count, segment in zip(static, self.segments):
+            if segment.__class__ is str:
+                total += count
+            elif segment.__class__ is _DynamicExample:
+                if overrides is None:
+                    overrides = {k: values[k] for k in self.input_variables if k in values}
+                total += self.example_template.count_tokens(counter=counter, **{**segment.example, **overrides})
+            else:
+                total += segment.count_tokens(values, counter)
+        return total
+
+
+class _SelectorPlan:
+    """План рендеринга few-shot шаблона, примеры для которого выбирает селектор при каждом вызове."""
+    
+    __slots__ = ("prefix", "suffix", "example_template", "example_separator", "selector", "input_variables")
+    
+    def __init__(self, prefix: Any, suffix: CompiledTemplate, example_template: PromptTemplateBase,
+                 example_separator: str, selector: BaseExampleSelector, input_variables: Tuple[str, ...]):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.example_template = example_template
+        self.example_separator = example_separator
+        self.selector = selector
+        self.input_variables = input_variables
+    
+    def __call__(self, values: Mapping[str, Any]) -> str:
+        return "".join(self.iter_chunks(values))
+    
+    def iter_chunks(self, values: Mapping[str, Any]) -> Iterator[str]:
+        prefix, suffix = self._render_edges(values)
+        # Префикс и суффикс уже отрендерены и занимают часть бюджета селектора
+        examples = self.selector.select_examples(values, reserved_text=prefix + suffix)
+        return self._iter_selected(values, prefix, suffix, examples)
+    
+    async def arender(self, values: Mapping[str, Any]) -> str:
+        prefix, suffix = self._render_edges(values)
+        examples = await self.selector.aselect_examples(values, reserved_text=prefix + suffix)
+        return await join_chunks(self._iter_selected(values, prefix, suffix, examples))
+    
+    def _render_edges(self, values: Mapping[str, Any]) -> Tuple[str, str]:
+        prefix = self.prefix if self.prefix.__class__ is str else self.prefix.render(values)
+        return prefix, self.suffix.render(values)
+    
+    def _iter_selected(self, values: Mapping[str, Any], prefix: str, suffix: str,
+                       examples: List[Dict[str, str]]) -> Iterator[str]:
+        overrides = {k: values[k] for k in self.input_variables if k in values}
+        yield prefix
+        for i, example in enumerate(examples):
+            if i:
+                yield self.example_separator
+            yield self.example_template.format(**{**example, **overrides})
+        yield suffix
+
+
 class FewShotPromptTemplate(PromptTemplateBase):
     """Реализация шаблона с примерами (few-shot learning)."""
     
+    _plan = (-1, None, None)
+    _required_cache = (-1, frozenset())
+    
+    # Счетчик изменений списка examples, которому соответствуют версия и кэши шаблона
+    _examples_mutations = 0
+    
     def __init__(self, 
                  prefix: str,
                  suffix: str,
@@ -15,15 +156,17 @@ class FewShotPromptTemplate(PromptTemplateBase):
                  examples: List[Dict[str, str]],
                  input_variables: List[str],
                  example_separator: str = "\n\n",
+                 example_selector: Optional[BaseExampleSelector] = None,
                  **kwargs):
         """
         Args:
             prefix: Текст перед примерами
             suffix: Текст после примеров
             example_template: Шаблон для форматирования каждого примера
-            examples: Список примеров (словари с переменными)
+            examples: Список примеров (словари с переменными); шаблон хранит их копии
             input_variables: Переменные для всего шаблона
             example_separator: Разделитель между примерами
+            example_selector: Селектор, выбирающий примеры при каждом форматировании вместо examples
         """
         super().__init__(input_variables, **kwargs)
         self.prefix = prefix
@@ -31,28 +174,96 @@ class FewShotPromptTemplate(PromptTemplateBase):
         self.example_template = example_template
         self.examples = examples
         self.example_separator = example_separator
+        self.example_selector = example_selector
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in _PLAN_ATTRIBUTES:
+            self._check_mutable()
+        if name == "examples" and value.__class__ is not tuple:
+            # Примеры хранятся списком, считающим свои изменения и изменения самих примеров;
+            # кортеж — неизменяемые примеры общего экземпляра
+            if value.__class__ is not TrackedRecords:
+                value = TrackedRecords(value)
+            super().__setattr__("_examples_mutations", value.mutations)
+        super().__setattr__(name, value)
+        # Любое изменение частей шаблона сбрасывает кэши плана рендеринга и обязательных переменных
+        if name in _PLAN_ATTRIBUTES:
+            self._bump_version()
     
     def format(self, **kwargs) -> str:
-        if not self.validate(**kwargs):
-            missing = set(self.input_variables) - set(kwargs.keys())
+        required = self._required_variable_set()
+        if not kwargs.keys() >= required:
+            missing = required - kwargs.keys()
             raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
         
-        # Форматируем примеры
-        formatted_examples = []
-        for example in self.examples:
-            # Объединяем переменные примера с переменными из kwargs
-            example_vars = {**example, **{k: v for k, v in kwargs.items() if k in self.input_variables}}
-            formatted_example = self.example_template.format(**example_vars)
-            formatted_examples.append(formatted_example)
-        
-        # Форматируем префикс и суффикс
-        prefix = self.prefix.format(**kwargs) if "{" in self.prefix else self.prefix
-        suffix = self.suffix.format(**kwargs)
+        return self._render_plan()(kwargs)
+    
+    def format_iter(self, **kwargs) -> Iterator[str]:
+        """Выдает результат частями: кэшированные блоки, отдельные примеры и суффикс."""
+        required = self._required_variable_set()
+        if not kwargs.keys() >= required:
+            missing = required - kwargs.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
         
-        # Собираем всё вместе
-        return f"{prefix}{self.example_separator.join(formatted_examples)}{suffix}"
+        yield from self._render_plan().iter_chunks(kwargs)
+    
+    def estimate_length(self, **kwargs) -> int:
+        """Возвращает длину промта, не собирая его; при селекторе примеров промт форматируется."""
+        plan = self._checked_plan(kwargs)
+        if plan.__class__ is _SelectorPlan:
+            return sum(map(len, plan.iter_chunks(kwargs)))
+        return plan.estimate_length(kwargs)
+    
+    def count_tokens(self, *, counter: Optional[TokenCounter] = None, **kwargs) -> int:
+        """Оценивает число токенов промта, не собирая его; при селекторе примеров промт форматируется."""
+        plan = self._checked_plan(kwargs)
+        if counter is None:
+            counter = approximate_token_count
+        if plan.__class__ is _SelectorPlan:
+            return counter(plan(kwargs))
+        return plan.count_tokens(kwargs, counter)
+    
+    def _checked_plan(self, kwargs: Mapping[str, Any]) -> Union['_FewShotPlan', '_SelectorPlan']:
+        """Проверяет обязательные переменные и возвращает план рендеринга."""
+        required = self._required_variable_set()
+        if not kwargs.keys() >= required:
+            missing = required - kwargs.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        return self._render_plan()
+    
+    def add_example(self, example: Dict[str, str]) -> None:
+        """Добавляет пример в конец списка и сбрасывает кэш отрендеренных примеров."""
+        self._check_mutable()
+        self.examples.append(example)
+        self._examples_mutations = self.examples.mutations
+        self._bump_version()
     
     def validate(self, **kwargs) -> bool:
+        return kwargs.keys() >= self._required_variable_set()
+    
+    def _required_variable_set(self) -> FrozenSet[str]:
+        self._sync_examples()
+        version, required = self._required_cache
+        if version != self._version:
+            required = self._collect_required_variables()
+            self._required_cache = (self._version, required)
+        return required
+    
+    def _sync_examples(self) -> None:
+        """
+        Увеличивает версию, если список examples или сами примеры были изменены напрямую.
+        
+        Список examples считает свои изменения и изменения примеров, поэтому
+        fs.examples.append(...) и fs.examples[0]["input"] = ... за O(1) сбрасывают план
+        рендеринга, обязательные переменные, запомненные преобразования и ключи кэша результатов.
+        Примеры общего экземпляра хранятся кортежем и не изменяются.
+        """
+        examples = self.examples
+        if examples.__class__ is not tuple and examples.mutations != self._examples_mutations:
+            self._examples_mutations = examples.mutations
+            self._bump_version()
+    
+    def _collect_required_variables(self) -> FrozenSet[str]:
         # Проверяем переменные в префиксе, суффиксе и примерах
         all_vars = []
         
@@ -71,48 +282,297 @@ class FewShotPromptTemplate(PromptTemplateBase):
             all_vars.extend(example.keys())
         
         # Удаляем дубликаты и оставляем только те, что в input_variables
-        required_vars = set(all_vars) & set(self.input_variables)
-        return all(var in kwargs for var in required_vars)
+        return frozenset(set(all_vars) & set(self.input_variables))
+    
+    def _render_plan(self) -> Union['_FewShotPlan', '_SelectorPlan']:
+        # Прямые изменения примеров учитываются проверкой обязательных переменных перед рендерингом
+        version, example_plan, render = self._plan
+        # Шаблон примера мог быть изменен напрямую, поэтому сверяем и его план рендеринга
+        compiled = getattr(self.example_template, "compiled", None)
+        if version != self._version or example_plan is not compiled:
+            render = self._build_render_plan()
+            self._plan = (self._version, compiled, render)
+        return render
+    
+    def _async_render_plan(self) -> Callable[[Mapping[str, Any]], Awaitable[str]]:
+        plan = self._render_plan()
+        if plan.__class__ is _SelectorPlan:
+            return plan.arender
+        
+        async def arender(values: Mapping[str, Any]) -> str:
+            # Большие наборы примеров склеиваются с периодической передачей управления циклу событий
+            return await join_chunks(plan.iter_chunks(values))
+        
+        return arender
+    
+    def _build_render_plan(self) -> Union['_FewShotPlan', '_SelectorPlan']:
+        """
+        Разделяет шаблон на статические и динамические сегменты.
+        
+        Примеры, не зависящие от input_variables, рендерятся один раз и вместе с
+        префиксом и разделителями склеиваются в кэшированные блоки. При каждом
+        вызове рендерятся только динамические примеры, префикс с переменными и суффикс.
+        Если задан селектор примеров, набор примеров выбирается при каждом вызове.
+        """
+        input_variables = tuple(self.input_variables)
+        if self.example_selector is not None:
+            prefix = compile_template(self.prefix) if "{" in self.prefix else self.prefix
+            return _SelectorPlan(prefix, compile_template(self.suffix), self.example_template,
+                                 self.example_separator, self.example_selector, input_variables)
+        
+        example_template = self.example_template
+        is_static = self._static_example_test()
+        
+        segments: List[Any] = []
+        if "{" in self.prefix:
+            prefix = compile_template(self.prefix)
+            segments.append(prefix.text if prefix.is_static else prefix)
+        else:
+            segments.append(self.prefix)
+        
+        for i, example in enumerate(self.examples):
+            if i:
+                segments.append(self.example_separator)
+            segments.append(example_template.format(**example) if is_static(example) else _DynamicExample(example))
+        
+        # Склеиваем соседние статические сегменты в один блок
+        merged: List[Any] = []
+        run: List[str] = []
+        for segment in segments:
+            if segment.__class__ is str:
+                run.append(segment)
+                continue
+            if run:
+                merged.append("".join(run))
+                run = []
+            merged.append(segment)
+        if run:
+            merged.append("".join(run))
+        
+        return _FewShotPlan(merged, compile_template(self.suffix), example_template, input_variables)
+    
+    def _output_cacheable(self) -> bool:
+        # Набор примеров, выбранный селектором, зависит от его состояния
+        return self.example_selector is None
+    
+    def _static_example_test(self) -> Callable[[Dict[str, str]], bool]:
+        """Возвращает проверку, рендерится ли пример одинаково при любых значениях переменных."""
+        input_set = frozenset(self.input_variables)
+        compiled = getattr(self.example_template, "compiled", None)
+        template_inputs = frozenset(self.example_template.input_variables)
+        
+        def is_static(example: Dict[str, str]) -> bool:
+            # Пример статичен, если ни одна переменная его шаблона не берется из input_variables
+            return compiled is not None and not (
+                (compiled.variable_set | (template_inputs - example.keys())) & input_set
+            )
+        
+        return is_static
+    
+    def static_flags(self) -> Tuple[bool, ...]:
+        """Для каждого примера сообщает, статичен ли он (не зависит от input_variables)."""
+        if self.example_selector is not None:
+            raise NotImplementedError("Примеры шаблона с селектором выбираются при каждом форматировании")
+        is_static = self._static_example_test()
+        return tuple(is_static(example) for example in self.examples)
+    
+    def _build_prefix_plan(self) -> Tuple[str, Tuple[str, Optional[int], int]]:
+        """
+        Префикс — склеенный статический блок в начале плана и литеральное начало
+        следующего сегмента (префикса с переменными, динамического примера или суффикса).
+        
+        Данные префикса — (префикс, номер первого нерендеренного сегмента или None
+        для шаблона с селектором, длина литерального начала, отрезаемая от остатка).
+        """
+        plan = self._render_plan()
+        if plan.__class__ is _SelectorPlan:
+            # Примеры выбираются при каждом вызове, статичен только префикс шаблона
+            head = plan.prefix if plan.prefix.__class__ is str else plan.prefix.leading_text
+            return hash_text(head), (head, None, len(head))
+        
+        segments = plan.segments
+        start = 1 if segments and segments[0].__class__ is str else 0
+        static = segments[0] if start else ""
+        if start < len(segments):
+            following = segments[start]
+            if following.__class__ is _DynamicExample:
+                compiled = getattr(plan.example_template, "compiled", None)
+                literal = compiled.leading_text if compiled is not None else ""
+            else:
+                literal = following.leading_text
+        else:
+            literal = plan.suffix.leading_text
+        prefix = static + literal
+        return hash_text(prefix), (prefix, start, len(literal))
+    
+    def _split_prefix(self, prefix_hash: str, data: Tuple[str, Optional[int], int],
+                      values: Mapping[str, Any]) -> PrefixSplit:
+        prefix, start, size = data
+        plan = self._render_plan()
+        if start is None:
+            return PrefixSplit(prefix, plan(values)[size:], prefix_hash)
+        # Статический блок не рендерится повторно, от остатка отрезается только литеральное начало
+        return PrefixSplit(prefix, "".join(plan.iter_chunks(values, start))[size:], prefix_hash)
     
     def _extract_variables(self, text: str) -> List[str]:
         """Извлекает имена переменных из текста шаблона."""
-        import re
-        return re.findall(r'\{(\w+)\}', text)
+        return list(tokenize(text).variables)
     
     @classmethod
-    def from_examples(cls, 
+    def from_template(cls, template: PromptTemplateBase, input_variables: List[str],
+                      shared: bool = True, **kwargs) -> 'FewShotPromptTemplate':
+        """Создает экземпляр из шаблона примера. Префикс, суффикс и примеры передаются через kwargs."""
+        prefix = kwargs.pop("prefix", "")
+        suffix = kwargs.pop("suffix", "")
+        examples = kwargs.pop("examples", [])
+        return cls.from_examples(examples, template, prefix, suffix, input_variables, shared=shared, **kwargs)
+
+    @classmethod
+    def from_examples(cls,
                      examples: List[Dict[str, str]],
                      example_prompt: PromptTemplateBase,
                      prefix: str,
                      suffix: str,
                      input_variables: List[str],
                      example_separator: str = "\n\n",
+                     shared: bool = True,
                      **kwargs) -> 'FewShotPromptTemplate':
-        """Создает экземпляр из примеров и шаблонов."""
-        return cls(prefix, suffix, example_prompt, examples, input_variables, example_separator, **kwargs)
+        """
+        Создает экземпляр из примеров и шаблонов.
+        
+        По умолчанию отрендеренные статические примеры разделяются с другими
+        экземплярами с тем же содержимым через реестр шаблонов; результат можно
+        изменять, это не затрагивает остальные экземпляры. Общий экземпляр хранит
+        собственную неизменяемую копию example_prompt, поэтому последующие изменения
+        переданного шаблона примера на него не влияют. shared=False создает шаблон без реестра;
+        шаблон примера без ключа содержимого (см. _content_keyed) также не разделяется.
+        """
+        if not shared or not example_prompt._content_keyed():
+            return cls(prefix, suffix, example_prompt, examples, input_variables, example_separator, **kwargs)
+        key = (cls, prefix, suffix, example_prompt._content_key(),
+               tuple(tuple(example.items()) for example in examples),
+               tuple(input_variables), example_separator, tuple(sorted(kwargs.items())))
+        return cls._from_registry(key, lambda: cls(prefix, suffix, example_prompt._fork(), examples,
+                                                   list(input_variables), example_separator, **kwargs))
     
-    def to_string_template(self) -> 'StringPromptTemplate':
-        """Преобразует few-shot шаблон в строковый, объединяя все элементы."""
-        from .string import StringPromptTemplate
+    def _content_key(self) -> Hashable:
+        return (type(self), self.prefix, self.suffix, self.example_template._content_key(),
+                tuple(tuple(example.items()) for example in self.examples),
+                tuple(self.input_variables), self.example_separator, id(self.example_selector))
+    
+    def _content_keyed(self) -> bool:
+        # Селектор и шаблон примера без ключа содержимого входят в ключ по идентичности
+        return self.example_selector is None and self.example_template._content_keyed()
+    
+    def _freeze(self) -> None:
+        # Примеры копируются в неизменяемые отображения, шаблон примера замораживается вместе с шаблоном
+        self.examples = tuple(MappingProxyType(dict(example)) for example in self.examples)
+        self.input_variables = tuple(self.input_variables)
+        self.example_template._freeze()
+        # План с отрендеренными статическими примерами строится сразу и разделяется всеми копиями
+        try:
+            self._required_variable_set()
+            self._render_plan()
+        except (KeyError, IndexError, ValueError):
+            pass  # Ошибка в примерах проявится при форматировании, как у отдельного шаблона
+        super()._freeze()
+    
+    def _fork(self) -> 'FewShotPromptTemplate':
+        self._sync_examples()
+        template = type(self).__new__(type(self))
+        PromptTemplateBase.__init__(template, list(self.input_variables), **self.kwargs)
+        template.prefix = self.prefix
+        template.suffix = self.suffix
+        template.example_template = self.example_template._fork()
+        template.examples = TrackedRecords(self.examples)
+        template.example_separator = self.example_separator
+        template.example_selector = self.example_selector
+        # Отрендеренные статические примеры и обязательные переменные разделяются с исходным шаблоном
+        template._version = self._version
+        template._plan = self._plan
+        template._required_cache = self._required_cache
+        return template
+    
+    def partial(self, **bound) -> 'FewShotPromptTemplate':
+        if self.example_selector is not None:
+            raise NotImplementedError("Шаблон с селектором примеров не поддерживает частичное применение")
         
-        # Форматируем примеры без подстановки переменных
-        example_strings = []
+        # Связанные входные переменные переопределяют значения примеров так же, как при format
+        overrides = {var: bound[var] for var in self.input_variables if var in bound}
+        compiled = getattr(self.example_template, "compiled", None)
+        template_inputs = frozenset(self.example_template.input_variables)
+        examples = []
         for example in self.examples:
-            formatted = self.example_template.template
-            for var, value in example.items():
-                formatted = formatted.replace(f"{{{var}}}", f"{{{var}}}")
-            example_strings.append(formatted)
+            if overrides and (compiled is None or overrides.keys() & (
+                    compiled.variable_set | (template_inputs - example.keys()))):
+                example = {**example, **overrides}
+            examples.append(example)  # Примеры, не зависящие от связанных переменных, разделяются
+        
+        prefix = compile_template(self.prefix).bind(bound) if "{" in self.prefix else self.prefix
+        suffix = compile_template(self.suffix).bind(bound) if "{" in self.suffix else self.suffix
+        # Переменная остается обязательной, если поле с ней не удалось подставить целиком
+        remaining = set(tokenize(prefix).variables) | set(tokenize(suffix).variables)
+        
+        return FewShotPromptTemplate(
+            prefix=prefix,
+            suffix=suffix,
+            example_template=self.example_template,
+            examples=examples,
+            input_variables=[var for var in self.input_variables if var not in bound or var in remaining],
+            example_separator=self.example_separator,
+            **self.kwargs
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        if self.example_selector is not None:
+            raise NotImplementedError("Шаблон с селектором примеров не поддерживает сериализацию")
+        return {
+            "type": "few_shot",
+            "prefix": self.prefix,
+            "suffix": self.suffix,
+            "example_template": self.example_template.to_dict(),
+            "examples": [dict(example) for example in self.examples],
+            "input_variables": list(self.input_variables),
+            "example_separator": self.example_separator,
+            "kwargs": self.kwargs,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FewShotPromptTemplate':
+        return cls(
+            prefix=data["prefix"],
+            suffix=data["suffix"],
+            example_template=template_from_dict(data["example_template"]),
+            examples=data["examples"],
+            input_variables=list(data["input_variables"]),
+            example_separator=data["example_separator"],
+            **data.get("kwargs", {})
+        )
+    
+    def _conversion_version(self) -> Hashable:
+        # Преобразования используют текст шаблона примера, поэтому учитывается и его версия
+        self._sync_examples()
+        return (self._version, self.example_template._version)
+    
+    def to_string_template(self, shared: bool = True) -> 'StringPromptTemplate':
+        """Преобразует few-shot шаблон в строковый, объединяя все элементы."""
+        return self._conversion("string", self._build_string_template, shared)
+    
+    def _build_string_template(self) -> 'StringPromptTemplate':
+        # Примеры входят в результат без подстановки переменных, то есть как текст шаблона примера
+        example_strings = [self.example_template.template] * len(self.examples)
         
         combined = f"{self.prefix}\n{self.example_separator.join(example_strings)}\n{self.suffix}"
         return StringPromptTemplate(
             template=combined,
-            input_variables=self.input_variables.copy()
+            input_variables=list(self.input_variables)
         )
     
-    def to_chat_template(self) -> 'ChatPromptTemplate':
+    def to_chat_template(self, shared: bool = True) -> 'ChatPromptTemplate':
         """Преобразует few-shot шаблон в чат-шаблон."""
-        from .chat import ChatPromptTemplate, ChatMessage
-        
+        return self._conversion("chat", self._build_chat_template, shared)
+    
+    def _build_chat_template(self) -> 'ChatPromptTemplate':
         messages = []
         
         # Добавляем префикс как системное сообщение
@@ -121,37 +581,33 @@ class FewShotPromptTemplate(PromptTemplateBase):
         
         # Добавляем примеры как пары сообщений
         for example in self.examples:
-            # Форматируем пример без подстановки переменных
-            formatted_example = self.example_template.template
-            for var, value in example.items():
-                formatted_example = formatted_example.replace(f"{{{var}}}", f"{{{var}}}")
-            
             # Пытаемся извлечь input и output из примера
             if "input" in example and "output" in example:
                 messages.append({"role": "user", "content": example["input"]})
                 messages.append({"role": "assistant", "content": example["output"]})
             else:
-                # Если структура неизвестна, добавляем как одно сообщение
-                messages.append({"role": "user", "content": formatted_example})
+                # Если структура неизвестна, добавляем текст шаблона примера без подстановки переменных
+                messages.append({"role": "user", "content": self.example_template.template})
         
         # Добавляем суффикс как последнее сообщение пользователя
         if self.suffix.strip():
             messages.append({"role": "user", "content": self.suffix})
         
-        return ChatPromptTemplate(
+        return template_type("chat")(
             messages=messages,
-            input_variables=self.input_variables.copy()
+            input_variables=list(self.input_variables)
         )
     
-    def to_few_shot_template(self) -> 'FewShotPromptTemplate':
+    def to_few_shot_template(self, 
+                            example_separator: str = "\n\n",
+                            prefix: Optional[str] = None,
+                            suffix: Optional[str] = None,
+                            shared: bool = True) -> 'FewShotPromptTemplate':
         return self  # Уже few-shot шаблон
     
-    def _convert_to(self, target_type: Type['PromptTemplateBase']) -> 'PromptTemplateBase':
-        from .string import StringPromptTemplate
-        from .chat import ChatPromptTemplate
-        
+    def _convert_to(self, target_type: Type['PromptTemplateBase'], shared: bool = True) -> 'PromptTemplateBase':
         if target_type == StringPromptTemplate:
-            return self.to_string_template()
-        elif target_type == ChatPromptTemplate:
-            return self.to_chat_template()
+            return self.to_string_template(shared=shared)
+        elif target_type == template_type("chat"):
+            return self.to_chat_template(shared=shared)
         return self
\ No newline at end of file
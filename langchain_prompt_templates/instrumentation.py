@@ -0,0 +1,281 @@
+"""Хуки инструментирования форматирования, проверки и преобразований шаблонов.
+
+Пока не зарегистрирован ни один хук, методы шаблонов остаются исходными
+функциями и инструментирование ничего не стоит. При регистрации первого
+хука методы format, validate и to_*_template всех подклассов
+PromptTemplateBase заменяются обертками, замеряющими вызов; после удаления
+последнего хука исходные методы восстанавливаются.
+"""
+
+import functools
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from types import FunctionType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple, TYPE_CHECKING
+
+from .lazy import LazyModule
+
+if TYPE_CHECKING:
+    import hashlib
+    import logging
+
+    from .base import PromptTemplateBase
+else:
+    # hashlib нужен только для меток метрик, logging — только при ошибке в хуке
+    hashlib = LazyModule("hashlib")
+    logging = LazyModule("logging")
+
+# Инструментируемые методы шаблонов
+INSTRUMENTED_METHODS = ("format", "validate", "to_string_template", "to_chat_template", "to_few_shot_template")
+
+# Границы корзин гистограммы длительностей по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+class RenderEvent(NamedTuple):
+    """Сведения об одном инструментированном вызове."""
+    operation: str  # Имя метода: format, validate, to_chat_template и т.д.
+    template: 'PromptTemplateBase'
+    template_id: str  # Метка шаблона, см. template_label
+    duration: float  # Секунды
+    output_size: Optional[int]  # Длина результата в символах; None для validate и преобразований
+    variable_count: int  # Число переданных переменных
+    error: Optional[BaseException]  # Исключение, если вызов завершился ошибкой
+
+
+Hook = Callable[[RenderEvent], None]
+
+_hooks: List[Hook] = []
+_lock = threading.Lock()
+# (класс, имя метода) -> исходная функция, замененная оберткой
+_originals: Dict[Tuple[type, str], FunctionType] = {}
+_local = threading.local()
+
+
+def template_label(template: 'PromptTemplateBase') -> str:
+    """
+    Возвращает метку шаблона для метрик.
+
+    Используется metrics_name, если он задан; иначе метка строится из имени
+    класса и устойчивого хеша содержимого и кэшируется до следующего изменения
+    шаблона. Шаблонам, которые часто изменяются, стоит задавать metrics_name,
+    чтобы каждая правка не порождала новую метку.
+    """
+    if template.metrics_name:
+        return template.metrics_name
+    cached = template.__dict__.get("_metrics_label")
+    if cached is not None and cached[0] == template._version:
+        return cached[1]
+    digest = hashlib.blake2b(repr(template._content_key()).encode("utf-8"), digest_size=6).hexdigest()
+    label = f"{type(template).__name__}#{digest}"
+    template._metrics_label = (template._version, label)
+    return label
+
+
+def _output_size(result: Any) -> Optional[int]:
+    if isinstance(result, str):
+        return len(result)
+    if isinstance(result, list):
+        return sum(len(getattr(item, "content", "")) for item in result)
+    return None
+
+
+def _active_calls() -> Set[Tuple[int, str]]:
+    active = getattr(_local, "active", None)
+    if active is None:
+        active = _local.active = set()
+    return active
+
+
+def _emit(operation: str, template: 'PromptTemplateBase', duration: float, result: Any,
+          variable_count: int, error: Optional[BaseException]) -> None:
+    # Ошибка в метриках не должна менять результат format или validate, поэтому она только журналируется
+    try:
+        event = RenderEvent(operation, template, template_label(template), duration,
+                            None if error is not None else _output_size(result), variable_count, error)
+    except Exception:
+        _log_hook_error(operation, None)
+        return
+    for hook in tuple(_hooks):
+        try:
+            hook(event)
+        except Exception:
+            _log_hook_error(operation, hook)
+
+
+def _log_hook_error(operation: str, hook: Optional[Hook]) -> None:
+    logging.getLogger(__name__).exception(
+        "Ошибка инструментирования %s (хук %r) проигнорирована", operation, hook
+    )
+
+
+def _wrap(operation: str, func: FunctionType) -> Callable:
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        # Вложенные вызовы того же метода того же шаблона (через super()) учитываются один раз
+        active = _active_calls()
+        key = (id(self), operation)
+        if key in active:
+            return func(self, *args, **kwargs)
+        active.add(key)
+        start = perf_counter()
+        try:
+            result = func(self, *args, **kwargs)
+        except BaseException as exc:
+            _emit(operation, self, perf_counter() - start, None, len(kwargs), exc)
+            raise
+        finally:
+            active.discard(key)
+        _emit(operation, self, perf_counter() - start, result, len(kwargs), None)
+        return result
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_class(cls: type) -> None:
+    """Заменяет собственные инструментируемые методы класса обертками (если есть хуки)."""
+    if not _hooks:
+        return
+    for name in INSTRUMENTED_METHODS:
+        func = cls.__dict__.get(name)
+        if (isinstance(func, FunctionType) and not getattr(func, "__isabstractmethod__", False)
+                and not getattr(func, "__instrumented__", False)):
+            _originals[(cls, name)] = func
+            setattr(cls, name, _wrap(name, func))
+
+
+def _subclasses(root: type) -> List[type]:
+    found, stack = [], [root]
+    while stack:
+        cls = stack.pop()
+        found.append(cls)
+        stack.extend(cls.__subclasses__())
+    return found
+
+
+def add_hook(hook: Hook) -> None:
+    """
+    Регистрирует хук, вызываемый после каждого format, validate и преобразования шаблона.
+
+    Хук получает RenderEvent и вызывается в потоке, выполнившем операцию.
+    Исключение из хука журналируется через logging и не прерывает ни операцию,
+    ни вызов остальных хуков.
+    """
+    from .base import PromptTemplateBase
+
+    with _lock:
+        first = not _hooks
+        _hooks.append(hook)
+        if first:
+            for cls in _subclasses(PromptTemplateBase):
+                instrument_class(cls)
+
+
+def remove_hook(hook: Hook) -> None:
+    """Удаляет хук; после удаления последнего хука восстанавливаются исходные методы."""
+    with _lock:
+        _hooks.remove(hook)
+        if not _hooks:
+            for (cls, name), func in _originals.items():
+                setattr(cls, name, func)
+            _originals.clear()
+
+
+class MetricsCollector:
+    """
+    Хук, собирающий счетчики и гистограммы длительностей по шаблонам и операциям.
+
+    Пример:
+        collector = MetricsCollector()
+        add_hook(collector)
+        ...
+        print(collector.to_prometheus())
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # (метка шаблона, операция) -> [вызовы, ошибки, сумма секунд, сумма символов, максимум символов, корзины]
+        self._series: Dict[Tuple[str, str], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: RenderEvent) -> None:
+        key = (event.template_id, event.operation)
+        bucket = bisect_left(self.buckets, event.duration)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0, 0, 0.0, 0, 0, [0] * (len(self.buckets) + 1)]
+            series[0] += 1
+            if event.error is not None:
+                series[1] += 1
+            series[2] += event.duration
+            if event.output_size is not None:
+                series[3] += event.output_size
+                series[4] = max(series[4], event.output_size)
+            series[5][bucket] += 1
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Возвращает метрики в виде {шаблон: {операция: {...}}}; корзины гистограммы не накопительные."""
+        with self._lock:
+            snapshot = {key: list(series[:5]) + [list(series[5])] for key, series in self._series.items()}
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (template_id, operation), (calls, errors, seconds, chars, max_chars, counts) in snapshot.items():
+            result.setdefault(template_id, {})[operation] = {
+                "calls": calls,
+                "errors": errors,
+                "duration_seconds_sum": seconds,
+                "output_chars_sum": chars,
+                "output_chars_max": max_chars,
+                "duration_histogram": {
+                    **{str(bound): count for bound, count in zip(self.buckets, counts)},
+                    "+Inf": counts[-1],
+                },
+            }
+        return result
+
+    def to_prometheus(self, prefix: str = "prompt_template") -> str:
+        """Возвращает метрики в текстовом формате экспозиции Prometheus."""
+        with self._lock:
+            snapshot = {key: list(series[:5]) + [list(series[5])] for key, series in self._series.items()}
+
+        lines = []
+
+        def header(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        def labels(template_id: str, operation: str) -> str:
+            return f'template="{_escape(template_id)}",operation="{_escape(operation)}"'
+
+        for name, index, kind, help_text in (
+            ("calls_total", 0, "counter", "Number of template operations."),
+            ("errors_total", 1, "counter", "Number of template operations that raised."),
+            ("output_chars_total", 3, "counter", "Total rendered output size in characters."),
+            ("output_chars_max", 4, "gauge", "Largest rendered output size in characters."),
+        ):
+            header(name, kind, help_text)
+            for (template_id, operation), series in snapshot.items():
+                lines.append(f"{prefix}_{name}{{{labels(template_id, operation)}}} {series[index]}")
+
+        header("duration_seconds", "histogram", "Template operation latency in seconds.")
+        for (template_id, operation), series in snapshot.items():
+            base = labels(template_id, operation)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series[5]):
+                cumulative += count
+                lines.append(f'{prefix}_duration_seconds_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_duration_seconds_bucket{{{base},le="+Inf"}} {series[0]}')
+            lines.append(f"{prefix}_duration_seconds_sum{{{base}}} {series[2]}")
+            lines.append(f"{prefix}_duration_seconds_count{{{base}}} {series[0]}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Сбрасывает все собранные метрики."""
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,31 @@
+"""Модули с дорогим импортом, загружаемые при первом обращении.
+
+Как и публичные имена пакета (__getattr__ в __init__), такой модуль объявляется
+на уровне модуля, а импортируется только при первом обращении к его атрибуту,
+поэтому импорт пакета не платит за asyncio (около 60 мс), пул процессов
+(около 20 мс), logging, hashlib или numpy, пока они не нужны.
+"""
+
+from importlib import import_module
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule:
+    """Заместитель модуля: импортирует модуль name при первом обращении к любому его атрибуту."""
+
+    __slots__ = ("name", "_module")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._module: Optional[ModuleType] = None
+
+    def __getattr__(self, attribute: str) -> Any:
+        # Вызывается только для атрибутов модуля: собственные атрибуты заместителя хранятся в слотах
+        module = self._module
+        if module is None:
+            module = self._module = import_module(self.name)
+        return getattr(module, attribute)
+
+    def __repr__(self) -> str:
+        return f"LazyModule({self.name!r})"
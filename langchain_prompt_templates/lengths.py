@@ -0,0 +1,35 @@
+"""Подсчет токенов для оценки размера промта без его рендеринга."""
+
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Функция подсчета токенов в строке (например, на основе токенизатора модели)
+TokenCounter = Callable[[str], int]
+
+# Сколько разных функций подсчета запоминается для статических частей одного шаблона
+MAX_CACHED_COUNTERS = 8
+
+# Приближенная токенизация: слова и отдельные знаки препинания
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def approximate_token_count(text: str) -> int:
+    """Приближенно считает токены: слова и знаки препинания считаются по одному токену."""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def static_token_counts(cache: Dict[TokenCounter, List[int]], counter: TokenCounter,
+                        texts: Sequence[Optional[str]]) -> List[int]:
+    """
+    Возвращает число токенов в каждой статической части шаблона, запоминая результат в cache.
+
+    Для частей, равных None (поля подстановки), возвращается 0. Статические части
+    считаются один раз на функцию подсчета, поэтому при повторных вызовах
+    подсчитываются только значения переменных.
+    """
+    counts = cache.get(counter)
+    if counts is None:
+        if len(cache) >= MAX_CACHED_COUNTERS:
+            cache.clear()  # Функции подсчета, созданные на каждый вызов, не накапливаются
+        counts = cache[counter] = [counter(text) if text else 0 for text in texts]
+    return counts
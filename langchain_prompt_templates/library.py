@@ -0,0 +1,121 @@
+"""Библиотека шаблонов в одном файле с загрузкой через mmap."""
+
+import json
+import mmap
+import struct
+import threading
+from typing import Any, Dict, Iterator, Mapping, Tuple
+
+from .base import PromptTemplateBase
+from .template_types import template_from_dict
+
+# Сигнатура и версия формата файла библиотеки
+LIBRARY_MAGIC = b"LPTLIB01"
+
+# Длина оглавления: беззнаковое 64-битное целое little-endian сразу после сигнатуры
+_HEADER = struct.Struct("<Q")
+
+
+def write_library(path: str, templates: Mapping[str, PromptTemplateBase]) -> None:
+    """
+    Записывает шаблоны в файл библиотеки.
+
+    Формат файла: сигнатура, длина оглавления, оглавление в JSON
+    ({имя: [смещение, длина]}) и следом сериализованные шаблоны, каждый
+    отдельным JSON-документом. Смещения отсчитываются от конца оглавления.
+    """
+    payloads = []
+    index: Dict[str, Tuple[int, int]] = {}
+    offset = 0
+    for name, template in templates.items():
+        payload = json.dumps(template.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        index[name] = (offset, len(payload))
+        payloads.append(payload)
+        offset += len(payload)
+
+    header = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as fp:
+        fp.write(LIBRARY_MAGIC)
+        fp.write(_HEADER.pack(len(header)))
+        fp.write(header)
+        for payload in payloads:
+            fp.write(payload)
+
+
+class TemplateLibrary(Mapping):
+    """
+    Библиотека шаблонов, отображенная в память.
+
+    При открытии читается только оглавление; шаблон десериализуется и разбирается
+    при первом обращении по имени. Файл отображается только для чтения, так что
+    страницы делятся между процессами, открывшими ту же библиотеку.
+
+    Шаблон, полученный через library[name], разделяет разобранные данные с общим
+    экземпляром, созданным при первом обращении (копирование при записи), как шаблоны
+    из реестра; load(name, shared=False) десериализует шаблон заново.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(LIBRARY_MAGIC)] != LIBRARY_MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} не является файлом библиотеки шаблонов")
+
+        start = len(LIBRARY_MAGIC)
+        (header_length,) = _HEADER.unpack_from(self._mmap, start)
+        start += _HEADER.size
+        self._index: Dict[str, Tuple[int, int]] = json.loads(self._mmap[start:start + header_length])
+        self._data_offset = start + header_length
+        self._loaded: Dict[str, PromptTemplateBase] = {}
+        self._lock = threading.Lock()
+
+    def load(self, name: str, shared: bool = True) -> PromptTemplateBase:
+        """
+        Возвращает шаблон по имени.
+
+        Args:
+            name: Имя шаблона в библиотеке
+            shared: Если True, возвращает копию общего экземпляра, создаваемого один раз;
+                иначе каждый вызов заново десериализует шаблон
+        """
+        if not shared:
+            return template_from_dict(self._read(name))
+
+        template = self._loaded.get(name)
+        if template is None:
+            with self._lock:
+                template = self._loaded.get(name)
+                if template is None:
+                    template = template_from_dict(self._read(name))
+                    template._freeze()
+                    self._loaded[name] = template
+        return template._fork()
+
+    def _read(self, name: str) -> Dict[str, Any]:
+        offset, length = self._index[name]
+        start = self._data_offset + offset
+        return json.loads(self._mmap[start:start + length])
+
+    def __getitem__(self, name: str) -> PromptTemplateBase:
+        return self.load(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def close(self) -> None:
+        """Закрывает отображение файла; уже загруженные шаблоны остаются доступны."""
+        self._mmap.close()
+
+    def __enter__(self) -> 'TemplateLibrary':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,140 @@
+"""Кэш готовых результатов форматирования с LRU-вытеснением, TTL и ограничением по объему."""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple
+
+from .value_keys import format_key
+
+# Размеры кэша по умолчанию
+DEFAULT_OUTPUT_CACHE_SIZE = 4096
+DEFAULT_OUTPUT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class OutputCache:
+    """
+    Потокобезопасный кэш результатов format.
+
+    Ключ записи — идентификатор шаблона, версия его содержимого и каноническое
+    представление переменных, поэтому после изменения шаблона старые записи
+    больше не находятся. Записи вытесняются по LRU при превышении числа записей
+    или суммарного объема и перестают выдаваться по истечении ttl секунд.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_OUTPUT_CACHE_SIZE,
+                 max_bytes: int = DEFAULT_OUTPUT_CACHE_BYTES,
+                 ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            maxsize: Максимальное число записей
+            max_bytes: Максимальный суммарный размер результатов в байтах (оценка sys.getsizeof)
+            ttl: Время жизни записи в секундах; None — без ограничения
+            clock: Источник времени для TTL
+        """
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        # Ключ -> (результат, размер, момент истечения или None)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Возвращает результат по ключу или default, если записи нет или она устарела."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            result, size, expires = entry
+            if expires is not None and self.clock() >= expires:
+                del self._entries[key]
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: Hashable, result: Any) -> None:
+        """Запоминает результат; результат больше max_bytes не сохраняется."""
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (result, size, expires)
+            self.bytes += size
+            while len(self._entries) > self.maxsize or self.bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает размер кэша и счетчики попаданий, промахов, вытеснений и истечений."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def clear(self) -> None:
+        """Очищает кэш и сбрасывает счетчики."""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __reduce__(self):
+        # Сериализуются только настройки: записи и блокировка принадлежат процессу
+        return (OutputCache, (self.maxsize, self.max_bytes, self.ttl, self.clock))
+
+
+def result_size(result: Any) -> int:
+    """Оценивает объем результата форматирования: строки или списка сообщений."""
+    if result.__class__ is str:
+        return sys.getsizeof(result)
+    size = sys.getsizeof(result)
+    for item in result:
+        # Роли интернированы и разделяются всеми сообщениями, учитывается только содержание
+        size += sys.getsizeof(item) + sys.getsizeof(getattr(item, "content", item))
+    return size
+
+
+def canonical_values(values: Mapping[str, Any]) -> Optional[Hashable]:
+    """
+    Возвращает каноническое хешируемое представление переменных или None.
+
+    Порядок аргументов не влияет на ключ; значения входят в него ключами format_key,
+    поэтому равные, но по-разному форматируемые значения (1, 1.0 и True; 0.0 и -0.0)
+    не совпадают. Если хотя бы для одного значения ключ построить нельзя (Decimal,
+    пользовательские объекты), возвращается None, и результат не кэшируется.
+    """
+    items = []
+    for name, value in sorted(values.items()):
+        key = format_key(value)
+        if key is None:
+            return None
+        items.append((name, key))
+    return tuple(items)
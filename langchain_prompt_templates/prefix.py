@@ -0,0 +1,45 @@
+"""Разбиение результата форматирования на статический префикс и динамический остаток."""
+
+from typing import Any, Iterable, NamedTuple, Tuple, TYPE_CHECKING
+
+from .lazy import LazyModule
+
+if TYPE_CHECKING:
+    import hashlib
+else:
+    # Нужен только при построении плана префикса
+    hashlib = LazyModule("hashlib")
+
+
+class PrefixSplit(NamedTuple):
+    """
+    Результат format_split.
+
+    prefix — самая длинная часть результата, не зависящая от переменных
+    (строка или список сообщений), remainder — остальная часть того же типа,
+    prefix_hash — стабильный между процессами хеш префикса.
+    """
+    prefix: Any
+    remainder: Any
+    prefix_hash: str
+
+
+def hash_text(text: str) -> str:
+    """Возвращает SHA-256 строкового префикса в шестнадцатеричном виде."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_messages(messages: Iterable[Tuple[str, str]]) -> str:
+    """
+    Возвращает SHA-256 последовательности сообщений (роль, содержание).
+
+    Поля записываются с длиной, поэтому разные списки сообщений не дают
+    одинаковую последовательность байтов.
+    """
+    digest = hashlib.sha256()
+    for role, content in messages:
+        for field in (role, content):
+            data = field.encode("utf-8")
+            digest.update(b"%d:" % len(data))
+            digest.update(data)
+    return digest.hexdigest()
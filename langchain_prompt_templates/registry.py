@@ -0,0 +1,75 @@
+"""Общий для процесса реестр скомпилированных шаблонов с LRU-вытеснением."""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+# Размер реестра по умолчанию
+DEFAULT_REGISTRY_SIZE = 1024
+
+
+class TemplateRegistry:
+    """
+    Потокобезопасный LRU-кэш неизменяемых шаблонов, ключом которого служит содержимое шаблона.
+
+    Повторные вызовы фабричных методов с одинаковым содержимым используют один
+    замороженный экземпляр вместо повторного разбора и выделения памяти: вызывающие
+    получают его копии, разделяющие с ним сообщения, примеры и планы рендеринга.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_REGISTRY_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], T]) -> T:
+        """Возвращает шаблон по ключу, создавая и запоминая его при промахе."""
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        # Шаблон создается вне блокировки; при гонке сохраняется первый созданный экземпляр
+        template = factory()
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._entries.move_to_end(key)
+                return existing
+            self._entries[key] = template
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return template
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает счетчики попаданий, промахов и вытеснений."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self) -> None:
+        """Очищает реестр и сбрасывает счетчики."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Реестр, используемый фабричными методами шаблонов
+default_registry = TemplateRegistry()
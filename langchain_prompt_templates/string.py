@@ -1,9 +1,14 @@
 """Реализация простого строкового шаблона промта."""
 
-import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Type, Callable, FrozenSet, Hashable, Iterator, Mapping, Sequence, Tuple
 
 from .base import PromptTemplateBase
+from .batch import FactorizedColumns
+from .compiled import CompiledTemplate, compile_template
+from .lengths import TokenCounter, approximate_token_count
+from .prefix import PrefixSplit, hash_text
+from .template_types import template_type
+from .tokenizer import tokenize
 
 class StringPromptTemplate(PromptTemplateBase):
     """Реализация простого строкового шаблона промта."""
@@ -12,44 +17,163 @@ class StringPromptTemplate(PromptTemplateBase):
         super().__init__(input_variables, **kwargs)
         self.template = template
     
+    @property
+    def template(self) -> str:
+        return self._template
+    
+    @template.setter
+    def template(self, value: str) -> None:
+        self._check_mutable()
+        # План рендеринга пересобирается только при замене строки шаблона
+        self._template = value
+        self.compiled: CompiledTemplate = compile_template(value)
+        self._bump_version()
+    
+    @property
+    def input_variables(self) -> List[str]:
+        return self._input_variables
+    
+    @input_variables.setter
+    def input_variables(self, value: List[str]) -> None:
+        self._check_mutable()
+        self._input_variables = value
+        self._required_variables = frozenset(value)
+        self._bump_version()
+    
     def format(self, **kwargs) -> str:
-        if not self.validate(**kwargs):
-            missing = set(self.input_variables) - set(kwargs.keys())
+        if not kwargs.keys() >= self._required_variables:
+            missing = self._required_variables - kwargs.keys()
             raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
         
-        return self.template.format(**kwargs)
+        return self.compiled.render(kwargs)
+    
+    def format_iter(self, **kwargs) -> Iterator[str]:
+        """Выдает литеральные сегменты и значения переменных по очереди."""
+        if not kwargs.keys() >= self._required_variables:
+            missing = self._required_variables - kwargs.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        
+        yield from self.compiled.iter_chunks(kwargs)
     
     def validate(self, **kwargs) -> bool:
-        return all(var in kwargs for var in self.input_variables)
+        return kwargs.keys() >= self._required_variables
+    
+    def estimate_length(self, **kwargs) -> int:
+        if not kwargs.keys() >= self._required_variables:
+            missing = self._required_variables - kwargs.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        
+        return self.compiled.estimate_length(kwargs)
+    
+    def count_tokens(self, *, counter: Optional[TokenCounter] = None, **kwargs) -> int:
+        if not kwargs.keys() >= self._required_variables:
+            missing = self._required_variables - kwargs.keys()
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        
+        return self.compiled.count_tokens(kwargs, counter or approximate_token_count)
+    
+    def _required_variable_set(self) -> FrozenSet[str]:
+        return self._required_variables
+    
+    def _render_plan(self) -> Callable[[Mapping[str, Any]], str]:
+        return self.compiled.render
+    
+    def format_columns(self, **columns: Sequence[Any]) -> List[str]:
+        missing = self._required_variables - columns.keys()
+        if missing:
+            raise ValueError(f"Отсутствуют обязательные переменные: {missing}")
+        return self.compiled.render_columns(FactorizedColumns(columns))
+    
+    def _build_prefix_plan(self) -> Tuple[str, str]:
+        # Префикс — литеральный текст до первого поля
+        prefix = self.compiled.leading_text
+        return hash_text(prefix), prefix
+    
+    def _split_prefix(self, prefix_hash: str, prefix: str, values: Mapping[str, Any]) -> PrefixSplit:
+        return PrefixSplit(prefix, self.compiled.render(values)[len(prefix):], prefix_hash)
     
     @classmethod
-    def from_template(cls, template: str, input_variables: List[str], **kwargs) -> 'StringPromptTemplate':
-        """Создает экземпляр из строкового шаблона."""
-        return cls(template, input_variables, **kwargs)
+    def from_template(cls, template: str, input_variables: List[str],
+                      shared: bool = True, **kwargs) -> 'StringPromptTemplate':
+        """
+        Создает экземпляр из строкового шаблона.
+        
+        По умолчанию разбор шаблона разделяется с другими экземплярами с тем же
+        содержимым через реестр шаблонов; результат можно изменять, это не
+        затрагивает остальные экземпляры. shared=False создает шаблон без реестра.
+        """
+        if not shared:
+            return cls(template, input_variables, **kwargs)
+        key = (cls, template, tuple(input_variables), tuple(sorted(kwargs.items())))
+        return cls._from_registry(key, lambda: cls(template, list(input_variables), **kwargs))
+    
+    def _content_key(self) -> Hashable:
+        return (type(self), self.template, tuple(self.input_variables))
+    
+    def _freeze(self) -> None:
+        self._input_variables = tuple(self._input_variables)
+        super()._freeze()
+    
+    def _fork(self) -> 'StringPromptTemplate':
+        # Строка шаблона и скомпилированный план неизменяемы и разделяются
+        template = type(self).__new__(type(self))
+        PromptTemplateBase.__init__(template, list(self._input_variables), **self.kwargs)
+        template._template = self._template
+        template.compiled = self.compiled
+        return template
+    
+    def partial(self, **bound) -> 'StringPromptTemplate':
+        template = self.compiled.bind(bound)
+        # Переменная остается обязательной, если поле с ней не удалось подставить целиком
+        remaining = tokenize(template).variables
+        return StringPromptTemplate(
+            template,
+            [var for var in self.input_variables if var not in bound or var in remaining],
+            **self.kwargs
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "string",
+            "template": self.template,
+            "input_variables": list(self.input_variables),
+            "kwargs": self.kwargs,
+        }
     
-    def to_string_template(self) -> 'StringPromptTemplate':
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StringPromptTemplate':
+        return cls(data["template"], list(data["input_variables"]), **data.get("kwargs", {}))
+    
+    def to_string_template(self, shared: bool = True) -> 'StringPromptTemplate':
         return self  # Уже строковый шаблон
     
-    def to_chat_template(self) -> 'ChatPromptTemplate':
+    def to_chat_template(self, shared: bool = True) -> 'ChatPromptTemplate':
         """Преобразует строковый шаблон в чат-шаблон, используя его как сообщение пользователя."""
-        from .chat import ChatPromptTemplate
-        
-        return ChatPromptTemplate(
+        return self._conversion("chat", self._build_chat_template, shared)
+    
+    def _build_chat_template(self) -> 'ChatPromptTemplate':
+        return template_type("chat")(
             messages=[{"role": "user", "content": self.template}],
-            input_variables=self.input_variables.copy()
+            input_variables=list(self.input_variables)
         )
     
     def to_few_shot_template(self, 
                             example_separator: str = "\n\n",
                             prefix: Optional[str] = None,
-                            suffix: Optional[str] = None) -> 'FewShotPromptTemplate':
+                            suffix: Optional[str] = None,
+                            shared: bool = True) -> 'FewShotPromptTemplate':
         """Преобразует строковый шаблон в few-shot шаблон с одним примером."""
-        from .few_shot import FewShotPromptTemplate
-        
-        # Создаем базовый шаблон для примеров
-        example_template = StringPromptTemplate(
-            template=self.template,
-            input_variables=self.input_variables.copy()
+        return self._conversion(
+            ("few_shot", example_separator, prefix, suffix),
+            lambda: self._build_few_shot_template(example_separator, prefix, suffix, shared),
+            shared
+        )
+    
+    def _build_few_shot_template(self, example_separator: str, prefix: Optional[str],
+                                 suffix: Optional[str], shared: bool) -> 'FewShotPromptTemplate':
+        # Шаблон примера совпадает с исходным; для общего результата он берется из реестра
+        example_template = StringPromptTemplate.from_template(
+            self.template, list(self.input_variables), shared=shared
         )
         
         # Если префикс не указан, используем пустую строку
@@ -60,21 +184,18 @@ class StringPromptTemplate(PromptTemplateBase):
         if suffix is None:
             suffix = self.template
         
-        return FewShotPromptTemplate(
+        return template_type("few_shot")(
             prefix=prefix,
             suffix=suffix,
             example_template=example_template,
             examples=[{var: f"{{{{{var}}}}}" for var in self.input_variables}],
-            input_variables=self.input_variables.copy(),
+            input_variables=list(self.input_variables),
             example_separator=example_separator
         )
     
-    def _convert_to(self, target_type: Type['PromptTemplateBase']) -> 'PromptTemplateBase':
-        from .chat import ChatPromptTemplate
-        from .few_shot import FewShotPromptTemplate
-        
-        if target_type == ChatPromptTemplate:
-            return self.to_chat_template()
-        elif target_type == FewShotPromptTemplate:
-            return self.to_few_shot_template()
+    def _convert_to(self, target_type: Type['PromptTemplateBase'], shared: bool = True) -> 'PromptTemplateBase':
+        if target_type == template_type("chat"):
+            return self.to_chat_template(shared=shared)
+        elif target_type == template_type("few_shot"):
+            return self.to_few_shot_template(shared=shared)
         return self  # По умолчанию возвращаем себя
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""Реестр типов шаблонов, разрешаемых один раз при первом обращении.
+
+Модули шаблонов ссылаются друг на друга при преобразованиях; вместо
+импорта внутри каждого метода классы берутся из этого реестра, а
+соответствующий модуль импортируется только при первом запросе типа.
+"""
+
+from importlib import import_module
+from typing import Any, Dict, Tuple, Type, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .base import PromptTemplateBase
+
+# Метка типа -> (модуль внутри пакета, имя класса)
+_TYPE_LOCATIONS: Dict[str, Tuple[str, str]] = {
+    "string": (".string", "StringPromptTemplate"),
+    "chat": (".chat", "ChatPromptTemplate"),
+    "few_shot": (".few_shot", "FewShotPromptTemplate"),
+}
+
+# Уже разрешенные типы
+_resolved: Dict[str, Type['PromptTemplateBase']] = {}
+
+
+def template_type(kind: str) -> Type['PromptTemplateBase']:
+    """
+    Возвращает класс шаблона по метке типа ("string", "chat" или "few_shot").
+
+    Модуль класса импортируется при первом обращении, дальнейшие вызовы
+    сводятся к поиску в словаре.
+    """
+    try:
+        return _resolved[kind]
+    except KeyError:
+        pass
+    try:
+        module_name, class_name = _TYPE_LOCATIONS[kind]
+    except KeyError:
+        raise ValueError(f"Неизвестный тип шаблона: {kind!r}")
+    cls = getattr(import_module(module_name, __package__), class_name)
+    _resolved[kind] = cls
+    return cls
+
+
+def template_from_dict(data: Dict[str, Any]) -> 'PromptTemplateBase':
+    """Восстанавливает шаблон любого поддерживаемого типа из представления to_dict."""
+    return template_type(data.get("type")).from_dict(data)
@@ -0,0 +1,148 @@
+"""Коллекции, считающие собственные изменения, для публичных изменяемых атрибутов шаблонов."""
+
+from types import MappingProxyType
+from typing import Any, Iterable, Mapping, Tuple
+
+
+class TrackedList(list):
+    """
+    Список, увеличивающий счетчик mutations при каждом изменении.
+
+    Шаблон запоминает значение счетчика после собственных изменений списка и по
+    его несовпадению за O(1) узнает, что список изменили напрямую, без сравнения
+    содержимого с сохраненной копией.
+    """
+
+    mutations = 0
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        self.mutations += 1
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index: Any) -> None:
+        self.mutations += 1
+        super().__delitem__(index)
+
+    def __iadd__(self, other: Any) -> 'TrackedList':
+        self.mutations += 1
+        return super().__iadd__(other)
+
+    def __imul__(self, count: int) -> 'TrackedList':
+        self.mutations += 1
+        return super().__imul__(count)
+
+    def append(self, value: Any) -> None:
+        self.mutations += 1
+        super().append(value)
+
+    def extend(self, values: Any) -> None:
+        self.mutations += 1
+        super().extend(values)
+
+    def insert(self, index: int, value: Any) -> None:
+        self.mutations += 1
+        super().insert(index, value)
+
+    def pop(self, index: int = -1) -> Any:
+        self.mutations += 1
+        return super().pop(index)
+
+    def remove(self, value: Any) -> None:
+        self.mutations += 1
+        super().remove(value)
+
+    def clear(self) -> None:
+        self.mutations += 1
+        super().clear()
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        self.mutations += 1
+        super().sort(*args, **kwargs)
+
+    def reverse(self) -> None:
+        self.mutations += 1
+        super().reverse()
+
+
+class TrackedDict(dict):
+    """Словарь, изменения которого увеличивают счетчик содержащего его TrackedRecords."""
+
+    __slots__ = ("owner",)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.owner.mutations += 1
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: Any) -> None:
+        self.owner.mutations += 1
+        super().__delitem__(key)
+
+    def __ior__(self, other: Any) -> 'TrackedDict':
+        self.owner.mutations += 1
+        return super().__ior__(other)
+
+    def clear(self) -> None:
+        self.owner.mutations += 1
+        super().clear()
+
+    def pop(self, *args: Any) -> Any:
+        self.owner.mutations += 1
+        return super().pop(*args)
+
+    def popitem(self) -> Tuple[Any, Any]:
+        self.owner.mutations += 1
+        return super().popitem()
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        self.owner.mutations += 1
+        return super().setdefault(key, default)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self.owner.mutations += 1
+        super().update(*args, **kwargs)
+
+    def __reduce__(self):
+        # Владелец не сериализуется: TrackedRecords заново оборачивает словари при восстановлении
+        return (dict, (dict(self),))
+
+
+class TrackedRecords(TrackedList):
+    """
+    Список словарей, учитывающий и изменения самих словарей.
+
+    Добавляемые словари копируются в TrackedDict этого списка, поэтому
+    records[0]["key"] = ... тоже увеличивает mutations; изменения исходных
+    словарей вызывающего на список не влияют.
+    """
+
+    def __init__(self, records: Iterable[Mapping[str, Any]] = ()):
+        # Отображения только для чтения (примеры общих шаблонов) быстрее копируются через copy()
+        owned = [TrackedDict(record.copy() if record.__class__ is MappingProxyType else record)
+                 for record in records]
+        for record in owned:
+            record.owner = self
+        super().__init__(owned)
+
+    def _own(self, record: Mapping[str, Any]) -> TrackedDict:
+        owned = TrackedDict(record)
+        owned.owner = self
+        return owned
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        if index.__class__ is slice:
+            value = list(map(self._own, value))
+        else:
+            value = self._own(value)
+        super().__setitem__(index, value)
+
+    def __iadd__(self, other: Any) -> 'TrackedRecords':
+        return super().__iadd__(map(self._own, other))
+
+    def append(self, value: Any) -> None:
+        super().append(self._own(value))
+
+    def extend(self, values: Any) -> None:
+        super().extend(map(self._own, values))
+
+    def insert(self, index: int, value: Any) -> None:
+        super().insert(index, self._own(value))
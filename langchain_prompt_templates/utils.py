@@ -1,11 +1,12 @@
 """Вспомогательные утилиты для работы с промт-шаблонами."""
 
-import re
 from typing import List, Dict, Any
 
+from .tokenizer import tokenize
+
 def extract_variables(text: str) -> List[str]:
-    """Извлекает имена переменных из текста шаблона."""
-    return re.findall(r'\{(\w+)\}', text)
+    """Извлекает уникальные имена переменных из текста шаблона в порядке появления."""
+    return list(tokenize(text).variables)
 
 def validate_template_variables(template: str, provided_vars: Dict[str, Any]) -> bool:
     """Проверяет, что все переменные в шаблоне предоставлены."""
@@ -0,0 +1,39 @@
+"""Ключи значений переменных, равенство которых гарантирует одинаковый результат форматирования."""
+
+from typing import Any, Hashable, Optional
+
+# Типы, равные значения одного из которых всегда форматируются одинаково
+EXACT_TYPES = frozenset({str, int, bool, type(None)})
+
+_MISSING = object()
+
+
+def format_key(value: Any) -> Optional[Hashable]:
+    """
+    Возвращает хешируемый ключ значения или None, если такой ключ построить нельзя.
+
+    Равные ключи гарантируют, что значения форматируются одинаково, а ключ не
+    зависит от последующих изменений значения на месте. Тип значения входит в
+    ключ, поэтому 1, 1.0 и True не совпадают; числа с плавающей точкой сравниваются
+    по repr (0.0 и -0.0 различаются); списки, кортежи и словари из таких значений
+    приводятся рекурсивно. Для значений остальных типов (Decimal, пользовательские
+    объекты и т.п.) равенство не гарантирует одинаковое форматирование.
+    """
+    key = _key(value)
+    return None if key is _MISSING else key
+
+
+def _key(value: Any) -> Any:
+    cls = value.__class__
+    if cls in EXACT_TYPES:
+        return (cls, value)
+    if cls is float:
+        return (cls, repr(value))
+    if cls is list or cls is tuple:
+        items = tuple(_key(item) for item in value)
+        return _MISSING if any(item is _MISSING for item in items) else (cls, items)
+    if cls is dict:
+        # Ключи словаря приводятся так же, как значения: {1: ...} и {True: ...} форматируются по-разному
+        items = tuple((_key(key), _key(item)) for key, item in value.items())
+        return _MISSING if any(key is _MISSING or item is _MISSING for key, item in items) else (cls, items)
+    return _MISSING
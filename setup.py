@@ -7,6 +7,9 @@ setup(
     install_requires=[
         # Зависимости, если нужны
     ],
+    extras_require={
+        "similarity": ["numpy"],
+    },
     author="Your Name",
     description="Advanced prompt templates for LangChain with dynamic modification and conversion capabilities",
     long_description=open("README.md").read(),
@@ -0,0 +1,40 @@
+"""Общие фикстуры проверок: шаблоны каждого типа и наборы равных, но по-разному форматируемых значений."""
+
+from decimal import Decimal
+from functools import partial
+
+import pytest
+
+from langchain_prompt_templates import ChatPromptTemplate, FewShotPromptTemplate, StringPromptTemplate
+
+# Равные (или одинаково выглядящие) значения, которые format может выводить по-разному
+EQUAL_VALUES = {
+    "numbers": [1, True, 1.0],
+    "signed_zero": [0.0, -0.0],
+    "decimal": [Decimal("1.0"), Decimal("1.00")],
+    "nested": [[0.0], [-0.0], [1], [True]],
+    "dict_keys": [{1: "a"}, {True: "a"}],
+    "strings": ["текст", "текст", None],
+}
+
+
+def make_template(kind):
+    """Создает изменяемый шаблон указанного типа с единственной переменной value."""
+    if kind == "string":
+        return StringPromptTemplate("Значение: {value}", ["value"])
+    if kind == "chat":
+        return ChatPromptTemplate.from_messages(("system", "Ты эксперт."), ("user", "Значение: {value}"))
+    example_template = StringPromptTemplate("Вопрос: {q}\nОтвет: {a}", ["q", "a"])
+    return FewShotPromptTemplate("Примеры:\n", "\nЗначение: {value}", example_template,
+                                 [{"q": "2+2", "a": "4"}], ["value"])
+
+
+@pytest.fixture(params=["string", "chat", "few_shot"])
+def template_factory(request):
+    """Фабрика новых шаблонов одного типа; тест параметризуется по всем типам."""
+    return partial(make_template, request.param)
+
+
+@pytest.fixture(params=list(EQUAL_VALUES.values()), ids=list(EQUAL_VALUES))
+def equal_values(request):
+    return request.param
@@ -0,0 +1,44 @@
+"""Проверки асинхронного форматирования aformat и aformat_batch."""
+
+import asyncio
+
+import pytest
+
+
+async def fetched(value, delay=0):
+    await asyncio.sleep(delay)
+    return value
+
+
+def test_aformat_resolves_awaitables_and_async_callables(template_factory):
+    template = template_factory()
+
+    async def load():
+        return "из функции"
+
+    assert asyncio.run(template.aformat(value=fetched("x"))) == template.format(value="x")
+    assert asyncio.run(template.aformat(value=load)) == template.format(value="из функции")
+    assert asyncio.run(template.aformat(value="обычное")) == template.format(value="обычное")
+
+
+def test_aformat_reports_missing_variables(template_factory):
+    with pytest.raises(ValueError):
+        asyncio.run(template_factory().aformat())
+
+
+def test_aformat_batch_matches_format_many_and_limits_concurrency(template_factory):
+    template = template_factory()
+    active = peak = 0
+
+    async def tracked(value):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001)
+        active -= 1
+        return value
+
+    rows = [{"value": tracked(str(i))} for i in range(20)]
+    results = asyncio.run(template.aformat_batch(rows, max_concurrency=3, yield_every=7))
+    assert results == template.format_many(value=[str(i) for i in range(20)])
+    assert peak <= 3
@@ -0,0 +1,19 @@
+"""Проверки пакетного форматирования по колонкам."""
+
+import pytest
+
+from langchain_prompt_templates import StringPromptTemplate
+
+
+def test_format_columns_matches_format_many(template_factory, equal_values):
+    template = template_factory()
+    column = equal_values * 2  # Повторы, чтобы колонка раскладывалась на уникальные значения
+    assert template.format_columns(value=column) == template.format_many(value=column)
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_format_columns_keeps_signed_zero_in_numpy_arrays(dtype):
+    np = pytest.importorskip("numpy")
+    template = StringPromptTemplate("Значение: {x}", ["x"])
+    column = np.array([0.0, -0.0, 0.0, -0.0], dtype=dtype)
+    assert template.format_columns(x=column) == template.format_many(x=column)
@@ -0,0 +1,35 @@
+"""Проверки копирования при записи между ChatPromptBuilder и шаблонами."""
+
+from langchain_prompt_templates import ChatPromptBuilder, ChatPromptTemplate
+
+
+def make_base():
+    return ChatPromptTemplate.from_messages(("system", "Ты {role}"), ("user", "{question}"), shared=False)
+
+
+def test_built_template_lists_do_not_alias_base():
+    base = make_base()
+    built = ChatPromptBuilder().from_template(base).build()
+    built.messages.append({"role": "user", "content": "Еще"})
+    built.input_variables.append("extra")
+    assert len(base.messages) == 2
+    assert "extra" not in base.input_variables
+    assert base.format(role="эксперт", question="?")[-1].content == "?"
+
+
+def test_builder_lists_do_not_alias_template():
+    base = make_base()
+    builder = ChatPromptBuilder().from_template(base)
+    builder.messages.pop()
+    builder.add_user_message("Новый {topic}")
+    assert [msg["content"] for msg in base.messages] == ["Ты {role}", "{question}"]
+    assert "topic" not in base.input_variables
+
+
+def test_base_changes_do_not_reach_built_template():
+    base = make_base()
+    built = ChatPromptBuilder().from_template(base).build()
+    base.messages.append({"role": "user", "content": "{late}"})
+    base.add_assistant_message("Ответ")
+    assert len(built.messages) == 2
+    assert built.format(role="эксперт", question="?")[-1].content == "?"
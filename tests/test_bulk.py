@@ -0,0 +1,32 @@
+"""Проверки массового рендеринга в пуле процессов."""
+
+import json
+
+import pytest
+
+from langchain_prompt_templates.bulk import read_jsonl, render_bulk, render_bulk_chunks
+
+
+def test_render_bulk_keeps_order_across_workers(template_factory):
+    template = template_factory()
+    template.format_split(value="прогрев")  # Шаблон с заполненными кэшами передается воркерам
+    rows = ({"value": str(i)} for i in range(23))
+    results = list(render_bulk(template, rows, max_workers=2, chunk_size=4, max_pending=2))
+    assert results == template.format_many(value=[str(i) for i in range(23)])
+
+
+def test_render_bulk_chunks_yields_chunk_sized_batches(template_factory):
+    template = template_factory()
+    chunks = list(render_bulk_chunks(template, [{"value": i} for i in range(10)], max_workers=1, chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+
+
+def test_render_bulk_reports_missing_variables(template_factory):
+    with pytest.raises(ValueError):
+        list(render_bulk(template_factory(), [{"value": 1}, {}], max_workers=1))
+
+
+def test_read_jsonl_skips_blank_lines(tmp_path):
+    path = tmp_path / "rows.jsonl"
+    path.write_text(json.dumps({"value": "а"}) + "\n\n" + json.dumps({"value": "б"}) + "\n", encoding="utf-8")
+    assert list(read_jsonl(str(path))) == [{"value": "а"}, {"value": "б"}]
@@ -0,0 +1,30 @@
+"""Проверки индекса переменных ChatPromptTemplate."""
+
+import pytest
+
+from langchain_prompt_templates import ChatPromptTemplate
+
+
+def make_template():
+    return ChatPromptTemplate([{"role": "system", "content": "Ты {a}"}, {"role": "user", "content": "Вопрос"}],
+                              ["a", "b"])
+
+
+def test_replaced_message_updates_required_variables():
+    template = make_template()
+    assert template.validate(a=1)
+    template.messages[1] = {"role": "user", "content": "Вопрос про {b}"}
+    assert not template.validate(a=1)
+    with pytest.raises(ValueError):
+        template.format(a=1)
+    assert template.format(a=1, b=2)[1].content == "Вопрос про 2"
+
+
+def test_replaced_message_is_seen_by_later_api_changes():
+    template = make_template()
+    assert template.validate(a=1)
+    template.messages[1] = {"role": "user", "content": "Вопрос про {b}"}
+    template.add_user_message("Еще")
+    with pytest.raises(ValueError):
+        template.format(a=1)
+    assert [msg.content for msg in template.format(a=1, b=2)] == ["Ты 1", "Вопрос про 2", "Еще"]
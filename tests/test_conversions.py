@@ -0,0 +1,21 @@
+"""Проверки запомненных преобразований между типами шаблонов."""
+
+from langchain_prompt_templates import StringPromptTemplate
+
+
+def test_converted_template_is_mutable_and_isolated():
+    template = StringPromptTemplate("Объясни {concept}", ["concept"])
+    chat = template.to_chat_template()
+    chat.add_system_message("Ты эксперт по {domain}.", index=0)
+    chat.messages.append({"role": "user", "content": "Еще"})
+
+    fresh = template.to_chat_template()
+    assert [msg["content"] for msg in fresh.messages] == ["Объясни {concept}"]
+    assert fresh.input_variables == ["concept"]
+
+
+def test_conversion_follows_source_changes():
+    template = StringPromptTemplate("Объясни {concept}", ["concept"])
+    template.to_chat_template()
+    template.template = "Опиши {concept}"
+    assert template.to_chat_template().format(concept="x")[0].content == "Опиши x"
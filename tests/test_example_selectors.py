@@ -0,0 +1,88 @@
+"""Проверки селекторов примеров и их использования в FewShotPromptTemplate."""
+
+import pytest
+
+from langchain_prompt_templates import FewShotPromptTemplate, StringPromptTemplate
+from langchain_prompt_templates.example_selectors import LengthBasedExampleSelector
+
+EXAMPLE_TEMPLATE = StringPromptTemplate("Вопрос: {q}\nОтвет: {a}", ["q", "a"])
+EXAMPLES = [{"q": "2+" * i + "2", "a": str(2 * i + 2)} for i in range(12)]
+
+
+def naive_count(examples, max_length, reserved_length, separator="\n\n"):
+    """Наибольшее число первых примеров, помещающихся в бюджет, перебором."""
+    count = 0
+    for k in range(1, len(examples) + 1):
+        rendered = separator.join(EXAMPLE_TEMPLATE.format(**example) for example in examples[:k])
+        if reserved_length + len(rendered) <= max_length:
+            count = k
+    return count
+
+
+@pytest.mark.parametrize("max_length", [0, 20, 57, 100, 250, 10_000])
+def test_length_based_selector_matches_naive_count(max_length):
+    selector = LengthBasedExampleSelector(EXAMPLES, EXAMPLE_TEMPLATE, max_length=max_length)
+    reserved = "Примеры:\n"
+    selected = selector.select_examples({}, reserved_text=reserved)
+    assert selected == EXAMPLES[:naive_count(EXAMPLES, max_length, len(reserved))]
+
+
+def test_length_based_selector_accepts_added_examples():
+    selector = LengthBasedExampleSelector(EXAMPLES[:2], EXAMPLE_TEMPLATE, max_length=10_000)
+    selector.add_example(EXAMPLES[2])
+    assert selector.select_examples({}) == EXAMPLES[:3]
+    assert selector.example_lengths == [len(EXAMPLE_TEMPLATE.format(**example)) for example in EXAMPLES[:3]]
+
+
+def test_few_shot_template_respects_selector_budget():
+    selector = LengthBasedExampleSelector(EXAMPLES, EXAMPLE_TEMPLATE, max_length=150)
+    template = FewShotPromptTemplate("Примеры:\n", "\nВопрос: {input}", EXAMPLE_TEMPLATE, [], ["input"],
+                                     example_selector=selector)
+    for question in ["?", "очень длинный вопрос " * 3]:
+        result = template.format(input=question)
+        assert len(result) <= 150
+        assert result == "".join(template.format_iter(input=question))
+
+
+def naive_top_k(selector, examples, query, k):
+    """k примеров с наибольшей косинусной близостью, посчитанной по одному."""
+    np = pytest.importorskip("numpy")
+
+    def unit(text):
+        vector = np.asarray(selector.embedding_function([text])[0], dtype=np.float64)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    query_vector = unit(query)
+    scores = [float(unit(" ".join(example.values())) @ query_vector) for example in examples]
+    order = sorted(range(len(examples)), key=lambda i: -scores[i])
+    return [examples[i] for i in order[:k]]
+
+
+SEMANTIC_EXAMPLES = [
+    {"q": "столица Франции", "a": "Париж"},
+    {"q": "столица Германии", "a": "Берлин"},
+    {"q": "сколько будет два плюс два", "a": "четыре"},
+    {"q": "сколько будет три плюс три", "a": "шесть"},
+    {"q": "цвет неба днем", "a": "голубой"},
+]
+
+
+@pytest.mark.parametrize("query", ["столица Франции", "сколько будет два плюс", "цвет неба"])
+def test_semantic_selector_matches_naive_top_k(query):
+    pytest.importorskip("numpy")
+    from langchain_prompt_templates.example_selectors import SemanticSimilarityExampleSelector
+
+    selector = SemanticSimilarityExampleSelector(SEMANTIC_EXAMPLES[:2], k=2)
+    selector.add_examples(SEMANTIC_EXAMPLES[2:])  # Матрица эмбеддингов растет без перестроения
+    assert selector.select_examples({"input": query}) == naive_top_k(selector, SEMANTIC_EXAMPLES, query, 2)
+    assert selector.select_examples_batch([{"input": query}]) == [selector.select_examples({"input": query})]
+
+
+def test_semantic_selector_handles_small_pools():
+    pytest.importorskip("numpy")
+    from langchain_prompt_templates.example_selectors import SemanticSimilarityExampleSelector
+
+    assert SemanticSimilarityExampleSelector([], k=3).select_examples({"input": "x"}) == []
+    selector = SemanticSimilarityExampleSelector(SEMANTIC_EXAMPLES[:1], k=3)
+    assert selector.select_examples({"input": "x"}) == SEMANTIC_EXAMPLES[:1]
@@ -0,0 +1,82 @@
+"""Проверки few-shot шаблона: кэшированный план рендеринга против прямого рендеринга."""
+
+import pickle
+
+import pytest
+
+from langchain_prompt_templates import FewShotPromptTemplate, StringPromptTemplate
+
+
+def render_directly(template, **kwargs):
+    """Рендерит few-shot шаблон без кэшей, как исходная реализация format."""
+    overrides = {k: v for k, v in kwargs.items() if k in template.input_variables}
+    examples = [template.example_template.format(**{**example, **overrides}) for example in template.examples]
+    prefix = template.prefix.format(**kwargs) if "{" in template.prefix else template.prefix
+    return f"{prefix}{template.example_separator.join(examples)}{template.suffix.format(**kwargs)}"
+
+
+@pytest.fixture
+def template():
+    example_template = StringPromptTemplate("Вопрос: {q}\nОтвет: {a}", ["q", "a"])
+    examples = [{"q": "2+2", "a": "4"}, {"q": "3+3", "a": "6"}]
+    return FewShotPromptTemplate("Примеры:\n", "\nВопрос: {input}", example_template, examples, ["input"])
+
+
+def test_format_matches_direct_render(template):
+    assert template.format(input="5+5") == render_directly(template, input="5+5")
+
+
+def test_appended_example_is_rendered(template):
+    template.format(input="5+5")
+    template.examples.append({"q": "4+4", "a": "8"})
+    assert template.format(input="5+5") == render_directly(template, input="5+5")
+    assert "4+4" in template.format(input="5+5")
+
+
+def test_edited_example_is_rendered(template):
+    template.format(input="5+5")
+    template.examples[0]["q"] = "CHANGED"
+    assert template.format(input="5+5") == render_directly(template, input="5+5")
+    assert "CHANGED" in "".join(template.format_iter(input="5+5"))
+
+
+def test_replaced_and_removed_examples_are_rendered(template):
+    template.format(input="5+5")
+    template.examples[1] = {"q": "7+7", "a": "14"}
+    assert template.format(input="5+5") == render_directly(template, input="5+5")
+    del template.examples[0]
+    assert template.format(input="5+5") == render_directly(template, input="5+5")
+
+
+def test_required_variables_follow_edited_examples(template):
+    template.suffix = "\nВопрос:"
+    assert template.validate()  # input не используется ни в суффиксе, ни в примерах
+    template.examples[0]["input"] = "значение из примера"
+    assert not template.validate()
+    with pytest.raises(ValueError):
+        template.format()
+
+
+def test_conversion_follows_edited_examples(template):
+    chat = template.to_chat_template()
+    template.examples.append({"input": "вопрос", "output": "ответ"})
+    assert template.to_chat_template() is not chat
+    assert any(msg["content"] == "вопрос" for msg in template.to_chat_template().messages)
+
+
+def test_output_cache_follows_edited_examples(template):
+    template.enable_output_cache()
+    assert template.format(input="5+5") == render_directly(template, input="5+5")
+    template.examples[0]["a"] = "5"
+    assert template.format(input="5+5") == render_directly(template, input="5+5")
+    template.examples.append({"q": "1+1", "a": "2"})
+    assert template.format(input="5+5") == render_directly(template, input="5+5")
+
+
+def test_example_edits_after_pickle_are_rendered(template):
+    template.format(input="5+5")
+    restored = pickle.loads(pickle.dumps(template))
+    restored.format(input="5+5")
+    restored.examples[0]["q"] = "CHANGED"
+    assert restored.format(input="5+5") == render_directly(restored, input="5+5")
+    assert "CHANGED" not in template.format(input="5+5")
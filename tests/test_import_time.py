@@ -0,0 +1,25 @@
+"""Проверки бюджета времени импорта и ленивой загрузки тяжелых модулей."""
+
+import pytest
+
+from langchain_prompt_templates.benchmarks import import_time
+from langchain_prompt_templates.lazy import LazyModule
+
+
+@pytest.mark.parametrize("statement", list(import_time.BUDGETS_MS))
+def test_import_fits_budget(statement):
+    elapsed = import_time.measure(statement)
+    assert elapsed <= import_time.BUDGETS_MS[statement], f"{statement}: {elapsed:.1f} мс"
+
+
+def test_package_import_defers_heavy_modules():
+    assert import_time.eagerly_loaded() == []
+
+
+def test_lazy_module_imports_on_first_attribute_access():
+    module = LazyModule("json")
+    assert module._module is None
+    assert module.dumps([1]) == "[1]"
+    assert module._module is not None
+    with pytest.raises(ImportError):
+        LazyModule("langchain_prompt_templates_missing").anything
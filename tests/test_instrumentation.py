@@ -0,0 +1,30 @@
+"""Проверки хуков инструментирования."""
+
+import logging
+
+from langchain_prompt_templates import StringPromptTemplate
+from langchain_prompt_templates.instrumentation import add_hook, remove_hook
+
+
+def test_failing_hook_does_not_break_format(caplog):
+    operations = []
+
+    def failing(event):
+        raise RuntimeError("сбой хука")
+
+    def recording(event):
+        operations.append(event.operation)
+
+    add_hook(failing)
+    add_hook(recording)
+    try:
+        template = StringPromptTemplate("Привет, {name}", ["name"])
+        with caplog.at_level(logging.ERROR):
+            assert template.format(name="Анна") == "Привет, Анна"
+            assert template.validate(name="Анна")
+    finally:
+        remove_hook(failing)
+        remove_hook(recording)
+
+    assert operations == ["format", "validate"]
+    assert "сбой хука" in caplog.text
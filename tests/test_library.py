@@ -0,0 +1,49 @@
+"""Проверки библиотеки шаблонов: запись, загрузка через mmap и изоляция копий."""
+
+import pytest
+
+from langchain_prompt_templates.library import TemplateLibrary, write_library
+
+
+@pytest.fixture
+def library_path(tmp_path, template_factory):
+    path = str(tmp_path / "templates.lptlib")
+    write_library(path, {"основной": template_factory(), "второй": template_factory()})
+    return path
+
+
+def test_library_round_trip_matches_source(library_path, template_factory):
+    source = template_factory()
+    with TemplateLibrary(library_path) as library:
+        assert sorted(library) == ["второй", "основной"]
+        assert "основной" in library and "нет" not in library
+        for shared in (True, False):
+            loaded = library.load("основной", shared=shared)
+            assert type(loaded) is type(source)
+            assert loaded.to_dict() == source.to_dict()
+            assert loaded.format(value="x") == source.format(value="x")
+
+
+def test_library_copies_are_mutable_and_isolated(library_path):
+    with TemplateLibrary(library_path) as library:
+        first = library["основной"]
+        first.input_variables.append("extra")
+        if hasattr(first, "add_user_message"):
+            first.add_user_message("Еще {detail}")
+        second = library["основной"]
+        assert second.input_variables == ["value"]
+        assert second.to_dict() == library.load("основной", shared=False).to_dict()
+
+
+def test_loaded_templates_outlive_closed_library(library_path, template_factory):
+    library = TemplateLibrary(library_path)
+    loaded = library["второй"]
+    library.close()
+    assert loaded.format(value="x") == template_factory().format(value="x")
+
+
+def test_library_rejects_foreign_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a library at all")
+    with pytest.raises(ValueError):
+        TemplateLibrary(str(path))
@@ -0,0 +1,9 @@
+"""Проверки кэша результатов format."""
+
+
+def test_cached_format_matches_format_for_equal_values(template_factory, equal_values):
+    cached = template_factory()
+    cached.enable_output_cache()
+    plain = template_factory()
+    for value in equal_values:
+        assert cached.format(value=value) == plain.format(value=value)
@@ -0,0 +1,42 @@
+"""Проверки partial: связанные переменные подставляются заранее, результат совпадает с format."""
+
+import pytest
+
+from langchain_prompt_templates import ChatPromptTemplate, FewShotPromptTemplate, StringPromptTemplate
+
+
+def make_templates():
+    example_template = StringPromptTemplate("Вопрос: {q}\nОтвет: {a} ({topic})", ["q", "a", "topic"])
+    return [
+        StringPromptTemplate("Тема {topic}: {question} {count:>{width}}", ["topic", "question", "count", "width"]),
+        ChatPromptTemplate.from_messages(("system", "Ты эксперт по {topic}."),
+                                         ("user", "{question} {count:>{width}}")),
+        FewShotPromptTemplate("Примеры по {topic}:\n", "\n{question} {count:>{width}}", example_template,
+                              [{"q": "2+2", "a": "4", "topic": "из примера"}],
+                              ["topic", "question", "count", "width"]),
+    ]
+
+
+VALUES = {"topic": "{математика}", "question": "Сколько?", "count": 5, "width": 4}
+
+
+@pytest.mark.parametrize("template", make_templates(), ids=lambda t: type(t).__name__)
+@pytest.mark.parametrize("bound", [["topic"], ["width"], ["topic", "count"]])
+def test_partial_matches_format(template, bound):
+    partial = template.partial(**{name: VALUES[name] for name in bound})
+    # Переменная поля, которое не удалось подставить целиком ({count:>{width}} без width), остается обязательной
+    rest = {name: value for name, value in VALUES.items() if name not in bound or name in partial.input_variables}
+    assert partial.format(**rest) == template.format(**VALUES)
+
+
+def test_partial_keeps_unbound_variables_required():
+    template = StringPromptTemplate("{count:>{width}} {topic}", ["count", "width", "topic"])
+    partial = template.partial(width=4)
+    assert sorted(partial.input_variables) == ["count", "topic"]
+    assert not partial.validate(topic="x")
+
+
+def test_partial_leaves_source_template_unchanged():
+    template = make_templates()[1]
+    template.partial(topic="физике")
+    assert template.format(**VALUES)[0].content == "Ты эксперт по {математика}."
@@ -0,0 +1,19 @@
+"""Проверки сериализации шаблонов pickle после заполнения внутренних кэшей."""
+
+import pickle
+
+
+def test_pickle_after_format_split(template_factory):
+    template = template_factory()
+    expected = template.format_split(value="списки")
+    restored = pickle.loads(pickle.dumps(template))
+    assert restored.format_split(value="списки") == expected
+    assert restored.static_prefix_hash() == template.static_prefix_hash()
+
+
+def test_pickle_after_count_tokens_with_lambda(template_factory):
+    template = template_factory()
+    expected = template.count_tokens(counter=lambda text: len(text.split()), value="списки")
+    restored = pickle.loads(pickle.dumps(template))
+    assert restored.format(value="списки") == template.format(value="списки")
+    assert restored.count_tokens(counter=lambda text: len(text.split()), value="списки") == expected
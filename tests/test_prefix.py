@@ -0,0 +1,37 @@
+"""Проверки format_split: статический префикс, остаток и стабильный хеш префикса."""
+
+from langchain_prompt_templates import ChatPromptTemplate, StringPromptTemplate
+from langchain_prompt_templates.prefix import hash_text
+
+
+def test_prefix_and_remainder_recompose_format(template_factory):
+    template = template_factory()
+    split = template.format_split(value="x")
+    assert split.prefix + split.remainder == template.format(value="x")
+    assert split.prefix_hash == template.static_prefix_hash()
+
+
+def test_prefix_hash_does_not_depend_on_values(template_factory):
+    template = template_factory()
+    first = template.format_split(value="первое")
+    second = template.format_split(value="второе")
+    assert first.prefix == second.prefix
+    assert first.prefix_hash == second.prefix_hash
+
+
+def test_string_prefix_stops_at_first_variable():
+    split = StringPromptTemplate("Системный текст. {question} Хвост", ["question"]).format_split(question="?")
+    assert split.prefix == "Системный текст. "
+    assert split.remainder == "? Хвост"
+    assert split.prefix_hash == hash_text("Системный текст. ")
+
+
+def test_chat_prefix_hash_follows_static_messages():
+    template = ChatPromptTemplate.from_messages(("system", "Ты эксперт."), ("user", "{question}"), shared=False)
+    before = template.static_prefix_hash()
+    assert [msg.content for msg in template.format_split(question="?").prefix] == ["Ты эксперт."]
+
+    template.update_message(0, "Ты учитель.")
+    assert template.static_prefix_hash() != before
+    template.update_message(0, "Ты эксперт.")
+    assert template.static_prefix_hash() == before
@@ -0,0 +1,51 @@
+"""Проверки шаблонов, разделяющих данные через реестр шаблонов."""
+
+from langchain_prompt_templates import ChatPromptTemplate, FewShotPromptTemplate, PromptTemplateBase, StringPromptTemplate
+
+
+def test_shared_chat_template_is_mutable_and_isolated():
+    first = ChatPromptTemplate.from_messages(("system", "Ты {role}"), ("user", "{question}"))
+    first.add_user_message("Еще {detail}")
+    first.messages.append({"role": "assistant", "content": "Ответ"})
+    first.input_variables.append("extra")
+    second = ChatPromptTemplate.from_messages(("system", "Ты {role}"), ("user", "{question}"))
+    assert [msg["content"] for msg in second.messages] == ["Ты {role}", "{question}"]
+    assert sorted(second.input_variables) == ["question", "role"]
+
+
+def test_shared_string_template_input_variables_are_isolated():
+    first = StringPromptTemplate.from_template("Привет, {name}", ["name"])
+    first.input_variables.append("extra")
+    assert StringPromptTemplate.from_template("Привет, {name}", ["name"]).input_variables == ["name"]
+
+
+def test_shared_few_shot_template_does_not_alias_caller_data():
+    example_prompt = StringPromptTemplate("Вопрос: {q}\nОтвет: {a}", ["q", "a"])
+    examples = [{"q": "2+2", "a": "4"}]
+    first = FewShotPromptTemplate.from_examples(examples, example_prompt, "", "\n{input}", ["input"])
+    expected = first.format(input="?")
+
+    # Изменения переданных объектов и полученной копии не затрагивают общий экземпляр
+    example_prompt.template = "Изменено: {q}"
+    examples[0]["q"] = "изменено"
+    first.examples[0]["a"] = "изменено"
+    first.add_example({"q": "3+3", "a": "6"})
+
+    second = FewShotPromptTemplate.from_examples([{"q": "2+2", "a": "4"}],
+                                                 StringPromptTemplate("Вопрос: {q}\nОтвет: {a}", ["q", "a"]),
+                                                 "", "\n{input}", ["input"])
+    assert second.format(input="?") == expected
+
+
+class IdentityKeyedTemplate(StringPromptTemplate):
+    """Шаблон, ключ содержимого которого — идентичность экземпляра."""
+
+    _content_key = PromptTemplateBase._content_key
+
+
+def test_few_shot_with_identity_keyed_example_prompt_is_not_shared():
+    for number in range(200):
+        example_prompt = IdentityKeyedTemplate(f"{number}: {{q}}", ["q"])
+        template = FewShotPromptTemplate.from_examples([{"q": "x"}], example_prompt, "", "", [])
+        assert template.format() == f"{number}: x"
+        del example_prompt, template
@@ -0,0 +1,28 @@
+"""Проверки инкрементального рендеринга ChatRenderSession."""
+
+from langchain_prompt_templates import ChatPromptTemplate
+
+
+def test_session_matches_format_for_equal_values(equal_values):
+    template = ChatPromptTemplate.from_messages(("system", "Статичное"), ("user", "Значение: {value}"))
+    session = template.render_session()
+    for value in equal_values:
+        assert session.format(value=value) == template.format(value=value)
+
+
+def test_session_renders_new_and_changed_messages():
+    template = ChatPromptTemplate.from_messages(("system", "Ты {role}"), ("user", "Вопрос"))
+    session = template.render_session()
+    session.format(role="эксперт")
+    template.add_user_message("Еще {role}")
+    template.update_message(1, "Другой вопрос")
+    assert session.format(role="учитель") == template.format(role="учитель")
+
+
+def test_session_rerenders_values_changed_in_place():
+    template = ChatPromptTemplate.from_messages(("system", "Статичное"), ("user", "Значения: {items}"))
+    session = template.render_session()
+    items = [1]
+    session.format(items=items)
+    items.append(2)
+    assert session.format(items=items) == template.format(items=items)
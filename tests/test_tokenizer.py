@@ -0,0 +1,44 @@
+"""Проверки общего токенизатора шаблонов и скомпилированного рендеринга."""
+
+import pytest
+
+from langchain_prompt_templates.compiled import compile_template
+from langchain_prompt_templates.tokenizer import (TOKENIZE_CACHE_MAX_TEXT, _cache, clear_tokenize_cache,
+                                                  tokenize)
+from langchain_prompt_templates.utils import extract_variables
+
+VALUES = {"name": "Анна", "count": 3.14159, "width": 8, "user": {"id": 7}, "items": ["a", "b"]}
+
+
+@pytest.mark.parametrize("text, variables", [
+    ("Привет, {name}!", ("name",)),
+    ("{{name}} не переменная, а {name} — да", ("name",)),
+    ("{{{name}}}", ("name",)),
+    ("Число {count:.2f} шириной {count:>{width}}", ("count", "width")),
+    ("{user[id]} и {items[0]!r}", ("user", "items")),
+    ("{name!s:^10}", ("name",)),
+    ("Без переменных }} и {{", ()),
+])
+def test_tokenize_matches_str_format(text, variables):
+    assert tokenize(text).variables == variables
+    assert compile_template(text).render(VALUES) == text.format(**VALUES)
+
+
+def test_escaped_braces_are_not_variables():
+    assert extract_variables("JSON: {{\"key\": {value}}}") == ["value"]
+    assert compile_template("{{literal}}").is_static
+
+
+def test_invalid_template_falls_back_and_raises_like_str_format():
+    tokens = tokenize("Открытая {name")
+    assert not tokens.valid
+    with pytest.raises(ValueError):
+        compile_template("Открытая {name").render({"name": "x"})
+
+
+def test_long_and_brace_free_texts_are_not_cached():
+    clear_tokenize_cache()
+    tokenize("Без скобок")
+    tokenize("{x}" + " " * TOKENIZE_CACHE_MAX_TEXT)
+    tokenize("Короткий {x}")
+    assert list(_cache) == ["Короткий {x}"]